@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+整盘复盘基准: 单向遍历 (复用搜索树) vs 每个局面从头摆棋 (clear_board + 全部 play)
+每种方式使用新启动的引擎，避免神经网络缓存互相影响；
+两种方式都在第一个摆不出的局面 (非法着法) 停止，报告实际覆盖的手数
+
+用法:
+    python3 benchmarks/bench_game_review.py <棋谱.sgf> [每局面搜索次数] [间隔手数]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from katago_analyzer import KataGoAnalyzer, Color, parse_sgf_game, KATAGO_BIN
+from katago_daemon import KATAGO_MODEL, KATAGO_CFG
+
+
+class CountingAnalyzer(KataGoAnalyzer):
+    """统计发送的 GTP 命令数"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commands_sent = 0
+
+    def send_command_async(self, cmd, on_line=None):
+        self.commands_sent += 1
+        return super().send_command_async(cmd, on_line=on_line)
+
+
+def forward_pass(katago, game, visits, stride):
+    """iter_game: 相邻局面只补一手；返回 (总访问数, 分析过的手数)"""
+    visits_total, turns = 0, []
+    for turn, results, stats in katago.iter_game(game.moves, stride=stride, visits=visits,
+                                                 setup=game.initial_stones):
+        visits_total += stats.root_visits
+        turns.append(turn)
+    return visits_total, turns
+
+
+def replay_from_scratch(katago, game, visits, stride):
+    """改造前 full_pipeline 的做法: 每个局面 clear_board 后逐手 play；返回值同 forward_pass"""
+    visits_total, turns = 0, []
+    for turn in range(0, len(game.moves) + 1, stride):
+        katago.clear_board()
+        katago.set_komi(game.komi)
+        # 与 iter_game 一致：有一手下不了就停止，不分析摆错的局面
+        if not all(katago.play(Color(color), move)
+                   for color, move in game.initial_stones + game.moves[:turn]):
+            print(f"无法前进到第 {turn} 手")
+            break
+        if turn < len(game.moves):
+            color = Color(game.moves[turn][0])
+        else:
+            color = Color.WHITE if game.moves and game.moves[-1][0] == "B" else Color.BLACK
+        _, stats = katago.analyze_with_stats(color, visits=visits)
+        visits_total += stats.root_visits
+        turns.append(turn)
+    return visits_total, turns
+
+
+def run(label, func, game, visits, stride):
+    katago = CountingAnalyzer(str(KATAGO_MODEL), config_path=str(KATAGO_CFG),
+                              katago_path=KATAGO_BIN)
+    if not katago.start():
+        print(f"❌ {label}: KataGo 启动失败")
+        return None
+    try:
+        if game.board_size != 19:
+            katago.set_board_size(game.board_size)
+        katago.set_komi(game.komi)
+        katago.commands_sent = 0
+        start = time.monotonic()
+        visits_total, turns = func(katago, game, visits, stride)
+        elapsed = time.monotonic() - start
+    finally:
+        katago.stop()
+
+    if not turns:
+        print(f"❌ {label}: 没有分析任何局面")
+        return turns
+    covered = f"第 {turns[0]}-{turns[-1]} 手"
+    print(f"  {label:<18s} {covered:<12s} {len(turns):4d} 个局面  {elapsed:7.2f}s  "
+          f"{elapsed / len(turns) * 1000:7.1f} ms/局面  "
+          f"{katago.commands_sent:6d} 条命令  {visits_total / elapsed:8.0f} 访问/s")
+    return turns
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python3 benchmarks/bench_game_review.py <棋谱.sgf> [搜索次数] [间隔手数]")
+        return
+    with open(sys.argv[1], 'r') as f:
+        game = parse_sgf_game(f.read())
+    visits = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    stride = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    print(f"整盘复盘: {len(game.moves)} 手, 每 {stride} 手分析一次, 每局面 {visits} 次")
+    forward = run("单向遍历", forward_pass, game, visits, stride)
+    scratch = run("从头摆棋", replay_from_scratch, game, visits, stride)
+    if forward != scratch:
+        print("⚠️ 两种方式覆盖的局面不同，耗时不能直接比较")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+kata-analyze 解析基准
+按高汇报频率 (interval 5-10 厘秒) 的典型更新行测量每条更新的解析耗时
+
+用法:
+    python3 benchmarks/bench_parse.py [候选数] [主要变化长度]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from katago_analyzer import GTP_COLUMNS
+from katago_parse import parse_info_line
+
+
+def make_line(candidates: int = 20, pv_length: int = 15, ownership: bool = False,
+              board_size: int = 19, seed: int = 0) -> str:
+    """构造一条与 KataGo 输出格式一致的更新行"""
+    rng = random.Random(seed)
+    coords = [f"{col}{row}" for col in GTP_COLUMNS[:board_size] for row in range(1, board_size + 1)]
+    segments = []
+    for order in range(candidates):
+        visits = rng.randint(1, 5000)
+        pv = ' '.join(rng.choice(coords) for _ in range(pv_length))
+        segments.append(
+            f"info move {rng.choice(coords)} visits {visits} edgeVisits {visits} "
+            f"utility {rng.uniform(-1, 1):.6f} winrate {rng.random():.6f} "
+            f"scoreMean {rng.uniform(-20, 20):.6f} scoreStdev {rng.uniform(5, 30):.6f} "
+            f"scoreLead {rng.uniform(-20, 20):.6f} scoreSelfplay {rng.uniform(-20, 20):.6f} "
+            f"prior {rng.random():.6f} lcb {rng.random():.6f} utilityLcb {rng.uniform(-1, 1):.6f} "
+            f"weight {visits}.0 order {order} pv {pv}")
+    line = ' '.join(segments)
+    if ownership:
+        line += ' ownership ' + ' '.join(f"{rng.uniform(-1, 1):.6f}"
+                                         for _ in range(board_size * board_size))
+    return line
+
+
+def bench(label: str, func, number: int):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {label:<32s} {seconds * 1e6:8.1f} µs/更新")
+
+
+def main():
+    candidates = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pv_length = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    line = make_line(candidates, pv_length)
+    line_own = make_line(candidates, pv_length, ownership=True)
+
+    results, _ = parse_info_line(line)
+    assert len(results) == candidates and len(results[-1].pv) == pv_length
+
+    print(f"kata-analyze 解析: {candidates} 个候选, 主要变化 {pv_length} 手, "
+          f"{len(line)} 字节/行")
+    bench("parse_info_line", lambda: parse_info_line(line), 2000)
+    bench("parse_info_line (+ownership)", lambda: parse_info_line(line_own), 2000)
+
+    try:
+        import numpy as np
+        from katago_heatmap import decode_floats
+    except ImportError:
+        print("  (未安装 numpy，跳过 ownership 解码)")
+        return
+    _, tail = parse_info_line(line_own)
+    out = np.empty((19, 19), dtype=np.float32)
+    bench("decode_floats (ownership)", lambda: decode_floats(tail, out), 2000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+封装层基准: 用 fake_katago.py 替身引擎 (不加载神经网络) 单独测量 Python 侧的开销
+- GTP 命令往返 (逐条等待 vs 流水线)
+- goto_position 切换局面
+- kata-analyze 流式解析: 按替身的搜索速度，实际耗时超出理想耗时的部分即封装开销
+- 分析引擎: 整盘 analyzeTurns 吞吐，以及后台负载下交互请求的排队延迟 (AnalysisScheduler)
+
+也可以用 --katago/--model 指向真实引擎，对比网络计算之外的开销。
+
+用法:
+    python3 benchmarks/bench_wrapper.py [--visit-latency 0.0002] [--candidates 20] [--pv-length 15]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAKE_KATAGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_katago.py")
+
+
+def make_game(length: int, board_size: int = 19, seed: int = 0):
+    """互不重叠的随机着法 (替身引擎不提子)"""
+    from katago_analyzer import GTP_COLUMNS
+    coords = [f"{col}{row}" for col in GTP_COLUMNS[:board_size] for row in range(1, board_size + 1)]
+    points = random.Random(seed).sample(coords, length)
+    return [("B" if i % 2 == 0 else "W", move) for i, move in enumerate(points)]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_gtp(args, game):
+    from katago_analyzer import KataGoAnalyzer, Color, default_interval
+
+    katago = KataGoAnalyzer(args.model, config_path=args.config, katago_path=args.katago)
+    if not katago.start():
+        sys.exit("引擎启动失败")
+    try:
+        print(f"\n启动: {katago.startup_stats.ready * 1000:.0f} ms 就绪")
+
+        n = args.commands
+        began = time.perf_counter()
+        for _ in range(n):
+            katago._send_command('protocol_version')
+        sequential = (time.perf_counter() - began) / n
+        began = time.perf_counter()
+        futures = [katago.send_command_async('protocol_version') for _ in range(n)]
+        for future in futures:
+            future.result(timeout=10)
+        pipelined = (time.perf_counter() - began) / n
+        print(f"GTP 往返 ({n} 条): 逐条 {sequential * 1e6:.0f} µs/条, "
+              f"流水线 {pipelined * 1e6:.0f} µs/条")
+
+        began = time.perf_counter()
+        for turn in range(len(game) + 1):
+            katago.goto_position(game[:turn])
+        forward = (time.perf_counter() - began) / (len(game) + 1)
+        rng = random.Random(1)
+        jumps = [rng.randint(0, len(game)) for _ in range(50)]
+        began = time.perf_counter()
+        for turn in jumps:
+            katago.goto_position(game[:turn])
+        jump = (time.perf_counter() - began) / len(jumps)
+        print(f"goto_position ({len(game)} 手): 逐手前进 {forward * 1000:.2f} ms/局面, "
+              f"随机跳转 {jump * 1000:.2f} ms/局面")
+
+        ownership = _has_numpy()
+        overheads, overshoot, updates = [], [], 0
+        for turn in range(0, len(game), max(1, len(game) // args.positions)):
+            katago.goto_position(game[:turn])
+            color = Color.BLACK if turn % 2 == 0 else Color.WHITE
+            _, stats = katago.analyze_with_stats(color, visits=args.visits, max_time=None,
+                                                 interval=args.interval, ownership=ownership)
+            ideal = stats.root_visits * args.visit_latency
+            overheads.append(stats.latency - ideal)
+            overshoot.append(stats.root_visits - args.visits)
+            updates += stats.updates
+        interval = args.interval if args.interval is not None else default_interval(args.visits)
+        print(f"kata-analyze ({len(overheads)} 个局面, {args.visits} 次搜索, "
+              f"间隔 {interval} 厘秒{', 含 ownership' if ownership else ''}): "
+              f"共 {updates} 次更新, 超出理想耗时 p50 {percentile(overheads, 0.5) * 1000:.1f} ms / "
+              f"p90 {percentile(overheads, 0.9) * 1000:.1f} ms, "
+              f"超出搜索预算 p50 {percentile(overshoot, 0.5):.0f} / p90 {percentile(overshoot, 0.9):.0f} 次")
+    finally:
+        katago.stop()
+
+
+def bench_analysis(args, game):
+    from katago_analysis_engine import KataGoAnalysisEngine, build_query
+    from katago_scheduler import AnalysisScheduler, Priority
+
+    engine = KataGoAnalysisEngine(args.model, config_path=args.config, katago_path=args.katago,
+                                  config_overrides={"numAnalysisThreads": args.threads})
+    if not engine.start():
+        sys.exit("分析引擎启动失败")
+    try:
+        visits = args.visits
+        began = time.perf_counter()
+        results = engine.analyze_game(game, max_visits=visits, timeout=600)
+        elapsed = time.perf_counter() - began
+        ideal = len(results) * visits * args.visit_latency / args.threads
+        print(f"\n整盘 analyzeTurns ({len(results)} 个局面, {visits} 次搜索, "
+              f"{args.threads} 线程): {elapsed:.2f} s (理想 {ideal:.2f} s), "
+              f"{len(results) / elapsed:.0f} 局面/s")
+
+        # 后台预计算占满引擎时，交互请求应插队
+        scheduler = AnalysisScheduler(engine)
+        background = [scheduler.submit(build_query(game[:turn], max_visits=visits),
+                                       Priority.BACKGROUND)
+                      for turn in range(len(game))]
+        latencies = []
+        rng = random.Random(2)
+        for _ in range(args.interactive):
+            time.sleep(visits * args.visit_latency)
+            turn = rng.randint(0, len(game))
+            query = build_query(game[:turn], max_visits=visits, komi=6.5)
+            submitted = time.perf_counter()
+            scheduler.submit(query, Priority.INTERACTIVE).result(timeout=60)
+            latencies.append(time.perf_counter() - submitted)
+        for ticket in background:
+            ticket.result(timeout=600)
+        print(f"优先级调度 ({len(background)} 个后台请求排队, {args.interactive} 个交互请求): "
+              f"交互 p50 {percentile(latencies, 0.5) * 1000:.0f} ms / "
+              f"p90 {percentile(latencies, 0.9) * 1000:.0f} ms "
+              f"(单次搜索 {visits * args.visit_latency * 1000:.0f} ms)")
+        stats = scheduler.stats()
+        for priority in (Priority.INTERACTIVE, Priority.BACKGROUND):
+            latency = stats[priority.value]["latency"]
+            print(f"  {priority.value:<12s} 完成 {stats[priority.value]['completed']:4d}, "
+                  f"平均 {latency['mean'] * 1000:.0f} ms")
+    finally:
+        engine.stop()
+
+
+def _has_numpy() -> bool:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--katago", default=FAKE_KATAGO, help="引擎可执行文件 (默认替身引擎)")
+    parser.add_argument("--model", default="fake.bin.gz")
+    parser.add_argument("--config", default="")
+    parser.add_argument("--visit-latency", type=float, default=0.0002,
+                        help="替身引擎每次搜索的耗时 (秒)")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--pv-length", type=int, default=15)
+    parser.add_argument("--moves", type=int, default=200)
+    parser.add_argument("--visits", type=int, default=200)
+    parser.add_argument("--interval", type=int, default=None,
+                        help="kata-analyze 汇报间隔 (厘秒)，默认与 analyze_with_stats 相同")
+    parser.add_argument("--positions", type=int, default=20)
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--skip", choices=("gtp", "analysis"), action="append", default=[])
+    args = parser.parse_args()
+
+    # 替身引擎从环境变量读取参数 (子进程继承)
+    os.environ["FAKE_KATAGO_VISIT_LATENCY"] = str(args.visit_latency)
+    os.environ["FAKE_KATAGO_CANDIDATES"] = str(args.candidates)
+    os.environ["FAKE_KATAGO_PV_LENGTH"] = str(args.pv_length)
+
+    game = make_game(args.moves)
+    print(f"引擎: {args.katago}, 每次搜索 {args.visit_latency * 1e6:.0f} µs, "
+          f"{args.candidates} 个候选, 主要变化 {args.pv_length} 手")
+    if "gtp" not in args.skip:
+        bench_gtp(args, game)
+    if "analysis" not in args.skip:
+        bench_analysis(args, game)
+
+
+if __name__ == "__main__":
+    main()
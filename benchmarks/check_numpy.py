@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+NumPy 解码路径自检: katago_heatmap 的浮点串/响应解码、HeatmapStore，
+以及 AnalysisTable 的 np.frombuffer 冻结和 .npz 往返
+不需要 KataGo，数据由 bench_parse.make_line 构造
+
+用法:
+    python3 benchmarks/check_numpy.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit("未安装 numpy，无法检查")
+
+from katago_analyzer import Color, MoveAnalysis
+from katago_parse import parse_info_line
+from katago_heatmap import (decode_floats, decode_ownership, ownership_from_response,
+                            policy_from_response, HeatmapStore)
+from katago_table import AnalysisTable
+from bench_parse import make_line
+
+
+def expect_error(func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except ValueError:
+        return
+    raise AssertionError(f"{func.__name__} 应当抛出 ValueError")
+
+
+def check_decode():
+    _, tail = parse_info_line(make_line(candidates=5, pv_length=4, ownership=True))
+    expected = np.array([float(v) for v in tail.split()], dtype=np.float32).reshape(19, 19)
+
+    out = np.empty((19, 19), dtype=np.float32)
+    assert decode_floats(tail, out) is out
+    assert np.allclose(out, expected, rtol=0, atol=1e-6)
+    expect_error(decode_floats, tail, np.empty((9, 9), dtype=np.float32))
+    expect_error(decode_floats, tail + " 0.5", out)
+
+    # raw_policy 解码进 out[:-1] 视图，pass 项不能被覆盖
+    policy = np.full(362, 7.0, dtype=np.float32)
+    decode_floats(tail, policy[:-1])
+    assert np.allclose(policy[:-1], expected.reshape(-1), rtol=0, atol=1e-6) and policy[-1] == 7.0
+
+    assert np.allclose(decode_ownership(tail, Color.BLACK), expected, rtol=0, atol=1e-6)
+    assert np.allclose(decode_ownership(tail, Color.WHITE), -expected, rtol=0, atol=1e-6)
+    print("  decode_floats / decode_ownership: OK")
+
+
+def check_responses():
+    rng = random.Random(0)
+    ownership = [rng.uniform(-1, 1) for _ in range(81)]
+    policy = [rng.random() for _ in range(82)]
+    response = {"ownership": ownership, "policy": policy, "rootInfo": {"currentPlayer": "W"}}
+    expected = np.array(ownership, dtype=np.float32).reshape(9, 9)
+
+    assert np.array_equal(ownership_from_response(response, 9), expected)
+    assert np.array_equal(ownership_from_response(response, 9, "WHITE"), -expected)
+    assert np.array_equal(ownership_from_response(response, 9, "SIDETOMOVE"), -expected)
+    assert ownership_from_response({}, 9) is None
+    expect_error(ownership_from_response, response, 19)
+
+    decoded = policy_from_response(response, 9)
+    assert decoded.shape == (82,) and np.array_equal(decoded, np.array(policy, dtype=np.float32))
+    assert policy_from_response({}, 9) is None
+    expect_error(policy_from_response, response, 19)
+    expect_error(policy_from_response, {"policy": policy[:-1]}, 9)
+    print("  ownership_from_response / policy_from_response: OK")
+
+
+def check_store():
+    store = HeatmapStore(3, board_size=9, dtype=np.float16, with_policy=True)
+    assert store.nbytes == 3 * 81 * 2 + 3 * 82 * 2
+    response = {"ownership": [0.9] * 40 + [-0.9] * 41, "policy": [0.5] * 82}
+    store.record_response(1, response)
+    assert store.filled.tolist() == [False, True, False]
+    assert store.territory(1) == (40, 41)
+    assert np.allclose(store.policy[1].astype(np.float32), 0.5)
+    assert not store.policy[0].any()
+
+    store.record_text(2, ' '.join(["0.75"] * 81), Color.WHITE)
+    assert store.filled[2] and store.territory(2) == (0, 81)
+    assert np.allclose(store.ownership[2].astype(np.float32), -0.75, atol=1e-3)
+    print("  HeatmapStore (float16): OK")
+
+
+def check_table():
+    results = {
+        0: [MoveAnalysis("Q16", 120, 0.52, 0.8, 0.31, ["Q16", "D4", "pass"], order=0),
+            MoveAnalysis("D4", 80, 0.51, 0.6, 0.22, ["D4"], order=1)],
+        2: [MoveAnalysis("pass", 5, 0.10, -12.5, 0.01, [], order=0)],
+    }
+    table = AnalysisTable.from_results(results)
+    assert len(table) == 3 and table[1] == []
+    for name, dtype in (("moves", np.int16), ("visits", np.intc), ("winrate", np.float32),
+                        ("pv_offsets", np.int64), ("position_offsets", np.int64)):
+        column = getattr(table, name)
+        assert isinstance(column, np.ndarray) and column.dtype == dtype, name
+    for turn, candidates in results.items():
+        assert table[turn] == candidates
+    assert abs(table[0][0].winrate - 0.52) < 1e-6 and table[2][0].move == "pass"
+    assert table.best().tolist() == [0, -1, 2]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "table.npz")
+        table.save(path)
+        loaded = AnalysisTable.load(path)
+        assert len(loaded) == 3 and loaded.frozen
+        for turn, candidates in results.items():
+            assert loaded[turn] == candidates
+    print("  AnalysisTable (frombuffer / npz): OK")
+
+
+def main():
+    print(f"NumPy {np.__version__}")
+    check_decode()
+    check_responses()
+    check_store()
+    check_table()
+
+
+if __name__ == "__main__":
+    main()
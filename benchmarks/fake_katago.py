@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+确定性的 KataGo 替身 (不加载神经网络)
+命令行与 katago 相同 (`gtp` / `analysis`，-config/-model/-override-config 只解析不读取)，
+实现封装层用到的 GTP 子集和 JSON 分析协议，用于测量 Python 侧开销和在没有模型的环境中跑通流程。
+
+- GTP: kata-analyze 流式输出 (interval/ownership/minmoves/allow)、play、undo、genmove、
+  boardsize、clear_board、komi、kata-set-rules、set_position、loadsgf、kata-raw-nn 等
+- 分析引擎: 按 priority 调度的并行请求、analyzeTurns、includeOwnership/includePolicy、
+  reportDuringSearchEvery、terminate (排队中的返回 noResults)、query_version
+- 同一局面的输出完全确定 (由局面内容派生随机种子)；不做提子判断
+
+可调参数 (环境变量):
+    FAKE_KATAGO_VISIT_LATENCY  每次搜索的模拟耗时 (秒)，默认 0.0002 (5000 次/秒)
+    FAKE_KATAGO_CANDIDATES     每次更新的候选着法数，默认 10
+    FAKE_KATAGO_PV_LENGTH      主要变化长度，默认 10
+    FAKE_KATAGO_STARTUP        模拟的模型加载耗时 (秒)，默认 0
+    FAKE_KATAGO_THREADS        分析引擎并行请求数，默认取 numAnalysisThreads 或 2
+    FAKE_KATAGO_MODEL_NOISE    分析引擎按 -model 扰动胜率 (±该值)、目差和首选，默认 0；
+                               用不同的模型名启动两个替身即可模拟大小两个网络的分歧
+
+用法:
+    KATAGO_BIN=benchmarks/fake_katago.py python3 go_review_v2.py ...
+    python3 benchmarks/bench_wrapper.py
+"""
+
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from typing import Optional, List, Dict, Any, Tuple
+
+GTP_COLUMNS = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+VERSION = "1.16.4-fake"
+
+VISIT_LATENCY = float(os.environ.get("FAKE_KATAGO_VISIT_LATENCY", "0.0002"))
+CANDIDATES = int(os.environ.get("FAKE_KATAGO_CANDIDATES", "10"))
+PV_LENGTH = int(os.environ.get("FAKE_KATAGO_PV_LENGTH", "10"))
+STARTUP = float(os.environ.get("FAKE_KATAGO_STARTUP", "0"))
+MODEL_NOISE = float(os.environ.get("FAKE_KATAGO_MODEL_NOISE", "0"))
+
+_out_lock = threading.Lock()
+
+
+def emit(text: str):
+    with _out_lock:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+def log(text: str):
+    sys.stderr.write(text + "\n")
+    sys.stderr.flush()
+
+
+def parse_overrides(argv: List[str]) -> Dict[str, str]:
+    """-override-config a=1,b=2"""
+    overrides: Dict[str, str] = {}
+    for i, arg in enumerate(argv[:-1]):
+        if arg == '-override-config':
+            for item in argv[i + 1].split(','):
+                key, _, value = item.partition('=')
+                overrides[key.strip()] = value.strip()
+    return overrides
+
+
+def parse_model(argv: List[str]) -> str:
+    """-model 路径"""
+    for i, arg in enumerate(argv[:-1]):
+        if arg == '-model':
+            return argv[i + 1]
+    return ''
+
+
+# ============ 局面与确定性搜索 ============
+
+def coord(index: int, size: int) -> str:
+    return f"{GTP_COLUMNS[index % size]}{size - index // size}"
+
+
+def to_index(move: str, size: int) -> Optional[int]:
+    move = move.upper()
+    if move == 'PASS' or len(move) < 2 or move[0] not in GTP_COLUMNS[:size]:
+        return None
+    try:
+        row = int(move[1:])
+    except ValueError:
+        return None
+    if not 1 <= row <= size:
+        return None
+    return (size - row) * size + GTP_COLUMNS.index(move[0])
+
+
+class FakeSearch:
+    """一个局面上的模拟搜索：候选、先验和主要变化由局面决定，访问数按比例分配"""
+
+    def __init__(self, size: int, occupied: set, seed_text: str,
+                 allow: Optional[List[str]] = None):
+        rng = random.Random(zlib.crc32(seed_text.encode()))
+        self.size = size
+        empties = [coord(i, size) for i in range(size * size) if i not in occupied]
+        if allow:
+            moves = [m.upper() for m in allow]
+        else:
+            moves = rng.sample(empties, min(CANDIDATES, len(empties))) or ['pass']
+        weights = sorted((rng.random() ** 3 for _ in moves), reverse=True)
+        total = sum(weights) or 1.0
+        self.priors = [w / total for w in weights]
+        self.moves = moves
+        self.winrate = rng.uniform(0.2, 0.8)
+        self.score = rng.uniform(-15, 15)
+        self.pvs = [[m] + [rng.choice(empties or ['pass']) for _ in range(PV_LENGTH - 1)]
+                    for m in moves]
+        self.ownership = [round(rng.uniform(-1, 1), 6) for _ in range(size * size)]
+        policy = [rng.random() ** 4 for _ in range(size * size)]
+        for i in occupied:
+            policy[i] = -1.0
+        norm = sum(p for p in policy if p > 0) or 1.0
+        self.policy = [p / norm if p > 0 else -1.0 for p in policy] + [0.0001]
+
+    def perturb(self, seed_text: str, noise: float):
+        """模拟另一个网络：胜率、目差偏移，并可能交换前两个候选"""
+        rng = random.Random(zlib.crc32(seed_text.encode()))
+        self.winrate = min(0.99, max(0.01, self.winrate + rng.uniform(-noise, noise)))
+        self.score += rng.uniform(-noise, noise) * 30
+        if len(self.moves) > 1 and rng.random() < min(1.0, noise * 3):
+            self.moves[0], self.moves[1] = self.moves[1], self.moves[0]
+            self.pvs[0], self.pvs[1] = self.pvs[1], self.pvs[0]
+
+    def candidates(self, visits: int) -> List[Dict[str, Any]]:
+        """root visits 为 visits 时各候选的统计 (按 order 排列)"""
+        result = []
+        for order, (move, prior, pv) in enumerate(zip(self.moves, self.priors, self.pvs)):
+            share = max(1, int(visits * prior))
+            winrate = self.winrate - 0.015 * order
+            result.append({
+                "move": move, "visits": share, "winrate": round(winrate, 6),
+                "scoreLead": round(self.score - 0.7 * order, 6),
+                "scoreMean": round(self.score - 0.7 * order, 6),
+                "prior": round(prior, 6), "lcb": round(winrate - 0.02, 6),
+                "utility": round(2 * winrate - 1, 6), "order": order, "pv": pv,
+            })
+        return result
+
+    def info_line(self, visits: int, ownership: bool) -> str:
+        segments = []
+        for c in self.candidates(visits):
+            segments.append(
+                f"info move {c['move']} visits {c['visits']} edgeVisits {c['visits']} "
+                f"utility {c['utility']} winrate {c['winrate']} scoreMean {c['scoreMean']} "
+                f"scoreStdev 20.0 scoreLead {c['scoreLead']} scoreSelfplay {c['scoreMean']} "
+                f"prior {c['prior']} lcb {c['lcb']} utilityLcb {c['utility']} "
+                f"weight {c['visits']}.0 order {c['order']} pv {' '.join(c['pv'])}")
+        line = ' '.join(segments)
+        if ownership:
+            line += ' ownership ' + ' '.join(map(str, self.ownership))
+        return line
+
+
+# ============ GTP ============
+
+class FakeGtp:
+    def __init__(self, overrides: Dict[str, str]):
+        self.size = 19
+        self.komi = 7.5
+        self.rules = 'chinese'
+        self.setup: List[Tuple[str, str]] = []
+        self.moves: List[Tuple[str, str]] = []
+        self.max_visits = int(overrides.get('maxVisits', 500))
+        self.lines: queue.Queue = queue.Queue()
+        self.pending: Optional[str] = None
+
+    def occupied(self) -> set:
+        occupied = set()
+        for _, move in self.setup + self.moves:
+            index = to_index(move, self.size)
+            if index is not None:
+                occupied.add(index)
+        return occupied
+
+    def search(self, allow: Optional[List[str]] = None) -> FakeSearch:
+        seed = json.dumps([self.size, self.komi, self.rules, self.setup, self.moves])
+        return FakeSearch(self.size, self.occupied(), seed, allow)
+
+    def _reader(self):
+        for line in sys.stdin:
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def run(self):
+        threading.Thread(target=self._reader, daemon=True).start()
+        while True:
+            if self.pending is not None:
+                line, self.pending = self.pending, None
+            else:
+                line = self.lines.get()
+            if line is None:
+                return
+            parts = line.split()
+            if not parts:
+                continue
+            command_id = ''
+            if parts[0].isdigit():
+                command_id, parts = parts[0], parts[1:]
+            if not parts:
+                continue
+            if parts[0] == 'quit':
+                emit(f"={command_id}\n\n")
+                return
+            handler = getattr(self, 'cmd_' + parts[0].replace('-', '_'), None)
+            if handler is None:
+                emit(f"?{command_id} unknown command\n\n")
+                continue
+            ok, text = handler(command_id, parts[1:])
+            if ok is None:
+                continue    # 流式命令自己输出
+            sign = '=' if ok else '?'
+            emit(f"{sign}{command_id} {text}\n\n" if text else f"{sign}{command_id}\n\n")
+
+    # ---- 基本命令 ----
+
+    def cmd_protocol_version(self, _id, args):
+        return True, '2'
+
+    def cmd_name(self, _id, args):
+        return True, 'KataGo'
+
+    def cmd_version(self, _id, args):
+        return True, VERSION
+
+    def cmd_list_commands(self, _id, args):
+        # 标准命令用下划线，KataGo 扩展命令用连字符
+        names = [n[4:] for n in dir(self) if n.startswith('cmd_')]
+        names = [n.replace('_', '-') if n.startswith('kata_') else n for n in names]
+        return True, '\n'.join(sorted(names + ['quit']))
+
+    def cmd_known_command(self, _id, args):
+        known = bool(args) and hasattr(self, 'cmd_' + args[0].replace('-', '_'))
+        return True, 'true' if known else 'false'
+
+    def cmd_boardsize(self, _id, args):
+        try:
+            size = int(args[0])
+        except (IndexError, ValueError):
+            return False, 'syntax error'
+        if not 2 <= size <= len(GTP_COLUMNS):
+            return False, 'unacceptable size'
+        self.size = size
+        return self.cmd_clear_board(_id, [])
+
+    def cmd_clear_board(self, _id, args):
+        self.setup, self.moves = [], []
+        return True, ''
+
+    def cmd_komi(self, _id, args):
+        try:
+            self.komi = float(args[0])
+        except (IndexError, ValueError):
+            return False, 'syntax error'
+        return True, ''
+
+    def cmd_kata_set_rules(self, _id, args):
+        if not args:
+            return False, 'syntax error'
+        self.rules = args[0]
+        return True, ''
+
+    def cmd_play(self, _id, args):
+        if len(args) < 2 or args[0].upper()[:1] not in 'BW':
+            return False, 'syntax error'
+        move = args[1].upper()
+        index = to_index(move, self.size)
+        if move != 'PASS' and (index is None or index in self.occupied()):
+            return False, 'illegal move'
+        self.moves.append((args[0].upper()[:1], move))
+        return True, ''
+
+    def cmd_undo(self, _id, args):
+        if not self.moves:
+            return False, 'cannot undo'
+        self.moves.pop()
+        return True, ''
+
+    def cmd_set_position(self, _id, args):
+        if len(args) % 2:
+            return False, 'syntax error'
+        stones = []
+        for color, move in zip(args[::2], args[1::2]):
+            if to_index(move, self.size) is None:
+                return False, f'illegal move {move}'
+            stones.append((color.upper()[:1], move.upper()))
+        self.setup, self.moves = stones, []
+        return True, ''
+
+    def cmd_loadsgf(self, _id, args):
+        try:
+            with open(args[0]) as f:
+                sgf = f.read()
+        except (IndexError, OSError):
+            return False, 'cannot load file'
+        size = re.search(r'SZ\[(\d+)\]', sgf)
+        self.size = int(size.group(1)) if size else 19
+        komi = re.search(r'KM\[([-\d.]+)\]', sgf)
+        if komi:
+            self.komi = float(komi.group(1))
+
+        def points(tag):
+            stones = []
+            for block in re.finditer(tag + r'((?:\[[a-s]{2}\])+)', sgf):
+                stones.extend(re.findall(r'\[([a-s]{2})\]', block.group(1)))
+            return stones
+
+        def gtp(p):
+            return f"{GTP_COLUMNS[ord(p[0]) - 97]}{self.size - (ord(p[1]) - 97)}"
+
+        self.setup = [('B', gtp(p)) for p in points(r'AB')] + \
+                     [('W', gtp(p)) for p in points(r'AW')]
+        self.moves = [(c, gtp(p) if p else 'PASS')
+                      for c, p in re.findall(r';([BW])\[([a-s]{2})?\]', sgf)]
+        return True, ''
+
+    # ---- 搜索 ----
+
+    def cmd_genmove(self, _id, args):
+        if not args or args[0].upper()[:1] not in 'BW':
+            return False, 'syntax error'
+        search = self.search()
+        time.sleep(self.max_visits * VISIT_LATENCY)
+        move = search.moves[0]
+        self.moves.append((args[0].upper()[:1], move.upper()))
+        return True, move
+
+    def cmd_kata_raw_nn(self, _id, args):
+        search = self.search()
+        size = self.size
+        rows = []
+        for r in range(size):
+            row = search.policy[r * size:(r + 1) * size]
+            rows.append(' '.join('NAN' if p < 0 else f"{p:.6f}" for p in row))
+        text = (f"symmetry {args[0] if args else 0}\n"
+                f"whiteWin {1 - search.winrate:.6f}\nwhiteLoss {search.winrate:.6f}\n"
+                f"noResult 0.000000\nwhiteLead {-search.score:.3f}\n"
+                "policy\n" + '\n'.join(rows) + "\npolicyPass 0.000100")
+        return True, text
+
+    def cmd_stop(self, _id, args):
+        return True, ''
+
+    def cmd_kata_analyze(self, command_id, args):
+        interval, ownership, allow = 1.0, False, None
+        i = 0
+        if i < len(args) and args[i].upper() in ('B', 'W', 'BLACK', 'WHITE'):
+            i += 1
+        if i < len(args) and args[i].isdigit():
+            interval = int(args[i]) / 100
+            i += 1
+        while i < len(args):
+            key = args[i]
+            if key == 'interval' and i + 1 < len(args):
+                interval = int(args[i + 1]) / 100
+                i += 2
+            elif key == 'ownership' and i + 1 < len(args):
+                ownership = args[i + 1] == 'true'
+                i += 2
+            elif key in ('allow', 'avoid') and i + 3 < len(args):
+                if key == 'allow':
+                    allow = args[i + 2].split(',')
+                i += 4
+            else:
+                i += 2
+        interval = max(interval, 0.01)
+
+        search = self.search(allow)
+        per_update = max(1, round(interval / VISIT_LATENCY))
+        emit(f"={command_id}\n")
+        visits = 0
+        while True:
+            try:
+                line = self.lines.get(timeout=interval)
+            except queue.Empty:
+                visits += per_update
+                emit(search.info_line(visits, ownership) + "\n")
+                continue
+            # 任何新命令都会打断分析
+            self.pending = line
+            emit("\n")
+            return None, ''
+
+
+# ============ JSON 分析引擎 ============
+
+class FakeAnalysis:
+    def __init__(self, overrides: Dict[str, str], model: str = ''):
+        self.max_visits = int(overrides.get('maxVisits', 100))
+        self.model = model
+        self.threads = int(os.environ.get('FAKE_KATAGO_THREADS',
+                                          overrides.get('numAnalysisThreads', 2)))
+        self.heap: List[Tuple[int, int, Dict[str, Any], int]] = []
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.eof = False
+        self.terminated: set = set()   # (id, turn)，turn 为 None 表示整个请求
+
+    def run(self):
+        workers = [threading.Thread(target=self._worker, daemon=True)
+                   for _ in range(max(1, self.threads))]
+        for worker in workers:
+            worker.start()
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                self._handle(line)
+        with self.cond:
+            self.eof = True
+            self.cond.notify_all()
+        # 与 KataGo 相同：输入结束后完成已提交的请求再退出
+        for worker in workers:
+            worker.join()
+
+    def _handle(self, line: str):
+        try:
+            query = json.loads(line)
+        except json.JSONDecodeError as e:
+            emit(json.dumps({"error": f"Could not parse input line as json request: {e}"}) + "\n")
+            return
+        query_id = query.get("id")
+        if query_id is None:
+            emit(json.dumps({"error": "Request must have field 'id'"}) + "\n")
+            return
+        action = query.get("action")
+        if action == "query_version":
+            emit(json.dumps({"id": query_id, "action": action, "version": VERSION,
+                             "git_hash": "fake"}) + "\n")
+        elif action in ("terminate", "terminate_all"):
+            with self.cond:
+                if action == "terminate_all":
+                    self.terminated.add(("*", None))
+                else:
+                    turns = query.get("turnNumbers")
+                    for turn in (turns if turns is not None else [None]):
+                        self.terminated.add((query.get("terminateId"), turn))
+            emit(json.dumps({"id": query_id, "action": action,
+                             **({"terminateId": query["terminateId"]}
+                                if "terminateId" in query else {})}) + "\n")
+        elif action is not None:
+            emit(json.dumps({"id": query_id, "action": action}) + "\n")
+        elif not isinstance(query.get("moves"), list):
+            emit(json.dumps({"id": query_id, "error": "'moves' field is required"}) + "\n")
+        else:
+            turns = query.get("analyzeTurns", [len(query["moves"])])
+            with self.cond:
+                # terminate 只作用于之前收到的请求，重用的 id 重新开始
+                self.terminated = {t for t in self.terminated if t[0] != query_id}
+                for turn in turns:
+                    priority = int(query.get("priority", 0))
+                    heapq.heappush(self.heap, (-priority, next(self.seq), query, turn))
+                self.cond.notify_all()
+
+    def _is_terminated(self, query_id: str, turn: int) -> bool:
+        t = self.terminated
+        return (query_id, None) in t or (query_id, turn) in t or ("*", None) in t
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not self.heap and not self.eof:
+                    self.cond.wait()
+                if not self.heap:
+                    return
+                _, _, query, turn = heapq.heappop(self.heap)
+            self._search(query, turn)
+
+    def _search(self, query: Dict[str, Any], turn: int):
+        query_id = query["id"]
+        if self._is_terminated(query_id, turn):
+            emit(json.dumps({"id": query_id, "turnNumber": turn, "isDuringSearch": False,
+                             "noResults": True}) + "\n")
+            return
+        size = int(query.get("boardXSize", 19))
+        stones = [tuple(s) for s in query.get("initialStones", [])] + \
+                 [tuple(m) for m in query["moves"][:turn]]
+        occupied = {to_index(m, size) for _, m in stones} - {None}
+        seed = json.dumps([size, query.get("komi"), query.get("rules"), stones])
+        search = FakeSearch(size, occupied, seed, None)
+        if MODEL_NOISE > 0:
+            search.perturb(self.model + seed, MODEL_NOISE)
+
+        max_visits = int(query.get("maxVisits", self.max_visits))
+        report_every = query.get("reportDuringSearchEvery")
+        step = max(1, round(float(report_every) / VISIT_LATENCY)) if report_every else 64
+        visits = 0
+        while visits < max_visits:
+            chunk = min(step, max_visits - visits)
+            time.sleep(chunk * VISIT_LATENCY)
+            visits += chunk
+            if self._is_terminated(query_id, turn):
+                break
+            if report_every and visits < max_visits:
+                emit(json.dumps(self._response(query, turn, search, visits, True)) + "\n")
+        emit(json.dumps(self._response(query, turn, search, visits, False)) + "\n")
+
+    @staticmethod
+    def _response(query: Dict[str, Any], turn: int, search: FakeSearch,
+                  visits: int, during: bool) -> Dict[str, Any]:
+        players = ('B', 'W') if query.get("initialPlayer", "B") == "B" else ('W', 'B')
+        response: Dict[str, Any] = {
+            "id": query["id"],
+            "turnNumber": turn,
+            "isDuringSearch": during,
+            "moveInfos": search.candidates(visits),
+            "rootInfo": {"visits": visits, "winrate": round(search.winrate, 6),
+                         "scoreLead": round(search.score, 6),
+                         "currentPlayer": players[turn % 2]},
+        }
+        if query.get("includeOwnership"):
+            response["ownership"] = search.ownership
+        if query.get("includePolicy"):
+            response["policy"] = search.policy
+        return response
+
+
+def main():
+    argv = sys.argv[1:]
+    mode = argv[0] if argv else 'gtp'
+    overrides = parse_overrides(argv)
+
+    log(f"KataGo v{VERSION}")
+    log("Initializing neural net buffer to be size 19 * 19 allowing smaller boards")
+    log("Fake backend thread 0: no neural net, deterministic outputs")
+    if STARTUP > 0:
+        time.sleep(STARTUP)
+    log("Loaded neural net with nnXLen 19 nnYLen 19")
+
+    if mode == 'gtp':
+        log("GTP ready, beginning main protocol loop")
+        FakeGtp(overrides).run()
+    elif mode == 'analysis':
+        log("Started, ready to begin handling requests")
+        FakeAnalysis(overrides, parse_model(argv)).run()
+    else:
+        log(f"Unknown subcommand: {mode}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,9 @@ KATAGO_MODEL = Path("/Users/haoc/.openclaw/workspace/katago_model.bin.gz")
 
 # 导入模块
 from ultralytics import YOLO
-from katago_analyzer import KataGoAnalyzer, Color
+from katago_analyzer import KataGoAnalyzer, Color, parse_sgf_game
+from katago_daemon import create_analyzer
+from katago_review import review_game, format_review
 
 class GoReviewPipeline:
     """围棋复盘完整流程"""
@@ -45,7 +47,8 @@ class GoReviewPipeline:
         
         # KataGo
         if KATAGO_MODEL.exists():
-            self.katago = KataGoAnalyzer(str(KATAGO_MODEL))
+            # 守护进程在运行时直接使用其中预热好的引擎
+            self.katago = create_analyzer(str(KATAGO_MODEL))
             if self.katago.start():
                 print(f"✅ KataGo: {KATAGO_MODEL.name}")
             else:
@@ -176,25 +179,17 @@ class GoReviewPipeline:
             if coord:
                 moves.append((stone["color"], coord))
         
-        # 按顺序排列（假设置信度高的先下）
-        black_moves = [m[1] for m in moves if m[0] == "black"]
-        white_moves = [m[1] for m in moves if m[0] == "white"]
-        
-        # 合并成完整对局
-        game_moves = []
-        max_len = max(len(black_moves), len(white_moves))
-        for i in range(max_len):
-            if i < len(black_moves):
-                game_moves.append(("B", black_moves[i]))
-            if i < len(white_moves):
-                game_moves.append(("W", white_moves[i]))
+        # 照片是静态局面，没有着法顺序：写成 AB/AW 摆子 (黑先)，不虚构交替着法
+        black_stones = sorted({m[1] for m in moves if m[0] == "black"})
+        white_stones = sorted({m[1] for m in moves if m[0] == "white"})
         
         # 生成 SGF 内容
-        sgf_content = f"""(;FF[4]CA[UTF-8]GM[1]SZ[19]KM[7.5]PB[Black]PW[White]RE[?]DT[{datetime.now().strftime('%Y-%m-%d')}]
+        sgf_content = f"""(;FF[4]CA[UTF-8]GM[1]SZ[19]KM[7.5]PB[Black]PW[White]RE[?]DT[{datetime.now().strftime('%Y-%m-%d')}]PL[B]
 """
-        for i, (color, coord) in enumerate(game_moves, 1):
-            sgf_content += f";{color}[{coord}]\n"
-        
+        if black_stones:
+            sgf_content += "AB" + "".join(f"[{coord}]" for coord in black_stones) + "\n"
+        if white_stones:
+            sgf_content += "AW" + "".join(f"[{coord}]" for coord in white_stones) + "\n"
         sgf_content += ")"
         
         # 保存
@@ -203,13 +198,13 @@ class GoReviewPipeline:
             f.write(sgf_content)
         
         print(f"✅ SGF 已生成: {sgf_path}")
-        print(f"   着法数: {len(game_moves)}")
+        print(f"   棋子数: {len(black_stones) + len(white_stones)}")
         
         self.results["sgf"] = {
             "path": str(sgf_full_path),
-            "moves": len(game_moves),
-            "black_moves": len(black_moves),
-            "white_moves": len(white_moves)
+            "stones": len(black_stones) + len(white_stones),
+            "black_stones": len(black_stones),
+            "white_stones": len(white_stones)
         }
         
         return str(sgf_full_path)
@@ -220,24 +215,18 @@ class GoReviewPipeline:
         print("🧠 KataGo 分析...")
         print("="*60)
         
-        # 设置棋盘
-        self.katago.clear_board()
-        self.katago.set_komi(7.5)
-        
-        # 加载 SGF 着法
+        # 加载 SGF (摆子 + 着法，GTP 坐标)
         with open(sgf_path, "r") as f:
-            content = f.read()
+            game = parse_sgf_game(f.read())
+        moves = game.moves
         
-        # 解析 SGF 提取着法
-        import re
-        moves = re.findall(r';(B|W)\[(..?)\]', content)
+        # 设置棋盘，摆子一条命令摆出
+        self.katago.set_komi(game.komi)
+        if not self.katago.ensure_setup(game.initial_stones):
+            print("❌ 无法摆出棋盘局面")
+            return {}
         
-        # 复盘
-        for color_char, coord in moves:
-            color = Color.BLACK if color_char == "B" else Color.WHITE
-            self.katago.play(color, coord)
-        
-        print(f"已加载 {len(moves)} 手棋")
+        print(f"已加载 {len(game.initial_stones)} 个摆子、{len(moves)} 手棋")
         
         # 分析关键局面
         if analyze_moves is None:
@@ -246,23 +235,27 @@ class GoReviewPipeline:
             analyze_moves = [i for i in range(10, min(total, 50), 10)]
             if total > 20:
                 analyze_moves.extend([total-2, total-1])
+            # 照片等静态局面没有着法，直接分析当前局面
+            analyze_moves = analyze_moves or [total]
         
         analysis_results = {}
         
-        for move_num in analyze_moves:
+        # 按手数顺序前进，每次只增量切换局面
+        for move_num in sorted(set(analyze_moves)):
             if move_num > len(moves):
                 continue
             
             print(f"\n分析第 {move_num} 手...")
             
-            # 恢复到该局面
-            self.katago.clear_board()
-            for i, (color_char, coord) in enumerate(moves[:move_num]):
-                color = Color.BLACK if color_char == "B" else Color.WHITE
-                self.katago.play(color, coord)
+            # 切换到该局面
+            self.katago.goto_position(moves[:move_num])
             
-            # 分析当前局面 (下一手是白棋，因为刚下了黑棋)
-            results = self.katago.analyze(Color.WHITE, visits=50)
+            # 分析当前局面 (轮到最后一手的对方；只有摆子时黑先)
+            if move_num > 0:
+                next_color = Color.WHITE if moves[move_num - 1][0] == "B" else Color.BLACK
+            else:
+                next_color = Color.BLACK
+            results = self.katago.analyze(next_color, visits=50)
             
             if results:
                 best = results[0]
@@ -286,6 +279,21 @@ class GoReviewPipeline:
         self.results["analysis"] = analysis_results
         return analysis_results
     
+    def review_mistakes(self, sgf_path: str, sweep_visits: int = 24, deep_visits: int = 400):
+        """整盘找问题手：低搜索次数扫全部局面，只复查损失大的着法"""
+        with open(sgf_path, "r") as f:
+            game = parse_sgf_game(f.read())
+        # 静态局面 (只有摆子) 没有可复盘的着法
+        if not game.moves:
+            return None
+        
+        print(f"\n问题手筛查 ({len(game.moves)} 手)...")
+        review = review_game(self.katago, game.moves, sweep_visits=sweep_visits,
+                             deep_visits=deep_visits, setup=game.initial_stones,
+                             verbose=True)
+        self.results["review"] = review
+        return review
+    
     def generate_review_report(self) -> str:
         """生成复盘报告"""
         print("\n" + "="*60)
@@ -304,7 +312,7 @@ class GoReviewPipeline:
 
 ## 📝 棋谱信息
 - 文件: {self.results.get('sgf', {}).get('path', 'N/A')}
-- 总手数: {self.results.get('sgf', {}).get('moves', 0)}
+- 棋子数: {self.results.get('sgf', {}).get('stones', 0)}
 
 ## 🧠 KataGo 分析
 
@@ -326,6 +334,10 @@ class GoReviewPipeline:
             for i, m in enumerate(data['top_moves'], 1):
                 report += f"{i}. {m['move']} (胜率 {m['winrate']*100:.1f}%, 目数 {m['score_lead']:+.1f})\n"
         
+        review = self.results.get("review")
+        if review is not None:
+            report += "\n" + format_review(review)
+        
         report += """
 ## 💡 总结
 
@@ -365,6 +377,7 @@ class GoReviewPipeline:
             
             # 4. KataGo 分析
             self.analyze_with_katago(sgf_path)
+            self.review_mistakes(sgf_path)
             
             # 5. 生成报告
             report_path = self.generate_review_report()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+围棋局面
+- 按规则落子与提子
+- Zobrist 局面哈希 (用于分析缓存)
+- 8 种对称变换与规范化 (旋转/镜像的同一局面共用一个哈希)
+"""
+
+import random
+from typing import Optional, List, Dict, Tuple, Any
+
+from katago_analyzer import Color, GTP_COLUMNS
+
+EMPTY, BLACK, WHITE = 0, 1, 2
+
+_ZOBRIST_TABLES: Dict[int, List[Tuple[int, int]]] = {}
+_SYMMETRY_TABLES: Dict[int, List[List[int]]] = {}
+# 轮到白方时额外异或的键
+_ZOBRIST_WHITE_TO_MOVE = 0x9E3779B97F4A7C15
+
+
+def _zobrist_table(board_size: int) -> List[Tuple[int, int]]:
+    """每个交叉点的 (黑子键, 白子键)，固定种子保证跨进程一致"""
+    table = _ZOBRIST_TABLES.get(board_size)
+    if table is None:
+        rng = random.Random(0x6B617461 + board_size)
+        table = [(rng.getrandbits(64), rng.getrandbits(64))
+                 for _ in range(board_size * board_size)]
+        _ZOBRIST_TABLES[board_size] = table
+    return table
+
+
+# 8 种二面体对称: (行, 列) -> 变换后的 (行, 列)，n 为 board_size - 1
+SYMMETRIES = [
+    lambda r, c, n: (r, c),          # 恒等
+    lambda r, c, n: (c, n - r),      # 顺时针 90°
+    lambda r, c, n: (n - r, n - c),  # 180°
+    lambda r, c, n: (n - c, r),      # 顺时针 270°
+    lambda r, c, n: (r, n - c),      # 左右镜像
+    lambda r, c, n: (c, r),          # 主对角线翻转
+    lambda r, c, n: (n - r, c),      # 上下镜像
+    lambda r, c, n: (n - c, n - r),  # 副对角线翻转
+]
+# 每种对称的逆变换 (只有 90° 与 270° 互逆，其余都是自身的逆)
+INVERSE_SYMMETRY = [0, 3, 2, 1, 4, 5, 6, 7]
+
+
+def _symmetry_table(board_size: int) -> List[List[int]]:
+    """每种对称下一维下标的映射表"""
+    tables = _SYMMETRY_TABLES.get(board_size)
+    if tables is None:
+        n = board_size - 1
+        tables = []
+        for transform in SYMMETRIES:
+            table = []
+            for index in range(board_size * board_size):
+                r, c = transform(*divmod(index, board_size), n)
+                table.append(r * board_size + c)
+            tables.append(table)
+        _SYMMETRY_TABLES[board_size] = tables
+    return tables
+
+
+def transform_move(move: str, symmetry: int, board_size: int = 19) -> str:
+    """对 GTP 坐标做对称变换，pass 保持不变"""
+    index = gtp_to_index(move, board_size)
+    if index is None:
+        return move
+    return index_to_gtp(_symmetry_table(board_size)[symmetry][index], board_size)
+
+
+def transform_values(values: List[Any], symmetry: int, board_size: int = 19) -> List[Any]:
+    """对按一维下标排列的逐点数据 (如 ownership、policy) 做对称变换"""
+    table = _symmetry_table(board_size)[symmetry]
+    result = list(values)
+    for index, target in enumerate(table):
+        result[target] = values[index]
+    return result
+
+
+def stone_value(color: Any) -> int:
+    """Color / "B" / "W" 转棋盘上的值"""
+    if isinstance(color, Color):
+        color = color.value
+    return BLACK if color.upper().startswith("B") else WHITE
+
+
+def gtp_to_index(move: str, board_size: int = 19) -> Optional[int]:
+    """GTP 坐标 (如 "Q16") 转一维下标 (行 0 为棋盘最上方)，pass 返回 None"""
+    move = move.strip().upper()
+    if not move or move == "PASS":
+        return None
+    col = GTP_COLUMNS.index(move[0])
+    row = board_size - int(move[1:])
+    return row * board_size + col
+
+
+def index_to_gtp(index: int, board_size: int = 19) -> str:
+    """一维下标转 GTP 坐标"""
+    row, col = divmod(index, board_size)
+    return f"{GTP_COLUMNS[col]}{board_size - row}"
+
+
+class Position:
+    """棋盘局面 (一维数组存储，行 0 为棋盘最上方)"""
+
+    def __init__(self, board_size: int = 19):
+        self.board_size = board_size
+        self.stones = [EMPTY] * (board_size * board_size)
+        self.to_move = BLACK
+        self.captures = {BLACK: 0, WHITE: 0}
+
+    @classmethod
+    def from_moves(cls,
+                   moves: List[Tuple[Any, str]],
+                   board_size: int = 19,
+                   initial_stones: Optional[List[Tuple[Any, str]]] = None) -> "Position":
+        """由摆子和着法序列构建局面"""
+        position = cls(board_size)
+        for color, move in initial_stones or []:
+            index = gtp_to_index(move, board_size)
+            if index is not None:
+                position.stones[index] = stone_value(color)
+        for color, move in moves:
+            position.play(color, move)
+        return position
+
+    def neighbors(self, index: int) -> List[int]:
+        size = self.board_size
+        row, col = divmod(index, size)
+        result = []
+        if row > 0:
+            result.append(index - size)
+        if row < size - 1:
+            result.append(index + size)
+        if col > 0:
+            result.append(index - 1)
+        if col < size - 1:
+            result.append(index + 1)
+        return result
+
+    def _group(self, index: int) -> Tuple[List[int], bool]:
+        """返回 (棋块, 是否有气)"""
+        color = self.stones[index]
+        group = [index]
+        seen = {index}
+        has_liberty = False
+        i = 0
+        while i < len(group):
+            for n in self.neighbors(group[i]):
+                value = self.stones[n]
+                if value == EMPTY:
+                    has_liberty = True
+                elif value == color and n not in seen:
+                    seen.add(n)
+                    group.append(n)
+            i += 1
+        return group, has_liberty
+
+    def play(self, color: Any, move: str):
+        """落子并提掉无气的对方棋子 (不检查劫和禁着)"""
+        value = stone_value(color)
+        opponent = WHITE if value == BLACK else BLACK
+        self.to_move = opponent
+
+        index = gtp_to_index(move, self.board_size)
+        if index is None:
+            return
+        self.stones[index] = value
+
+        for n in self.neighbors(index):
+            if self.stones[n] == opponent:
+                group, has_liberty = self._group(n)
+                if not has_liberty:
+                    for stone in group:
+                        self.stones[stone] = EMPTY
+                    self.captures[value] += len(group)
+
+        # 自杀着 (部分规则允许) 提掉自己的棋块
+        group, has_liberty = self._group(index)
+        if not has_liberty:
+            for stone in group:
+                self.stones[stone] = EMPTY
+            self.captures[opponent] += len(group)
+
+    def zobrist_hash(self, to_move: Optional[Any] = None) -> int:
+        """局面的 64 位 Zobrist 哈希 (包含轮走方)"""
+        table = _zobrist_table(self.board_size)
+        h = 0
+        for index, value in enumerate(self.stones):
+            if value:
+                h ^= table[index][value - 1]
+        side = self.to_move if to_move is None else stone_value(to_move)
+        if side == WHITE:
+            h ^= _ZOBRIST_WHITE_TO_MOVE
+        return h
+
+    def canonical_hash(self, to_move: Optional[Any] = None) -> Tuple[int, int]:
+        """
+        8 种对称下最小的 Zobrist 哈希
+
+        Returns:
+            (规范哈希, 对称编号)；把本局面的坐标按该对称变换即得到规范朝向
+        """
+        table = _zobrist_table(self.board_size)
+        symmetries = _symmetry_table(self.board_size)
+        stones = [(index, value - 1) for index, value in enumerate(self.stones) if value]
+        side = self.to_move if to_move is None else stone_value(to_move)
+        side_key = _ZOBRIST_WHITE_TO_MOVE if side == WHITE else 0
+
+        best = None
+        for symmetry, mapping in enumerate(symmetries):
+            h = side_key
+            for index, color in stones:
+                h ^= table[mapping[index]][color]
+            if best is None or h < best[0]:
+                best = (h, symmetry)
+        return best
@@ -20,7 +20,9 @@ from pathlib import Path
 from dataclasses import dataclass
 from typing import List, Dict, Optional
 from PIL import Image, ImageDraw
-from katago_analyzer import KataGoAnalyzer, Color
+from katago_analyzer import KataGoAnalyzer, Color, sgf_to_gtp, parse_sgf_game
+from katago_pool import KataGoEnginePool
+from katago_daemon import create_analyzer
 
 # ============ 配置 ============
 WORKSPACE = Path("/Users/haoc/.openclaw/workspace")
@@ -41,10 +43,12 @@ class MoveAnalysis:
 class GoReviewSystem:
     """围棋复盘系统"""
     
-    def __init__(self):
+    def __init__(self, pool: Optional[KataGoEnginePool] = None):
         self.yolo = None
-        # 初始化 KataGoAnalyzer
-        self.katago_analyzer = KataGoAnalyzer(
+        # 共享引擎池 (可选)：批量复盘多张图片时从池中租用引擎，不再每张图启停一次
+        self.pool = pool
+        # 初始化 KataGoAnalyzer (守护进程在运行时连接守护进程)
+        self.katago_analyzer = create_analyzer(
             model_path=str(KATAGO_MODEL),
             config_path=str(KATAGO_CFG)
         )
@@ -120,38 +124,40 @@ class GoReviewSystem:
                 return chr(97 + col) + chr(97 + row)
             return ""
         
-        black_moves = []
-        white_moves = []
+        black_stones = set()
+        white_stones = set()
         for stone in stones:
             coord = to_coord(stone["x"] + stone["w"]/2, stone["y"] + stone["h"]/2)
             if coord:
                 if stone["color"] == "black":
-                    black_moves.append(coord)
+                    black_stones.add(coord)
                 else:
-                    white_moves.append(coord)
+                    white_stones.add(coord)
         
-        # 生成 SGF 内容
-        game_moves = []
-        max_len = max(len(black_moves), len(white_moves))
-        for i in range(max_len):
-            if i < len(black_moves):
-                game_moves.append(f";B[{black_moves[i]}]")
-            if i < len(white_moves):
-                game_moves.append(f";W[{white_moves[i]}]")
+        # 照片是静态局面，没有着法顺序：写成 AB/AW 摆子 (黑先)，不虚构交替着法
+        setup = []
+        for prop, coords in (("AB", black_stones), ("AW", white_stones)):
+            if coords:
+                setup.append(prop + "".join(f"[{c}]" for c in sorted(coords)))
         
-        sgf_content = f"""(;FF[4]CA[UTF-8]GM[1]SZ[19]KM[7.5]PB[Black]PW[White]RE[?]DT[{datetime.now().strftime('%Y-%m-%d')}]
+        sgf_content = f"""(;FF[4]CA[UTF-8]GM[1]SZ[19]KM[7.5]PB[Black]PW[White]RE[?]DT[{datetime.now().strftime('%Y-%m-%d')}]PL[B]
 """
-        sgf_content += "\n".join(game_moves)
+        sgf_content += "\n".join(setup)
         sgf_content += "\n)"
         
         sgf_path = WORKSPACE / f"review_{datetime.now().strftime('%H%M%S')}.sgf"
         with open(sgf_path, 'w') as f:
             f.write(sgf_content)
         
-        return str(sgf_path), len(game_moves)
+        return str(sgf_path), len(black_stones) + len(white_stones)
     
-    def analyze_with_katago(self, sgf_moves: List[tuple], analyze_moves: List[int] = None) -> Dict[int, List[MoveAnalysis]]:
-        """用 KataGo 分析指定局面"""
+    def analyze_with_katago(self, sgf_moves: List[tuple], analyze_moves: List[int] = None,
+                            setup: Optional[List[tuple]] = None) -> Dict[int, List[MoveAnalysis]]:
+        """用 KataGo 分析指定局面 (setup 为 GTP 坐标的摆子，一条命令摆出)"""
+        if self.pool is not None:
+            with self.pool.lease() as analyzer:
+                return self._analyze_positions(analyzer, sgf_moves, analyze_moves, setup)
+        
         # 使用 KataGoAnalyzer 启动引擎
         print("DEBUG: 使用 KataGoAnalyzer 启动 KataGo 引擎...")
         if not self.katago_analyzer.start():
@@ -160,69 +166,70 @@ class GoReviewSystem:
         print("DEBUG: KataGoAnalyzer 启动成功。")
 
         try:
-            # 设置棋盘 (使用 KataGoAnalyzer 的方法)
-            self.katago_analyzer.clear_board()
-            self.katago_analyzer.set_komi(7.5)
-            
-            # 发送 help kata-analyze 命令以验证参数格式
-            print("DEBUG: 发送 'help kata-analyze' 命令...")
-            help_output_str = self.katago_analyzer._send_command('help kata-analyze', timeout=5.0)
-            for line in help_output_str.split('\n'):
-                if line.strip(): # 过滤空行
-                    print(f"DEBUG: help kata-analyze 输出: {line.strip()}")
-            print("DEBUG: 'help kata-analyze' 命令发送完毕。")
-            
-            # 复盘 (使用 KataGoAnalyzer 的方法)
-            for color, coord in sgf_moves[:50]:  # 最多复盘50手
-                self.katago_analyzer.play(Color.BLACK if color == 'B' else Color.WHITE, coord)
-            
-            # 分析
-            if analyze_moves is None:
-                analyze_moves = [min(10, len(sgf_moves)), min(20, len(sgf_moves)), min(30, len(sgf_moves)), min(40, len(sgf_moves)), min(50, len(sgf_moves))]
-                analyze_moves = [m for m in analyze_moves if m > 0] # 过滤掉0手
-
-            # 确保 analyze_moves 是唯一的，并且按从小到大排序
-            analyze_moves = sorted(list(set(analyze_moves)))
-
-            results = {}
-            for move_num in analyze_moves:
-                if move_num > len(sgf_moves):
-                    continue
-                
-                print(f"DEBUG: 分析到第 {move_num} 手后局面...")
-                # 恢复局面 (使用 KataGoAnalyzer 的方法)
-                self.katago_analyzer.clear_board()
-                self.katago_analyzer.set_komi(7.5)
-                for color, coord in sgf_moves[:move_num]:
-                    self.katago_analyzer.play(Color.BLACK if color == 'B' else Color.WHITE, coord)
-                
-                # 分析当前局面 (使用 KataGoAnalyzer 的 analyze 方法)
-                next_color_enum = Color.WHITE if sgf_moves[move_num-1][0] == 'B' else Color.BLACK
-                # 这里的 30 应该是 visits，根据 KataGoAnalyzer.analyze 的定义
-                analysis_raw = self.katago_analyzer.analyze(next_color_enum, visits=30, verbose=True) # verbose=True 可以看到 KataGoAnalyzer 的内部打印
-
-                analysis = []
-                for move_info in analysis_raw: # analysis_raw 已经是解析后的列表
-                    if move_info.get('move', '') and move_info.get('move', '') != 'pass':
-                        analysis.append(MoveAnalysis(
-                            move=move_info.get('move', ''),
-                            winrate=float(move_info.get('winrate', 0)),
-                            score=float(move_info.get('scoreLead', 0)),
-                            visits=int(move_info.get('visits', 0)),
-                            order=int(move_info.get('order', 0))
-                        ))
-                
-                if analysis:
-                    analysis.sort(key=lambda x: x.order if x.order >= 0 else 999)
-                    results[move_num] = analysis
-
-            return results
+            return self._analyze_positions(self.katago_analyzer, sgf_moves, analyze_moves, setup)
         finally:
             # 分析完成后终止 KataGo 引擎
             print("DEBUG: 终止 KataGo 引擎...")
             self.katago_analyzer.stop()
             print("DEBUG: KataGo 引擎已终止.")
 
+    def _analyze_positions(self, analyzer: KataGoAnalyzer, sgf_moves: List[tuple], analyze_moves: List[int] = None,
+                           setup: Optional[List[tuple]] = None) -> Dict[int, List[MoveAnalysis]]:
+        """在给定引擎上逐个分析局面"""
+        # 设置棋盘 (使用 KataGoAnalyzer 的方法)
+        analyzer.clear_board()
+        analyzer.set_komi(7.5)
+        if setup and not analyzer.set_position(setup):
+            print("❌ 无法摆出棋盘局面")
+            return {}
+        
+        # 分析
+        if analyze_moves is None:
+            analyze_moves = [min(10, len(sgf_moves)), min(20, len(sgf_moves)), min(30, len(sgf_moves)), min(40, len(sgf_moves)), min(50, len(sgf_moves))]
+            analyze_moves = [m for m in analyze_moves if m > 0] # 过滤掉0手
+            # 只有摆子的静态局面：分析摆好的局面本身
+            analyze_moves = analyze_moves or [0]
+
+        # 确保 analyze_moves 是唯一的，并且按从小到大排序
+        analyze_moves = sorted(list(set(analyze_moves)))
+
+        # SGF 坐标转换为 GTP 坐标
+        gtp_moves = [(color, sgf_to_gtp(coord)) for color, coord in sgf_moves]
+
+        results = {}
+        for move_num in analyze_moves:
+            if move_num > len(sgf_moves):
+                continue
+            
+            print(f"DEBUG: 分析到第 {move_num} 手后局面...")
+            # 增量切换局面：按顺序前进时每次只需补几手 play
+            analyzer.goto_position(gtp_moves[:move_num])
+            
+            # 分析当前局面 (使用 KataGoAnalyzer 的 analyze 方法)
+            if move_num > 0:
+                next_color_enum = Color.WHITE if sgf_moves[move_num-1][0] == 'B' else Color.BLACK
+            else:
+                next_color_enum = Color.BLACK  # 静态局面黑先
+            # 这里的 30 应该是 visits，根据 KataGoAnalyzer.analyze 的定义
+            analysis_raw = analyzer.analyze(next_color_enum, visits=30, verbose=True) # verbose=True 可以看到 KataGoAnalyzer 的内部打印
+
+            analysis = []
+            for move_info in analysis_raw: # analysis_raw 已经是解析后的 MoveAnalysis 列表
+                if move_info.move and move_info.move != 'pass':
+                    analysis.append(MoveAnalysis(
+                        move=move_info.move,
+                        winrate=move_info.winrate,
+                        score=move_info.score_lead,
+                        visits=move_info.visits,
+                        order=move_info.order
+                    ))
+            
+            if analysis:
+                analysis.sort(key=lambda x: x.order if x.order >= 0 else 999)
+                results[move_num] = analysis
+
+        return results
+
     
     # ============ 生成报告 ============
     def generate_report(self, image_path: str, detections: Dict, sgf_info: Dict, katago_results: Dict = None) -> str:
@@ -242,7 +249,7 @@ class GoReviewSystem:
 |------|------|
 | 黑子 | {black_count} |
 | 白子 | {white_count} |
-| 总手数 | {black_count + white_count} |
+| 棋子总数 | {black_count + white_count} |
 
 ---
 
@@ -257,7 +264,7 @@ class GoReviewSystem:
 ## 📝 棋谱信息
 
 - **文件**: {sgf_info['path']}
-- **总手数**: {sgf_info['moves']}
+- **棋子数**: {sgf_info['stones']}
 
 ---
 
@@ -272,7 +279,8 @@ class GoReviewSystem:
                     continue
                 best = analysis[0]
                 next_color = '白' if analysis else ''
-                report += f"""### 第 {move_num} 手后分析
+                title = "当前局面分析 (黑先)" if move_num == 0 else f"第 {move_num} 手后分析"
+                report += f"""### {title}
 
 | 排名 | 着法 | 胜率 | 目数 | 搜索次数 |
 |------|------|------|------|----------|
@@ -387,34 +395,23 @@ open {sgf_info['path']}
         
         # 4. 生成 SGF
         print(f"\n📝 生成 SGF...")
-        sgf_path, moves = self.generate_sgf(detections)
-        result["sgf"] = {"path": sgf_path, "moves": moves}
-        print(f"   SGF: {sgf_path} ({moves} 手)")
+        sgf_path, stones = self.generate_sgf(detections)
+        result["sgf"] = {"path": sgf_path, "stones": stones}
+        print(f"   SGF: {sgf_path} ({stones} 子)")
         
-        # 5. KataGo 分析 (可选)
-        if analyze_with_katago and moves > 0:
+        # 5. KataGo 分析 (可选)：照片只有摆子，一条命令摆出后分析该局面
+        if analyze_with_katago and stones > 0:
             print(f"\n🧠 KataGo 分析...")
-            # 解析 SGF 着法
             with open(sgf_path, 'r') as f:
-                content = f.read()
-            sgf_moves = re.findall(r';(B|W)\[(..?)\]', content)[:50]
+                game = parse_sgf_game(f.read())
             
-            if sgf_moves:
-                analyze_points = [min(10, len(sgf_moves))]
-                if len(sgf_moves) >= 20:
-                    analyze_points.append(20)
-                if len(sgf_moves) >= 30:
-                    analyze_points.append(30)
-                
-                katago_results = self.analyze_with_katago(sgf_moves, analyze_points)
-                result["katago_results"] = katago_results
-                
-                if katago_results:
-                    print(f"   完成 {len(katago_results)} 个局面分析")
-                else:
-                    print("   ⚠️ KataGo 分析未收集到结果")
+            katago_results = self.analyze_with_katago([], setup=game.initial_stones)
+            result["katago_results"] = katago_results
+            
+            if katago_results:
+                print(f"   完成 {len(katago_results)} 个局面分析")
             else:
-                print("   ⚠️ 无法解析 SGF 着法")
+                print("   ⚠️ KataGo 分析未收集到结果")
         
         # 6. 生成报告
         print(f"\n📋 生成报告...")
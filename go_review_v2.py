@@ -12,6 +12,8 @@ import json
 import subprocess
 from collections import defaultdict
 from ultralytics import YOLO
+from katago_analyzer import Color, parse_sgf_game, KATAGO_BIN
+from katago_daemon import connect_daemon
 
 
 class GoReviewSystem:
@@ -19,7 +21,7 @@ class GoReviewSystem:
     
     def __init__(self):
         self.model_path = "/Users/haoc/.openclaw/workspace/runs/detect/runs/go_board_yolo26/exp/weights/best.pt"
-        self.katago_bin = "/opt/homebrew/bin/katago"
+        self.katago_bin = KATAGO_BIN
         self.katago_model = "/Users/haoc/.openclaw/workspace/katago_model.bin.gz"
         self.katago_config = "/opt/homebrew/share/katago/configs/gtp_example.cfg"
         
@@ -135,14 +137,17 @@ DT[2026-02-06]
 RE[Unknown]
 """
         
-        sorted_pos = sorted(grid_map.keys(), key=lambda x: (x[0], x[1]))
-        
-        for row, col in sorted_pos:
+        # 照片没有着法顺序，按 AB/AW 摆子写入 (黑先)
+        stones = {'B': [], 'W': []}
+        for row, col in sorted(grid_map.keys(), key=lambda x: (x[0], x[1])):
             color, conf = grid_map[(row, col)]
-            sgf_col = chr(ord('a') + col)
-            sgf_row = chr(ord('a') + row)
             letter = 'B' if color == 'b' else 'W'
-            sgf += f"{letter}[{sgf_col}{sgf_row}]\n"
+            stones[letter].append(chr(ord('a') + col) + chr(ord('a') + row))
+        
+        sgf += "PL[B]\n"
+        for letter, coords in stones.items():
+            if coords:
+                sgf += f"A{letter}" + "".join(f"[{c}]" for c in coords) + "\n"
         
         sgf += ")"
         return sgf
@@ -158,6 +163,11 @@ RE[Unknown]
         with open(sgf_path) as f:
             sgf_content = f.read()
         
+        # 守护进程在运行时直接使用预热好的引擎，省去模型加载
+        client = connect_daemon()
+        if client is not None:
+            return self.analyze_katago_daemon(client, sgf_content)
+        
         # GTP分析
         cmd = f"loadsgf {sgf_path}\ngenmove b\nquit\n"
         
@@ -190,6 +200,28 @@ RE[Unknown]
             "raw": output[:500]
         }
     
+    def analyze_katago_daemon(self, client, sgf_content):
+        """通过 KataGo 守护进程分析 (黑先)"""
+        game = parse_sgf_game(sgf_content)
+        try:
+            client.set_komi(game.komi)
+            client.set_position(game.initial_stones)
+            client.goto_position(game.moves)
+            results = client.analyze(Color.BLACK, visits=200)
+        finally:
+            client.stop()
+        
+        score_info = None
+        if results:
+            best = results[0]
+            score_info = f"{best.move} 胜率 {best.winrate*100:.1f}% 领先 {best.score_lead:+.1f} 目"
+        
+        return {
+            "recommendations": [r.move for r in results[:5]],
+            "score_info": score_info,
+            "raw": ""
+        }
+    
     def generate_report(self, stats, katago_info):
         """生成复盘报告"""
         lines = [
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+KataGo JSON 分析引擎客户端
+驱动 `katago analysis`，一次提交多个局面 (或用 analyzeTurns 覆盖整盘棋)，
+按 id 重组乱序返回的结果，让引擎的并行局面搜索真正跑满
+"""
+
+import json
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+from katago_analyzer import KATAGO_BIN, MoveAnalysis, StartupStats
+from katago_singleflight import SingleFlight
+
+DEFAULT_ANALYSIS_CONFIG = str(Path(__file__).with_name("analysis.cfg"))
+
+
+@dataclass
+class _PendingQuery:
+    """等待返回的分析请求"""
+    query: Dict[str, Any]
+    future: Future
+    turns: List[int]
+    responses: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    on_response: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+def build_query(moves: List[Tuple[str, str]],
+                query_id: str = "",
+                analyze_turns: Optional[List[int]] = None,
+                max_visits: Optional[int] = None,
+                komi: float = 7.5,
+                rules: str = "chinese",
+                board_size: int = 19,
+                initial_stones: Optional[List[Tuple[str, str]]] = None,
+                initial_player: Optional[str] = None,
+                **extra: Any) -> Dict[str, Any]:
+    """
+    构建分析引擎的 JSON 请求
+
+    Args:
+        moves: 着法序列 [("B", "Q16"), ("W", "D4"), ...] (GTP 坐标)
+        analyze_turns: 要分析的手数 (0 表示空棋盘)，默认只分析最后局面
+        max_visits: 搜索次数，默认使用配置文件中的 maxVisits
+        extra: 其他原样透传的字段，如 includeOwnership、priority
+    """
+    query: Dict[str, Any] = {
+        "id": query_id,
+        "moves": [[color, move] for color, move in moves],
+        "rules": rules,
+        "komi": komi,
+        "boardXSize": board_size,
+        "boardYSize": board_size,
+    }
+    if initial_stones:
+        query["initialStones"] = [[color, move] for color, move in initial_stones]
+    if initial_player:
+        query["initialPlayer"] = initial_player
+    if analyze_turns is not None:
+        query["analyzeTurns"] = list(analyze_turns)
+    if max_visits is not None:
+        query["maxVisits"] = max_visits
+    query.update(extra)
+    return query
+
+
+def _flight_key(query: Dict[str, Any]) -> Tuple[str, int]:
+    """
+    合并键 (除 id、maxVisits 外的全部字段) 和搜索次数
+
+    priority 留在键里：交互请求不挂到低优先级的搜索上排队
+    """
+    fields = {k: v for k, v in query.items() if k not in ("id", "maxVisits")}
+    # 未指定 maxVisits 时用配置中的次数，只与同样未指定的请求合并
+    fields["hasMaxVisits"] = "maxVisits" in query
+    return json.dumps(fields, sort_keys=True), query.get("maxVisits", 0)
+
+
+def parse_move_infos(response: Dict[str, Any]) -> List[MoveAnalysis]:
+    """把一条响应的 moveInfos 转成 MoveAnalysis 列表 (按 order 排序)"""
+    results = []
+    for info in response.get("moveInfos", []):
+        results.append(MoveAnalysis(
+            move=info.get("move", ""),
+            visits=int(info.get("visits", 0)),
+            winrate=float(info.get("winrate", 0.5)),
+            score_lead=float(info.get("scoreLead", 0.0)),
+            policy=float(info.get("prior", 0.0)),
+            pv=list(info.get("pv", [])),
+            order=int(info.get("order", 0))
+        ))
+    results.sort(key=lambda x: x.order)
+    return results
+
+
+class KataGoAnalysisEngine:
+    """KataGo 分析引擎 (JSON 协议) 封装"""
+
+    def __init__(self,
+                 model_path: str,
+                 config_path: str = DEFAULT_ANALYSIS_CONFIG,
+                 config_overrides: Optional[Dict[str, Any]] = None,
+                 katago_path: str = KATAGO_BIN,
+                 max_in_flight: Optional[int] = None,
+                 coalesce: bool = True):
+        """
+        初始化
+
+        Args:
+            model_path: 模型文件路径 (.bin.gz)
+            config_path: 分析引擎配置 (默认仓库中的 analysis.cfg)
+            config_overrides: 配置覆盖项
+            katago_path: katago 可执行文件
+            max_in_flight: 同时在引擎中排队的请求上限，None 表示不限
+            coalesce: 合并并发的相同请求 (见 katago_singleflight)
+        """
+        self.model_path = model_path
+        self.config_path = config_path
+        self.config_overrides = config_overrides or {}
+        self.katago_path = katago_path
+        self.proc: Optional[subprocess.Popen] = None
+        self.is_ready = False
+        self.startup_stats: Optional[StartupStats] = None
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: Dict[str, _PendingQuery] = {}
+        self._next_id = 0
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._stderr_tail: deque = deque(maxlen=200)
+        self._io_threads: List[threading.Thread] = []
+        self.flights = SingleFlight() if coalesce else None
+
+    def start(self, timeout: float = 60.0, warmup: bool = False) -> bool:
+        """
+        启动分析引擎，并用 query_version 确认就绪
+
+        Args:
+            warmup: 就绪后分析一次空棋盘 (1 次搜索)，并记录首次计算耗时
+        """
+        cmd = [self.katago_path, 'analysis', '-config', self.config_path,
+               '-model', self.model_path]
+        if self.config_overrides:
+            overrides = ','.join([f"{k}={v}" for k, v in self.config_overrides.items()])
+            cmd.extend(['-override-config', overrides])
+
+        print(f"启动 KataGo 分析引擎: {' '.join(cmd)}")
+
+        try:
+            self.startup_stats = StartupStats()
+            self.proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1
+            )
+            self._stderr_tail.clear()
+            proc = self.proc
+            self._io_threads = [
+                threading.Thread(target=self._stdout_loop, args=(proc,),
+                                 name='katago-analysis-stdout', daemon=True),
+                threading.Thread(target=self._stderr_loop, args=(proc,),
+                                 name='katago-analysis-stderr', daemon=True),
+            ]
+            for thread in self._io_threads:
+                thread.start()
+
+            version = self.send_action("query_version").result(timeout=timeout)
+            startup = self.startup_stats
+            startup.ready = time.monotonic() - startup.spawned_at
+            self.is_ready = True
+            if warmup:
+                eval_start = time.monotonic()
+                self._submit(build_query([], max_visits=1)).result(timeout=timeout)
+                startup.first_eval = time.monotonic() - eval_start
+            print(f"✓ KataGo 分析引擎就绪 (v{version.get('version', '?')}, {startup.ready:.1f}s)")
+            return True
+
+        except FutureTimeoutError:
+            print(f"启动超时: {self._read_stderr()}")
+        except Exception as e:
+            print(f"启动失败: {e} {self._read_stderr()}")
+
+        return False
+
+    def stop(self):
+        """停止引擎"""
+        if self.proc:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+            except:
+                self.proc.kill()
+            # 等读取线程读完旧进程的输出再返回，紧接着的 start() 不会被它干扰
+            for thread in self._io_threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout=5)
+            self._fail_pending(RuntimeError("KataGo 已停止"))
+            self.proc = None
+            self.is_ready = False
+            print("✓ KataGo 分析引擎已停止")
+
+    # ============ 请求与响应 ============
+
+    def _new_id(self) -> str:
+        with self._lock:
+            self._next_id += 1
+            return f"q{self._next_id}"
+
+    def _write(self, payload: Dict[str, Any]):
+        with self._write_lock:
+            self.proc.stdin.write(json.dumps(payload) + '\n')
+            self.proc.stdin.flush()
+
+    def submit(self, query: Dict[str, Any],
+               on_response: Optional[Callable[[Dict[str, Any]], None]] = None) -> Future:
+        """
+        提交一个分析请求，立即返回 Future
+
+        Future 的结果是 {turnNumber: 原始响应}；使用 analyzeTurns 时
+        每个手数各有一条响应，全部到齐后才完成。on_response 在每条
+        响应到达时回调，用于边算边展示。
+        
+        未给出 on_response 时，与进行中的请求内容 (含 priority) 相同且
+        maxVisits 不超过它的请求直接共用它的 Future。Future 的 owner 属性
+        是实际发给引擎的请求 id (共用时为发起搜索的请求)，terminate 要用它。
+        """
+        if self.flights is None or on_response is not None:
+            return self._submit(query, on_response)
+        query = dict(query)
+        if not query.get("id"):
+            query["id"] = self._new_id()
+        key, visits = _flight_key(query)
+        return self.flights.submit(key, visits, lambda: self._submit(query), owner=query["id"])
+
+    def _submit(self, query: Dict[str, Any],
+                on_response: Optional[Callable[[Dict[str, Any]], None]] = None) -> Future:
+        future: Future = Future()
+        if not self.proc or self.proc.poll() is not None:
+            future.set_exception(RuntimeError("KataGo 未运行"))
+            return future
+
+        query = dict(query)
+        if not query.get("id"):
+            query["id"] = self._new_id()
+        future.owner = query["id"]
+        turns = list(query.get("analyzeTurns", [len(query.get("moves", []))]))
+
+        if self._slots is not None:
+            self._slots.acquire()
+            future.add_done_callback(lambda _: self._slots.release())
+
+        with self._lock:
+            self._pending[query["id"]] = _PendingQuery(query, future, turns,
+                                                       on_response=on_response)
+        try:
+            self._write(query)
+        except (BrokenPipeError, OSError, ValueError) as e:
+            with self._lock:
+                self._pending.pop(query["id"], None)
+            future.set_exception(RuntimeError(f"写入 KataGo 失败: {e}"))
+        return future
+
+    def send_action(self, action: str, **fields: Any) -> Future:
+        """发送 query_version / clear_cache / terminate 等动作请求"""
+        future: Future = Future()
+        if not self.proc or self.proc.poll() is not None:
+            future.set_exception(RuntimeError("KataGo 未运行"))
+            return future
+        payload = {"id": self._new_id(), "action": action}
+        payload.update(fields)
+        with self._lock:
+            self._pending[payload["id"]] = _PendingQuery(payload, future, turns=[])
+        try:
+            self._write(payload)
+        except (BrokenPipeError, OSError, ValueError) as e:
+            with self._lock:
+                self._pending.pop(payload["id"], None)
+            future.set_exception(RuntimeError(f"写入 KataGo 失败: {e}"))
+        return future
+
+    def terminate(self, query_id: str, turns: Optional[List[int]] = None) -> Future:
+        """
+        终止请求 (或其中的部分手数)：排队中的直接丢弃，搜索中的立即结束
+
+        被终止的请求仍会以当前结果 (未开始的为 noResults) 完成。
+        """
+        fields: Dict[str, Any] = {"terminateId": query_id}
+        if turns is not None:
+            fields["turnNumbers"] = list(turns)
+        return self.send_action("terminate", **fields)
+
+    def release(self, future: Future) -> bool:
+        """
+        submit 的调用方放弃 future 的结果 (见 SingleFlight.release)
+
+        Returns:
+            没有其他请求共用这次搜索时为 True，这时可以 terminate 它的 owner
+        """
+        return self.flights is None or self.flights.release(future)
+
+    def _stdout_loop(self, proc: subprocess.Popen):
+        """按 id 把乱序返回的响应分发给对应的请求"""
+        for line in proc.stdout:
+            line = line.strip()
+            if not line.startswith('{'):
+                continue
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"无法解析响应: {line[:80]}")
+                continue
+
+            with self._lock:
+                pending = self._pending.get(response.get("id"))
+            if pending is None:
+                if "error" in response:
+                    print(f"KataGo 错误: {response['error']}")
+                continue
+
+            if "error" in response:
+                self._finish(response["id"], exception=RuntimeError(response["error"]))
+                continue
+            if "action" in response:
+                self._finish(response["id"], result=response)
+                continue
+            if "warning" in response and "turnNumber" not in response:
+                print(f"KataGo 警告: {response['warning']}")
+                continue
+
+            # 搜索中的中间结果只回调，不计入最终结果
+            if pending.on_response is not None:
+                pending.on_response(response)
+            if response.get("isDuringSearch"):
+                continue
+
+            pending.responses[response.get("turnNumber", 0)] = response
+            if len(pending.responses) >= len(pending.turns):
+                self._finish(response["id"], result=pending.responses)
+
+        # 进程退出 (已被 stop() 换下的旧进程不再动当前状态)
+        if proc is self.proc:
+            self.is_ready = False
+            self._fail_pending(RuntimeError("KataGo 进程已退出"))
+
+    def _stderr_loop(self, proc: subprocess.Popen):
+        """持续排空 stderr，避免管道写满导致引擎阻塞"""
+        startup = self.startup_stats
+        for line in proc.stderr:
+            self._stderr_tail.append(line.rstrip('\n'))
+            if startup is not None:
+                startup.observe(line)
+
+    def _finish(self, query_id: str, result: Any = None,
+                exception: Optional[Exception] = None):
+        with self._lock:
+            pending = self._pending.pop(query_id, None)
+        if pending is None or pending.future.done():
+            return
+        if exception is not None:
+            pending.future.set_exception(exception)
+        else:
+            pending.future.set_result(result)
+
+    def _fail_pending(self, error: Exception):
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for query in pending:
+            if not query.future.done():
+                query.future.set_exception(error)
+
+    def _read_stderr(self) -> str:
+        return '\n'.join(self._stderr_tail)
+
+    # ============ 便捷分析函数 ============
+
+    def analyze_game(self,
+                     moves: List[Tuple[str, str]],
+                     analyze_turns: Optional[List[int]] = None,
+                     max_visits: Optional[int] = None,
+                     timeout: Optional[float] = None,
+                     **query_fields: Any) -> Dict[int, List[MoveAnalysis]]:
+        """
+        用一个 analyzeTurns 请求分析整盘棋
+
+        Args:
+            moves: 着法序列 (GTP 坐标)
+            analyze_turns: 要分析的手数，默认 0..len(moves) 全部
+            max_visits: 每个局面的搜索次数
+
+        Returns:
+            {手数: 分析结果}
+        """
+        if analyze_turns is None:
+            analyze_turns = list(range(len(moves) + 1))
+        query = build_query(moves, analyze_turns=analyze_turns,
+                            max_visits=max_visits, **query_fields)
+        responses = self.submit(query).result(timeout=timeout)
+        return {turn: parse_move_infos(responses[turn]) for turn in sorted(responses)}
+
+    def analyze_positions(self,
+                          positions: List[List[Tuple[str, str]]],
+                          max_visits: Optional[int] = None,
+                          timeout: Optional[float] = None,
+                          **query_fields: Any) -> List[List[MoveAnalysis]]:
+        """一次性提交多个局面，结果顺序与输入一致"""
+        futures = [self.submit(build_query(moves, max_visits=max_visits, **query_fields))
+                   for moves in positions]
+        results = []
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for moves, future in zip(positions, futures):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            responses = future.result(timeout=remaining)
+            results.append(parse_move_infos(responses[len(moves)]))
+        return results
+
+    # ============ 上下文管理器 ============
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -10,7 +10,7 @@ import json
 import time
 import re
 from dataclasses import dataclass, field
-from typing import Optional, List, Dict, Any, Callable
+from typing import Optional, List, Dict, Any, Callable, Tuple
 from enum import Enum
 
 class Color(Enum):
@@ -60,16 +60,24 @@ class KataGoAnalyzer:
         self.proc: Optional[subprocess.Popen] = None
         self.is_ready = False
         
+import os
 import shutil
 import subprocess
+import tempfile
 import threading
+import queue
 import json
 import time
 import re
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, wait
 from dataclasses import dataclass, field
-from typing import Optional, List, Dict, Any, Callable
+from typing import Optional, List, Dict, Any, Callable, Iterator, TYPE_CHECKING
 from enum import Enum
 
+if TYPE_CHECKING:
+    from katago_cache import AnalysisCache
+
 class Color(Enum):
     BLACK = "B"
     WHITE = "W"
@@ -96,13 +104,219 @@ class BoardState:
     black_prisoners: int = 0
     white_prisoners: int = 0
 
+@dataclass
+class SearchStats:
+    """单次搜索统计"""
+    target_visits: int = 0
+    root_visits: int = 0          # 实际根节点访问数
+    updates: int = 0              # 收到的 info 更新次数
+    latency: float = 0.0          # 发出命令到返回结果的耗时 (秒)
+    first_update_latency: Optional[float] = None
+    stopped_by: str = ''          # visits / stable / time / eof / error / cache
+
+def default_interval(visits: int) -> int:
+    """
+    按搜索预算选择 kata-analyze 汇报间隔 (厘秒)
+
+    搜索次数只能在收到汇报时检查，间隔决定了最短延迟和超出预算的访问数：
+    小预算用 1 厘秒，大预算放宽到最多 10 厘秒以减少解析开销。
+    """
+    return min(10, max(1, visits // 1000))
+
+@dataclass
+class EarlyStop:
+    """自适应停止条件：最佳着法在连续几次更新中都稳定领先时提前结束搜索"""
+    min_visits: int = 50          # 根节点访问数达到该值后才开始判断
+    visit_share: float = 0.5      # 最佳着法占根节点访问数的最低比例
+    winrate_margin: float = 0.02  # 最佳着法领先第二候选的最低胜率差
+    stable_updates: int = 3       # 连续满足条件 (且最佳着法不变) 的更新次数
+    
+    def is_confident(self, update: List['MoveAnalysis'], root_visits: int) -> bool:
+        """单次更新是否满足停止条件"""
+        if root_visits < self.min_visits or not update:
+            return False
+        ranked = sorted(update, key=lambda a: a.order)
+        best = ranked[0]
+        if best.visits < self.visit_share * root_visits:
+            return False
+        # 只和 KataGo 排第二的候选比：访问很少的候选胜率噪声大，取全部候选的最大值会误判
+        return len(ranked) < 2 or best.winrate - ranked[1].winrate >= self.winrate_margin
+
+# 启动阶段的 stderr 标志行 (GTP 与分析引擎通用)，各取第一次出现的时间
+_STARTUP_MILESTONES = (
+    ('nn_init', 'Initializing neural net buffer'),
+    ('backend', 'backend thread'),       # Cuda / OpenCL / Metal / Eigen / TensorRT
+    ('nn_loaded', 'Loaded neural net'),
+    ('ready', 'GTP ready'),
+    ('ready', 'ready to begin handling requests'),
+)
+
+@dataclass
+class StartupStats:
+    """引擎启动耗时分解 (秒，相对进程启动)"""
+    spawned_at: float = field(default_factory=time.monotonic)
+    milestones: Dict[str, float] = field(default_factory=dict)
+    ready: Optional[float] = None         # 收到第一条命令响应的时间
+    first_eval: Optional[float] = None    # 预热时第一次神经网络计算的耗时
+    
+    def observe(self, line: str):
+        """由 stderr 读取线程调用，记录启动标志行"""
+        if 'ready' in self.milestones:
+            return
+        for name, marker in _STARTUP_MILESTONES:
+            if name not in self.milestones and marker in line:
+                self.milestones[name] = time.monotonic() - self.spawned_at
+    
+    @property
+    def model_load(self) -> Optional[float]:
+        """进程启动到开始初始化计算后端 (读取配置和模型文件)"""
+        return self.milestones.get('backend', self.milestones.get('nn_loaded'))
+    
+    @property
+    def backend_init(self) -> Optional[float]:
+        """计算后端初始化到引擎可以接受命令"""
+        if self.model_load is None or self.ready is None:
+            return None
+        return self.ready - self.model_load
+    
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            "model_load": self.model_load,
+            "backend_init": self.backend_init,
+            "ready": self.ready,
+            "first_eval": self.first_eval,
+            "milestones": dict(self.milestones),
+        }
+
+@dataclass
+class _PendingCommand:
+    """等待响应的 GTP 命令"""
+    command: str
+    future: Future
+    on_line: Optional[Callable[[str], None]] = None
+    lines: List[str] = field(default_factory=list)
+
+# GTP 响应头: "=12 内容" 或 "?12 错误信息"
+_RESPONSE_HEADER = re.compile(r'^([=?])(\d+)\s*(.*)$')
+
+# katago 可执行文件：环境变量 KATAGO_BIN 优先，其次 PATH 中的 katago
+KATAGO_BIN = os.environ.get("KATAGO_BIN") or shutil.which("katago") or "/opt/homebrew/bin/katago"
+
+# GTP 列坐标跳过字母 I
+GTP_COLUMNS = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+
+@dataclass
+class SgfGame:
+    """从 SGF 中提取的对局信息"""
+    board_size: int = 19
+    komi: float = 7.5
+    moves: List[Tuple[str, str]] = field(default_factory=list)           # [("B", "Q16"), ...]
+    initial_stones: List[Tuple[str, str]] = field(default_factory=list)  # AB/AW 摆子
+
+def sgf_to_gtp(coord: str, board_size: int = 19) -> str:
+    """SGF 坐标 (如 "pd") 转 GTP 坐标 (如 "Q16")，空坐标或 "tt" 视为 pass"""
+    if len(coord) != 2 or (coord == "tt" and board_size <= 19):
+        return "pass"
+    col = ord(coord[0]) - ord('a')
+    row = ord(coord[1]) - ord('a')
+    return f"{GTP_COLUMNS[col]}{board_size - row}"
+
+def gtp_to_sgf(move: str, board_size: int = 19) -> str:
+    """GTP 坐标 (如 "Q16") 转 SGF 坐标 (如 "pd")，pass 为空串"""
+    if move.lower() == "pass":
+        return ""
+    col = GTP_COLUMNS.index(move[0].upper())
+    row = board_size - int(move[1:])
+    return chr(ord('a') + col) + chr(ord('a') + row)
+
+def _sgf_main_line(sgf_content: str) -> List[List[Tuple[str, List[str]]]]:
+    """
+    主分支上的节点，每个节点为 [(属性名, [值, ...]), ...]
+
+    每个 "(" 处只沿第一个子分支走，其余变化 (以及文件中后续的对局) 跳过；
+    属性值按 SGF 转义规则读取，注释里的 "]" 和括号不影响结构。
+    """
+    nodes: List[List[Tuple[str, List[str]]]] = []
+    taken = [False]       # 每层是否已经走过一个子分支
+    skip_depth = None     # 正在跳过的变化所在层
+    i, n = 0, len(sgf_content)
+    while i < n:
+        ch = sgf_content[i]
+        if ch == '(':
+            if skip_depth is None:
+                if taken[-1]:
+                    skip_depth = len(taken)
+                else:
+                    taken[-1] = True
+            taken.append(False)
+            i += 1
+        elif ch == ')':
+            if len(taken) > 1:
+                taken.pop()
+            if skip_depth is not None and skip_depth == len(taken):
+                skip_depth = None
+            i += 1
+        elif ch == ';':
+            if skip_depth is None:
+                nodes.append([])
+            i += 1
+        elif ch.isupper():
+            j = i
+            while j < n and sgf_content[j].isupper():
+                j += 1
+            name, values = sgf_content[i:j], []
+            while True:
+                while j < n and sgf_content[j].isspace():
+                    j += 1
+                if j >= n or sgf_content[j] != '[':
+                    break
+                value, j = [], j + 1
+                while j < n and sgf_content[j] != ']':
+                    if sgf_content[j] == '\\':
+                        j += 1
+                    if j < n:
+                        value.append(sgf_content[j])
+                    j += 1
+                values.append(''.join(value))
+                j += 1
+            if skip_depth is None and nodes:
+                nodes[-1].append((name, values))
+            i = j
+        else:
+            i += 1
+    return nodes
+
+def parse_sgf_game(sgf_content: str) -> SgfGame:
+    """解析 SGF 文本中的棋盘大小、贴目、摆子和着法 (只取主分支，忽略变化和注释)"""
+    game = SgfGame()
+    properties = [prop for node in _sgf_main_line(sgf_content) for prop in node]
+    
+    size = next((values[0] for name, values in properties if name == 'SZ' and values), '')
+    if re.match(r'\s*\d+', size):
+        game.board_size = int(re.match(r'\s*(\d+)', size).group(1))
+    komi = next((values[0] for name, values in properties if name == 'KM' and values), '')
+    if re.fullmatch(r'\s*[-+]?\d+(\.\d*)?\s*', komi):
+        game.komi = float(komi)
+    
+    for name, values in properties:
+        if name in ('AB', 'AW'):
+            for coord in values:
+                if re.fullmatch(r'[a-z]{2}', coord):
+                    game.initial_stones.append((name[1], sgf_to_gtp(coord, game.board_size)))
+        elif name in ('B', 'W') and values and re.fullmatch(r'[a-z]{0,2}', values[0]):
+            game.moves.append((name, sgf_to_gtp(values[0], game.board_size)))
+    
+    return game
+
 class KataGoAnalyzer:
     """KataGo 分析器封装"""
     
     def __init__(self, 
                  model_path: str,
                  config_path: str = "/tmp/katago.cfg",
-                 config_overrides: Optional[Dict[str, Any]] = None):
+                 config_overrides: Optional[Dict[str, Any]] = None,
+                 katago_path: str = KATAGO_BIN,
+                 cache: Optional["AnalysisCache"] = None):
         """
         初始化
         
@@ -110,16 +324,53 @@ class KataGoAnalyzer:
             model_path: 模型文件路径 (.bin.gz)
             config_path: 配置文件路径 (可选)
             config_overrides: 配置覆盖项
+            katago_path: katago 可执行文件
+            cache: 分析结果缓存 (可选)，命中时不再搜索
         """
         self.model_path = model_path
         self.config_path = config_path
         self.config_overrides = config_overrides or {}
+        self.katago_path = katago_path
+        self.cache = cache
         self.proc: Optional[subprocess.Popen] = None
         self.is_ready = False
+        self.last_stats: Optional[SearchStats] = None
+        self.startup_stats: Optional[StartupStats] = None
+        # 最近一次 analyze(ownership=True) 的形势判断 (NumPy 数组，黑方视角)；
+        # 各次分析复用同一个数组，需要保留时请 copy()
+        self.last_ownership = None
+        self._ownership_buffer = None
+        # 引擎当前局面的着法栈，用于增量切换局面
+        self.move_stack: List[Tuple[Color, str]] = []
+        # set_position 摆出的起始局面 (不计入着法栈)
+        self.setup: List[Tuple[Color, str]] = []
+        self._unsupported_setup: set = set()  # 引擎不认识的摆子命令
+        self.board_size = 19
+        self.komi: Optional[float] = None
+        self.rules: Optional[str] = None  # None 表示配置文件中的规则
         
-    def start(self, timeout: float = 30.0) -> bool:
-        """启动 KataGo 引擎"""
-        cmd = ['/opt/homebrew/bin/katago', 'gtp']
+        # 后台读取线程与命令分发
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: Dict[int, _PendingCommand] = {}
+        self._next_id = 0
+        self._current: Optional[_PendingCommand] = None
+        self._stderr_tail: deque = deque(maxlen=200)
+        self._io_threads: List[threading.Thread] = []
+        
+    def start(self, timeout: float = 30.0, warmup: bool = False) -> bool:
+        """
+        启动 KataGo 引擎
+        
+        启动后立即发送 protocol_version：KataGo 加载完模型才开始读取命令，
+        收到响应即表示就绪，不做固定等待。stderr 中的启动标志行用于
+        统计耗时分解 (self.startup_stats)。
+        
+        Args:
+            timeout: 等待就绪的最长时间 (大模型首次加载可能需要较久)
+            warmup: 就绪后做一次神经网络计算 (kata-raw-nn)，并记录首次计算耗时
+        """
+        cmd = [self.katago_path, 'gtp']
         
         if self.config_path:
             cmd.extend(['-config', self.config_path])
@@ -134,6 +385,7 @@ class KataGoAnalyzer:
         print(f"启动 KataGo: {' '.join(cmd)}")
         
         try:
+            self.startup_stats = StartupStats()
             self.proc = subprocess.Popen(
                 cmd,
                 stdin=subprocess.PIPE,
@@ -142,15 +394,23 @@ class KataGoAnalyzer:
                 text=True,
                 bufsize=1
             )
+            self.move_stack = []
+            self.setup = []
+            self.komi = None
+            self.rules = None
+            self._start_io_threads()
             
-            # 等待初始化
-            time.sleep(2)
-            
-            # 验证就绪
-            response = self._send_command('protocol_version')
+            # 验证就绪 (引擎退出时读取线程会让命令立即失败)
+            response = self._send_command('protocol_version', timeout=timeout)
             if response and response.startswith('='):
+                startup = self.startup_stats
+                startup.ready = time.monotonic() - startup.spawned_at
                 self.is_ready = True
-                print("✓ KataGo 引擎就绪")
+                if warmup:
+                    eval_start = time.monotonic()
+                    self._send_command('kata-raw-nn 0', timeout=timeout)
+                    startup.first_eval = time.monotonic() - eval_start
+                print(f"✓ KataGo 引擎就绪 ({startup.ready:.1f}s)")
                 return True
             
             # 检查 stderr
@@ -166,68 +426,187 @@ class KataGoAnalyzer:
         """停止引擎"""
         if self.proc:
             try:
-                self.proc.stdin.write('quit\n')
-                self.proc.stdin.flush()
+                self.send_command_async('quit').result(timeout=5)
                 self.proc.wait(timeout=5)
             except:
                 self.proc.kill()
+            # 等读取线程读完旧进程的输出再返回，紧接着的 start() 不会被它干扰
+            for thread in self._io_threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout=5)
+            self._fail_pending(RuntimeError("KataGo 已停止"))
             self.proc = None
             self.is_ready = False
             print("✓ KataGo 已停止")
     
-    def _send_command(self, cmd: str, timeout: float = 5.0) -> str:
-        """发送 GTP 命令并获取响应"""
-        if not self.proc:
-            return ""
+    # ============ 后台读取与响应分发 ============
+    
+    def _start_io_threads(self):
+        """启动 stdout 读取线程和 stderr 排空线程"""
+        self._current = None
+        self._stderr_tail.clear()
+        proc = self.proc
+        self._io_threads = [
+            threading.Thread(target=self._stdout_loop, args=(proc,),
+                             name='katago-stdout', daemon=True),
+            threading.Thread(target=self._stderr_loop, args=(proc,),
+                             name='katago-stderr', daemon=True),
+        ]
+        for thread in self._io_threads:
+            thread.start()
+    
+    def _stdout_loop(self, proc: subprocess.Popen):
+        """按 GTP 命令编号把输出分发给对应的 Future"""
+        for raw in proc.stdout:
+            line = raw.strip()
+            current = self._current
+            
+            if current is None:
+                # 响应之间的空行
+                if not line:
+                    continue
+                match = _RESPONSE_HEADER.match(line)
+                if not match:
+                    continue
+                with self._lock:
+                    current = self._pending.pop(int(match.group(2)), None)
+                if current is None:
+                    # 已超时放弃的命令，丢弃其输出直到空行
+                    current = _PendingCommand('', Future())
+                # 去掉编号，保持 "= 内容" 的响应格式
+                payload = match.group(3)
+                current.lines.append(match.group(1) + (' ' + payload if payload else ''))
+                self._current = current
+                continue
+            
+            if not line:
+                # 空行表示响应结束
+                self._current = None
+                if not current.future.done():
+                    current.future.set_result('\n'.join(current.lines))
+                continue
+            
+            if current.on_line is not None:
+                current.on_line(line)
+            else:
+                current.lines.append(line)
         
-        self.proc.stdin.write(cmd + '\n')
-        self.proc.stdin.flush()
+        # 进程退出 (已被 stop() 换下的旧进程不再动当前状态)
+        if proc is self.proc:
+            self._current = None
+            self.is_ready = False
+            self._fail_pending(RuntimeError("KataGo 进程已退出"))
+    
+    def _stderr_loop(self, proc: subprocess.Popen):
+        """持续排空 stderr，避免管道写满导致引擎阻塞"""
+        startup = self.startup_stats
+        for line in proc.stderr:
+            self._stderr_tail.append(line.rstrip('\n'))
+            if startup is not None:
+                startup.observe(line)
+    
+    def _fail_pending(self, error: Exception):
+        """让所有未完成的命令以异常结束"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for command in pending:
+            if not command.future.done():
+                command.future.set_exception(error)
+    
+    def send_command_async(self, cmd: str,
+                           on_line: Optional[Callable[[str], None]] = None) -> Future:
+        """
+        发送带编号的 GTP 命令，立即返回 Future
         
-        # 读取响应
-        lines = []
-        start_time = time.time()
+        可以连续发送多条命令而不等待每次往返。Future 的结果是响应文本
+        ("= ..." 或 "? ...")；on_line 用于流式命令，响应中的每一行
+        在到达时回调，不再累积到结果里。
+        """
+        future: Future = Future()
+        if not self.proc or self.proc.poll() is not None:
+            future.set_exception(RuntimeError("KataGo 未运行"))
+            return future
         
-        while time.time() - start_time < timeout:
-            line = self.proc.stdout.readline()
-            if not line:
-                break
-            line = line.strip()
-            lines.append(line)
-            if line.startswith('=') or line.startswith('?'):
-                break
+        with self._lock:
+            self._next_id += 1
+            command_id = self._next_id
+            self._pending[command_id] = _PendingCommand(cmd, future, on_line)
         
-        return '\n'.join(lines)
+        try:
+            with self._write_lock:
+                self.proc.stdin.write(f'{command_id} {cmd}\n')
+                self.proc.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            with self._lock:
+                self._pending.pop(command_id, None)
+            future.set_exception(RuntimeError(f"写入 KataGo 失败: {e}"))
+        return future
     
-    def _read_stderr(self) -> str:
-        """读取 stderr"""
+    def _send_command(self, cmd: str, timeout: float = 5.0) -> str:
+        """
+        发送 GTP 命令并获取响应
+        
+        Raises:
+            TimeoutError: 引擎在 timeout 秒内没有响应
+        """
         if not self.proc:
             return ""
         
+        future = self.send_command_async(cmd)
         try:
-            # 非阻塞读取
-            import select
-            if select.select([self.proc.stderr], [], [], 0.1)[0]:
-                return self.proc.stderr.read()
-        except:
-            pass
-        return ""
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # 放弃等待：迟到的响应由读取线程丢弃
+            with self._lock:
+                for command_id, command in list(self._pending.items()):
+                    if command.future is future:
+                        del self._pending[command_id]
+            raise TimeoutError(f"KataGo 响应超时 ({timeout}s): {cmd}")
+        except RuntimeError as e:
+            print(f"命令失败: {cmd}: {e}")
+            return ""
+    
+    def _read_stderr(self) -> str:
+        """读取最近的 stderr 输出"""
+        return '\n'.join(self._stderr_tail)
     
     # ============ 基础 GTP 操作 ============
     
     def set_board_size(self, size: int = 19) -> bool:
         """设置棋盘尺寸"""
         response = self._send_command(f'boardsize {size}')
-        return response.startswith('=')
+        if response.startswith('='):
+            self.board_size = size
+            self.move_stack.clear()
+            self.setup = []
+            return True
+        return False
     
     def clear_board(self) -> bool:
         """清空棋盘"""
         response = self._send_command('clear_board')
-        return response.startswith('=')
+        if response.startswith('='):
+            self.move_stack.clear()
+            self.setup = []
+            return True
+        return False
     
     def set_komi(self, komi: float = 7.5) -> bool:
         """设置贴目"""
         response = self._send_command(f'komi {komi}')
-        return response.startswith('=')
+        if response.startswith('='):
+            self.komi = komi
+            return True
+        return False
+    
+    def set_rules(self, rules: str) -> bool:
+        """设置规则 (chinese / japanese / tromp-taylor 等)"""
+        response = self._send_command(f'kata-set-rules {rules}')
+        if response.startswith('='):
+            self.rules = rules
+            return True
+        return False
     
     def play(self, color: Color, move: str) -> bool:
         """
@@ -238,161 +617,383 @@ class KataGoAnalyzer:
             move: 坐标 (如 "Q16") 或 "pass"
         """
         response = self._send_command(f'play {color.value} {move}')
-        return response.startswith('=')
+        if response.startswith('='):
+            self.move_stack.append((color, move))
+            return True
+        return False
     
     def undo(self) -> bool:
         """悔棋"""
         response = self._send_command('undo')
-        return response.startswith('=')
+        if response.startswith('=') and self.move_stack:
+            self.move_stack.pop()
+            return True
+        return False
     
-    def genmove(self, color: Color) -> str:
+    def genmove(self, color: Color, timeout: float = 60.0) -> str:
         """
         生成一手棋
         
         Returns:
             最佳着法坐标
         """
-        response = self._send_command(f'genmove {color.value}')
+        response = self._send_command(f'genmove {color.value}', timeout=timeout)
         lines = response.split('\n')
         for line in lines:
             if line.startswith('= '):
-                return line[2:].strip().split()[0]  # 返回第一个词
+                move = line[2:].strip().split()[0]  # 返回第一个词
+                if move.lower() != 'resign':
+                    self.move_stack.append((color, move))
+                return move
         return "pass"
     
+    # ============ 局面导航 ============
+    
+    def goto_position(self, moves: List[Tuple[Any, str]], timeout: float = 10.0) -> bool:
+        """
+        把引擎局面切换到指定着法序列，只发送必要的命令
+        
+        与当前着法栈比较公共前缀：退回多出的着法 (undo)，再补上缺少的着法
+        (play)；差异比从头摆更大时才回到起始局面 (清盘或 setup) 重摆。命令流水线发送，
+        逐手前进时只需一条 play，KataGo 可以复用上一次的搜索树。
+        
+        Args:
+            moves: 目标着法序列 [(Color 或 "B"/"W", "Q16"), ...]
+            
+        Returns:
+            是否全部成功
+        """
+        target = [(color if isinstance(color, Color) else Color(color.upper()), move)
+                  for color, move in moves]
+        
+        common = 0
+        limit = min(len(self.move_stack), len(target))
+        while common < limit and self.move_stack[common] == target[common]:
+            common += 1
+        
+        undo_count = len(self.move_stack) - common
+        # 引擎只能逐子 play 摆出 setup 时，重摆的代价要算上摆子
+        setup_cost = len(self.setup) if {'set_position', 'loadsgf'} <= self._unsupported_setup else 0
+        if undo_count + len(target) - common > 1 + setup_cost + len(target):
+            reset = self.set_position(self.setup, timeout) if self.setup else self.clear_board()
+            if not reset:
+                return False
+            common = 0
+            undo_count = 0
+        
+        futures = [self.send_command_async('undo') for _ in range(undo_count)]
+        futures += [self.send_command_async(f'play {color.value} {move}')
+                    for color, move in target[common:]]
+        
+        ok = True
+        for i, future in enumerate(futures):
+            try:
+                response = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                raise TimeoutError(f"KataGo 响应超时 ({timeout}s): 切换局面")
+            except RuntimeError as e:
+                print(f"切换局面失败: {e}")
+                return False
+            success = response.startswith('=')
+            if i < undo_count:
+                if success:
+                    self.move_stack.pop()
+            else:
+                move = target[common + i - undo_count]
+                if success:
+                    self.move_stack.append(move)
+                else:
+                    print(f"着法失败: {move[0].value} {move[1]} {response}")
+            ok = ok and success
+        return ok
+    
+    def set_position(self, stones: List[Tuple[Any, str]], timeout: float = 10.0) -> bool:
+        """
+        一条命令摆出任意局面 (照片识别等没有着法顺序的静态局面)
+        
+        依次尝试 KataGo 的 `set_position` 扩展和加载带 AB/AW 的临时 SGF
+        (`loadsgf`)，引擎都不支持时才清盘后流水线发送 play。摆出的棋子
+        记入 self.setup 而不是着法栈，不产生虚假的着法顺序；轮走方由
+        分析时的 color 决定，之后的 goto_position 以该局面为起点。
+        
+        Args:
+            stones: [(Color 或 "B"/"W", "Q16"), ...]，pass 会被忽略
+            
+        Returns:
+            是否摆放成功
+        """
+        stones = [(color if isinstance(color, Color) else Color(color.upper()), move)
+                  for color, move in stones if move.lower() != 'pass']
+        for method in ('set_position', 'loadsgf', 'play'):
+            if method in self._unsupported_setup:
+                continue
+            response = getattr(self, f'_setup_by_{method}')(stones, timeout)
+            if response.startswith('?') and 'unknown command' in response:
+                self._unsupported_setup.add(method)
+                continue
+            if not response.startswith('='):
+                print(f"摆放局面失败 ({method}): {response}")
+                return False
+            self.move_stack = []
+            self.setup = stones
+            return True
+        return False
+    
+    def ensure_setup(self, stones: List[Tuple[Any, str]], timeout: float = 10.0) -> bool:
+        """起始局面不同时才重新摆放；相同则保留着法栈，供 goto_position 增量切换"""
+        target = [(color if isinstance(color, Color) else Color(color.upper()), move)
+                  for color, move in stones if move.lower() != 'pass']
+        if target == self.setup:
+            return True
+        return self.set_position(target, timeout)
+    
+    def _setup_by_set_position(self, stones: List[Tuple[Color, str]], timeout: float) -> str:
+        args = ' '.join(f'{color.value} {move}' for color, move in stones)
+        return self._send_command(f'set_position {args}'.rstrip(), timeout=timeout)
+    
+    def _setup_by_loadsgf(self, stones: List[Tuple[Color, str]], timeout: float) -> str:
+        size = self.board_size
+        sgf = f"(;FF[4]GM[1]SZ[{size}]"
+        if self.komi is not None:
+            sgf += f"KM[{self.komi}]"
+        for color in (Color.BLACK, Color.WHITE):
+            coords = [gtp_to_sgf(move, size) for c, move in stones if c == color]
+            if coords:
+                sgf += f"A{color.value}" + ''.join(f'[{coord}]' for coord in coords)
+        sgf += ")"
+        
+        with tempfile.NamedTemporaryFile('w', suffix='.sgf', delete=False) as f:
+            f.write(sgf)
+        try:
+            return self._send_command(f'loadsgf {f.name}', timeout=timeout)
+        finally:
+            os.unlink(f.name)
+    
+    def _setup_by_play(self, stones: List[Tuple[Color, str]], timeout: float) -> str:
+        """清盘后流水线发送 play (GTP 允许同色连续落子)"""
+        futures = [self.send_command_async('clear_board')]
+        futures += [self.send_command_async(f'play {color.value} {move}')
+                    for color, move in stones]
+        for future in futures:
+            try:
+                response = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                raise TimeoutError(f"KataGo 响应超时 ({timeout}s): 摆放局面")
+            except RuntimeError as e:
+                return f"? {e}"
+            if not response.startswith('='):
+                return response
+        return '='
+    
     # ============ 分析功能 ============
     
     def analyze(self, 
                 color: Color, 
                 visits: int = 200,
-                verbose: bool = False) -> List[MoveAnalysis]:
+                verbose: bool = False,
+                max_time: Optional[float] = 30.0,
+                interval: Optional[int] = None,
+                early_stop: Optional[EarlyStop] = None,
+                ownership: bool = False) -> List[MoveAnalysis]:
         """
         分析当前局面
         
         Args:
             color: 当前执黑/执白
-            visits: 搜索次数
+            visits: 根节点目标搜索次数，达到即停止 (自适应模式下为上限)
             verbose: 详细输出
+            max_time: 墙钟时间预算 (秒)，None 表示不限
+            interval: kata-analyze 汇报间隔 (厘秒)，None 表示按 visits 选择 (default_interval)
+            early_stop: 自适应停止条件，None 表示总是搜满 visits
+            ownership: 同时请求形势判断，结果见 self.last_ownership
             
         Returns:
             按优先级排序的分析结果列表
         """
-        if not self.is_ready:
-            print("引擎未就绪")
-            return []
+        results, _ = self.analyze_with_stats(color, visits=visits, verbose=verbose,
+                                             max_time=max_time, interval=interval,
+                                             early_stop=early_stop, ownership=ownership)
+        return results
+    
+    def analyze_with_stats(self,
+                           color: Color,
+                           visits: int = 200,
+                           verbose: bool = False,
+                           max_time: Optional[float] = 30.0,
+                           interval: Optional[int] = None,
+                           early_stop: Optional[EarlyStop] = None,
+                           ownership: bool = False,
+                           allow: Optional[List[str]] = None) -> Tuple[List[MoveAnalysis], SearchStats]:
+        """
+        流式分析当前局面，返回分析结果和本次搜索统计
         
-        results = []
+        发送 `kata-analyze <color> interval <interval>`，逐条解析 info 更新，
+        根节点访问数达到 visits 或超出 max_time 后立即发送 stop，
+        interval 未给出时按 visits 选择 (小预算 1 厘秒，避免大幅超出预算)，
+        并读到分析输出的结束空行为止，不依赖固定等待。
+        给出 early_stop 时，最佳着法在连续几次更新中稳定领先即提前停止，
+        实际花费的访问数见 stats.root_visits。
+        设置了 cache 时先查缓存，搜索结果按实际访问数写回缓存。
+        ownership=True 时只保留最后一次更新的 ownership 文本，
+        结束后一次性解码进复用的 float32 数组 (self.last_ownership)。
+        allow 把第一手限制在给定着法内 (这些着法都会出现在结果中)。
+        """
+        from katago_parse import parse_info_line
+        
+        stats = SearchStats(target_visits=visits)
+        self.last_stats = stats
+        self.last_ownership = None
         
-        # 使用 kata-analyze，添加参数使其只输出一次最终结果
-        cmd = f'kata-analyze {color.value} {visits}'
-        self.proc.stdin.write(cmd + '\n')
-        self.proc.stdin.flush()
+        cache_key = None
+        if self.cache is not None and not allow:
+            start_time = time.monotonic()
+            cache_key = self.cache.make_key(self.move_stack, color, self.komi,
+                                            self.rules, self.board_size, self.setup)
+            # 缓存中没有 ownership，需要时直接搜索
+            cached = None if ownership else self.cache.get(cache_key, visits)
+            if cached is not None:
+                stats.stopped_by = 'cache'
+                stats.root_visits = sum(a.visits for a in cached)
+                stats.latency = time.monotonic() - start_time
+                if verbose:
+                    for idx, analysis in enumerate(cached, 1):
+                        self._print_analysis(analysis, idx)
+                    print(f"  缓存命中 (根节点访问 {stats.root_visits})")
+                return cached, stats
         
-        # 等待分析完成
-        import time
-        time.sleep(3)
+        if not self.is_ready:
+            print("引擎未就绪")
+            return [], stats
         
-        # 收集分析结果
-        max_lines = 100
-        line_count = 0
+        results: List[MoveAnalysis] = []
+        start_time = time.monotonic()
+        deadline = start_time + max_time if max_time is not None else None
         
-        while line_count < max_lines:
+        # info 行由读取线程推入队列；命令结束 (出错或引擎退出) 时推入 None
+        updates: queue.Queue = queue.Queue()
+        if interval is None:
+            interval = default_interval(visits)
+        command = f'kata-analyze {color.value} interval {interval}'
+        if ownership:
+            command += ' ownership true'
+        if allow:
+            command += f" minmoves {len(allow)} allow {color.value} {','.join(allow)} 1"
+        limit = max(10, len(allow)) if allow else 10
+        future = self.send_command_async(command, on_line=updates.put)
+        future.add_done_callback(lambda _: updates.put(None))
+        
+        stats.stopped_by = 'eof'
+        stable_updates = 0
+        best_move = None
+        ownership_text = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
             try:
-                # 使用 poll 检查是否有数据
-                if self.proc.stdout.closed:
-                    break
-                    
-                line = self.proc.stdout.readline()
-                if not line or line == '':
-                    break
-                
-                line = line.strip()
-                line_count += 1
-                
-                # 检查是否完成
-                if line.startswith('=') or line.startswith('?'):
-                    break
-                
-                # 跳过空行
-                if not line:
-                    continue
-                
-                # 解析 GTP 扩展格式: info move C17 visits 10 ...
-                if line.startswith('info '):
-                    analysis = self._parse_gtp_analysis(line)
-                    if analysis:
-                        results.append(analysis)
-                        if verbose:
-                            self._print_analysis(analysis, len(results))
-                        
-            except Exception as e:
-                print(f"读取错误: {e}")
+                line = updates.get(timeout=timeout)
+            except queue.Empty:
+                # 预算耗尽时引擎还没有给出 (新的) 更新
+                stats.stopped_by = 'time'
+                self._stop_analysis(future)
                 break
+            
+            if line is None:
+                # 命令已结束：出错或引擎退出
+                if future.exception() is None and future.result().startswith('?'):
+                    print(f"kata-analyze 失败: {future.result()}")
+                    stats.stopped_by = 'error'
+                break
+            if not line.startswith('info '):
+                continue
+            try:
+                update, tail = parse_info_line(line)
+            except ValueError as e:
+                print(f"解析错误: {e} in: {line[:50]}")
+                continue
+            if tail is not None:
+                ownership_text = tail
+            if not update:
+                continue
+            
+            now = time.monotonic()
+            if stats.updates == 0:
+                stats.first_update_latency = now - start_time
+            stats.updates += 1
+            stats.root_visits = sum(a.visits for a in update)
+            results = update
+            
+            if early_stop is not None:
+                leader = min(update, key=lambda a: a.order).move
+                if early_stop.is_confident(update, stats.root_visits) and leader == best_move:
+                    stable_updates += 1
+                else:
+                    stable_updates = 0
+                best_move = leader
+            
+            if stats.root_visits >= visits:
+                stats.stopped_by = 'visits'
+            elif early_stop is not None and stable_updates >= early_stop.stable_updates:
+                stats.stopped_by = 'stable'
+            elif deadline is not None and now >= deadline:
+                stats.stopped_by = 'time'
+            else:
+                continue
+            
+            self._stop_analysis(future)
+            break
         
-        # 发送 stop 命令
-        self.proc.stdin.write('stop\n')
-        self.proc.stdin.flush()
-        time.sleep(0.5)
-        
-        # 消耗剩余输出
-        try:
-            while True:
-                if self.proc.stdout.closed:
-                    break
-                line = self.proc.stdout.readline()
-                if not line or line.strip() == '':
-                    break
-        except:
-            pass
+        if ownership_text:
+            from katago_heatmap import decode_ownership
+            buffer = self._ownership_buffer
+            if buffer is not None and buffer.shape != (self.board_size, self.board_size):
+                buffer = None
+            try:
+                self.last_ownership = self._ownership_buffer = decode_ownership(
+                    ownership_text, color, self.board_size, out=buffer)
+            except ValueError as e:
+                print(f"⚠️ ownership 解码失败: {e}")
+        stats.latency = time.monotonic() - start_time
         
         # 按 order 排序
         results.sort(key=lambda x: x.order if x.order >= 0 else 999)
-        return results[:10]
+        if cache_key is not None and stats.stopped_by in ('visits', 'stable', 'time') and results:
+            self.cache.put(cache_key, stats.root_visits, results[:10])
+        if verbose:
+            for idx, analysis in enumerate(results[:limit], 1):
+                self._print_analysis(analysis, idx)
+            print(f"  根节点访问 {stats.root_visits}，"
+                  f"{stats.updates} 次更新，耗时 {stats.latency*1000:.0f} ms")
+        return results[:limit], stats
     
-    def _parse_gtp_analysis(self, line: str) -> Optional[MoveAnalysis]:
-        """解析 GTP 扩展格式的分析结果"""
+    def _stop_analysis(self, analyze_future: Future, timeout: float = 5.0):
+        """
+        中止 kata-analyze，等待其输出结束和 stop 的响应
+        
+        Raises:
+            TimeoutError: 引擎没有在 timeout 秒内停下
+        """
+        stop_future = self.send_command_async('stop')
         try:
-            # 格式: info move C17 visits 10 winrate 0.95 scoreLead 13.5 ...
-            parts = line.split()
-            
-            data = {}
-            i = 1
-            while i < len(parts):
-                key = parts[i]
-                value = parts[i + 1] if i + 1 < len(parts) else ''
-                data[key] = value
-                i += 2
-            
-            # 提取关键字段
-            move = data.get('move', '')
-            if not move or move == 'pass':
-                return None
-            
-            visits = int(data.get('visits', 0))
-            winrate = float(data.get('winrate', 0.5))
-            score_lead = float(data.get('scoreLead', 0.0))
-            prior = float(data.get('prior', 0.0))
-            order = int(data.get('order', 0))
-            
-            # 提取 PV
-            pv = []
-            pv_start = line.find('pv ')
-            if pv_start != -1:
-                pv_str = line[pv_start + 3:].split()[0]
-                pv = pv_str.split() if pv_str else []
-            
-            return MoveAnalysis(
-                move=move,
-                visits=visits,
-                winrate=winrate,
-                score_lead=score_lead,
-                policy=prior,
-                pv=pv,
-                order=order
-            )
-            
-        except Exception as e:
+            wait([analyze_future, stop_future], timeout=timeout)
+            stop_future.result(timeout=0)
+        except FutureTimeoutError:
+            raise TimeoutError(f"KataGo 未能在 {timeout}s 内停止分析")
+        except RuntimeError:
+            # 引擎已退出，由调用方通过 is_ready 感知
+            pass
+    
+    def _parse_info_update(self, line: str) -> List[MoveAnalysis]:
+        """解析一条 kata-analyze 更新 (同一行包含全部候选着法)"""
+        from katago_parse import parse_info_line
+        try:
+            return parse_info_line(line)[0]
+        except ValueError as e:
             print(f"解析错误: {e} in: {line[:50]}")
-            return None
+            return []
+    
+    def _parse_gtp_analysis(self, line: str) -> Optional[MoveAnalysis]:
+        """解析单个候选着法 (info move C17 visits 10 winrate 0.95 ... pv C17 D4)"""
+        results = self._parse_info_update(line)
+        return results[0] if results else None
     
     def _print_analysis(self, analysis: MoveAnalysis, idx: int):
         """打印分析结果"""
@@ -418,23 +1019,27 @@ class KataGoAnalyzer:
         Returns:
             分析结果列表
         """
-        # 设置棋盘
-        self.clear_board()
-        self.set_komi(board_state.komi)
-        
-        # 复盘
-        for move in board_state.move_history:
-            color = Color.BLACK if len(move) % 2 == 1 else Color.WHITE
-            self.play(color, move)
+        if self.board_size != board_state.board_size:
+            self.set_board_size(board_state.board_size)
+        if self.komi != board_state.komi:
+            self.set_komi(board_state.komi)
         
-        # 分析
+        # 着法交替，由轮走方倒推每一手的颜色 (最后一手是对方下的)
+        n = len(board_state.move_history)
+        opponent = Color.WHITE if board_state.turn == Color.BLACK else Color.BLACK
+        moves = [(board_state.turn if (n - i) % 2 == 0 else opponent, move)
+                 for i, move in enumerate(board_state.move_history)]
+        # 增量切换局面，与上一次分析的公共前缀不再重摆
+        if not self.goto_position(moves):
+            return []
         return self.analyze(board_state.turn, visits=visits)
     
     def get_best_move(self, 
                        color: Color, 
-                       visits: int = 200) -> Optional[str]:
-        """获取最佳着法"""
-        results = self.analyze(color, visits=visits)
+                       visits: int = 200,
+                       early_stop: Optional[EarlyStop] = None) -> Optional[str]:
+        """获取最佳着法 (传入 early_stop 时在最佳着法稳定后提前停止，visits 为上限)"""
+        results = self.analyze(color, visits=visits, early_stop=early_stop)
         if results:
             return results[0].move
         return None
@@ -446,33 +1051,32 @@ class KataGoAnalyzer:
         """
         比较多个着法
         
+        用 kata-analyze 的 allow 把第一手限制在候选着法内，一次搜索同时评估全部候选，
+        不改变引擎局面。
+        
         Args:
             color: 执子颜色
             moves: 要比较的着法列表
-            visits: 搜索次数
+            visits: 整次搜索的根节点访问数 (由各候选分摊)
             
         Returns:
-            各着法的分析结果
+            各着法的分析结果；与逐手落子分析一致，胜率和目数为对方应手后的视角
+            (越低对 color 越好)，pv 为对方的应对变化
         """
-        results = {}
+        analysis, _ = self.analyze_with_stats(color, visits=visits, allow=moves)
+        by_move = {a.move.upper(): a for a in analysis}
         
+        results = {}
         for move in moves:
-            # 下这手棋
-            self.play(color, move)
-            
-            # 分析对方应手
-            opponent = Color.WHITE if color == Color.BLACK else Color.BLACK
-            analysis = self.analyze(opponent, visits=visits)
-            
-            # 保存这手棋的信息
-            if analysis:
+            a = by_move.get(move.upper())
+            if a is not None and a.visits > 0:
                 results[move] = MoveAnalysis(
                     move=move,
-                    visits=0,
-                    winrate=analysis[0].winrate if analysis else 0.5,
-                    score_lead=analysis[0].score_lead if analysis else 0.0,
-                    policy=0.0,
-                    pv=[]
+                    visits=a.visits,
+                    winrate=1.0 - a.winrate,
+                    score_lead=-a.score_lead,
+                    policy=a.policy,
+                    pv=a.pv[1:]
                 )
             else:
                 results[move] = MoveAnalysis(
@@ -482,70 +1086,96 @@ class KataGoAnalyzer:
                     score_lead=0.0,
                     policy=0.0
                 )
-            
-            # 撤销
-            self.undo()
-            self.undo()
         
         return results
     
     # ============ SGF 棋谱分析 ============
     
+    def iter_game(self,
+                  moves: List[Tuple[Any, str]],
+                  turns: Optional[List[int]] = None,
+                  stride: int = 1,
+                  visits: int = 200,
+                  setup: Optional[List[Tuple[Any, str]]] = None,
+                  **analyze_kwargs: Any) -> Iterator[Tuple[int, List[MoveAnalysis], SearchStats]]:
+        """
+        从第一手到最后一手单向走一遍棋谱，逐个局面分析并即时产出结果
+        
+        相邻局面之间只发送一条 play，KataGo 可以复用上一次的搜索树。
+        
+        Args:
+            moves: 着法序列 [("B", "Q16"), ...] (GTP 坐标)
+            turns: 要分析的手数 (0 为第一手之前)，默认按 stride 取 0..len(moves)
+            stride: 每隔几手分析一次 (turns 为 None 时生效)
+            visits: 每个局面的搜索次数
+            setup: 第 0 手之前摆好的棋子 (用 set_position 一次摆出)
+            analyze_kwargs: 透传给 analyze_with_stats (如 early_stop、max_time)
+            
+        Yields:
+            (手数, 分析结果, 搜索统计)，轮走方为该手数之后下一手的一方
+        """
+        if not self.ensure_setup(setup or []):
+            print("无法摆出起始局面")
+            return
+        if turns is None:
+            turns = list(range(0, len(moves) + 1, max(1, stride)))
+        wanted = sorted({t for t in turns if 0 <= t <= len(moves)})
+        
+        for turn in wanted:
+            if not self.goto_position(list(moves[:turn])):
+                print(f"无法前进到第 {turn} 手")
+                return
+            if turn < len(moves):
+                color = moves[turn][0]
+                color = color if isinstance(color, Color) else Color(color.upper())
+            elif moves:
+                last = moves[-1][0]
+                last = last if isinstance(last, Color) else Color(last.upper())
+                color = Color.WHITE if last == Color.BLACK else Color.BLACK
+            else:
+                color = Color.BLACK
+            results, stats = self.analyze_with_stats(color, visits=visits, **analyze_kwargs)
+            yield turn, results, stats
+    
     def analyze_sgf(self, 
                      sgf_path: str,
                      moves_to_analyze: Optional[List[int]] = None,
-                     visits: int = 200) -> Dict[int, List[MoveAnalysis]]:
+                     visits: int = 200,
+                     stride: int = 1,
+                     verbose: bool = False) -> Dict[int, List[MoveAnalysis]]:
         """
-        分析 SGF 棋谱的指定局面
+        分析 SGF 棋谱的指定局面 (单向遍历整盘棋，复用搜索树)
         
         Args:
             sgf_path: SGF 文件路径
-            moves_to_analyze: 要分析的手数列表 (如 [50, 100, 150])
+            moves_to_analyze: 要分析的手数列表 (如 [50, 100, 150])，默认全部局面
             visits: 搜索次数
+            stride: 未指定手数时每隔几手分析一次
+            verbose: 逐手打印最佳着法
             
         Returns:
             {手数: 分析结果}
         """
-        results = {}
-        
-        # 加载 SGF
-        response = self._send_command(f'loadsgf {sgf_path}')
-        if not response.startswith('='):
-            print(f"加载 SGF 失败: {response}")
-            return results
+        with open(sgf_path, 'r') as f:
+            game = parse_sgf_game(f.read())
         
-        # 获取棋盘状态
-        response = self._send_command('printsgf')
-        board_info = self._parse_board_info(response)
-        
-        if not moves_to_analyze:
-            # 分析所有关键点
-            total_moves = board_info.get('moves', 0)
-            moves_to_analyze = [i for i in range(10, total_moves, 10)]  # 每10手分析
-        
-        for move_num in moves_to_analyze:
-            if move_num > board_info.get('moves', 0):
-                break
-            
-            # 前进到指定局面
-            self._send_command(f'gogui-gfx-analyze_commands\n')
-            # 这里简化处理，实际应逐手复盘
-            
-            print(f"\n分析第 {move_num} 手:")
-            analysis = self.analyze(Color.WHITE, visits=visits, verbose=True)
-            results[move_num] = analysis
+        if self.board_size != game.board_size:
+            self.set_board_size(game.board_size)
+        if self.komi != game.komi:
+            self.set_komi(game.komi)
         
+        results = {}
+        for turn, analysis, stats in self.iter_game(game.moves, turns=moves_to_analyze,
+                                                    stride=stride, visits=visits,
+                                                    setup=game.initial_stones):
+            results[turn] = analysis
+            if verbose and analysis:
+                best = analysis[0]
+                print(f"第 {turn} 手: {best.move}  胜率 {best.winrate*100:.1f}%  "
+                      f"目数 {best.score_lead:+.1f}  ({stats.root_visits} 次, "
+                      f"{stats.latency*1000:.0f} ms)")
         return results
     
-    def _parse_board_info(self, response: str) -> Dict[str, Any]:
-        """解析棋盘信息"""
-        info = {}
-        lines = response.split('\n')
-        for line in lines:
-            if 'Moves' in line:
-                info['moves'] = int(line.split(':')[1].strip())
-        return info
-    
     # ============ 上下文管理器 ============
     
     def __enter__(self):
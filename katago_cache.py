@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+KataGo 分析结果缓存
+用 SQLite 持久化分析结果，键为 (局面 Zobrist 哈希, 轮走方, 贴目, 规则, 棋盘尺寸)，
+请求的搜索次数不超过已缓存的次数即可直接命中，超出容量时按最近访问时间淘汰。
+局面先规范化到 8 种对称中哈希最小的朝向，旋转或镜像的棋谱共用同一条缓存，
+结果以规范朝向存储，取出时再变换回调用方的朝向。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, asdict, replace
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Any
+
+from katago_analyzer import MoveAnalysis
+from go_position import (Position, stone_value, transform_move, BLACK,
+                         INVERSE_SYMMETRY)
+
+DEFAULT_CACHE_PATH = str(Path.home() / ".cache" / "katago_analysis.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    pos_hash    TEXT NOT NULL,
+    to_move     TEXT NOT NULL,
+    komi        REAL NOT NULL,
+    rules       TEXT NOT NULL,
+    board_size  INTEGER NOT NULL,
+    visits      INTEGER NOT NULL,
+    results     TEXT NOT NULL,
+    created     REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (pos_hash, to_move, komi, rules, board_size, visits)
+);
+CREATE INDEX IF NOT EXISTS analysis_last_access ON analysis (last_access);
+"""
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    """缓存键；symmetry 是调用方局面到规范朝向的对称变换，不参与查找"""
+    pos_hash: str
+    to_move: str
+    komi: float
+    rules: str
+    board_size: int
+    symmetry: int = 0
+
+    def columns(self) -> Tuple:
+        return (self.pos_hash, self.to_move, self.komi, self.rules, self.board_size)
+
+
+def transform_results(results: List[MoveAnalysis], symmetry: int,
+                      board_size: int = 19) -> List[MoveAnalysis]:
+    """对分析结果中的着法和主要变化做对称变换"""
+    if symmetry == 0:
+        return results
+    return [replace(a,
+                    move=transform_move(a.move, symmetry, board_size),
+                    pv=[transform_move(m, symmetry, board_size) for m in a.pv])
+            for a in results]
+
+
+class AnalysisCache:
+    """分析结果的磁盘缓存 (线程安全，可在多个引擎间共享)"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 200_000):
+        """
+        初始化
+
+        Args:
+            path: SQLite 数据库文件，":memory:" 表示只在内存中缓存
+            max_entries: 最多保留的条目数，超出时淘汰最久未访问的条目
+        """
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # 条目数只在打开时数一次，之后随写入和删除增减 (COUNT(*) 要扫全表)
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(moves: List[Tuple[Any, str]],
+                 to_move: Any,
+                 komi: Optional[float],
+                 rules: Optional[str],
+                 board_size: int = 19,
+                 initial_stones: Optional[List[Tuple[Any, str]]] = None) -> CacheKey:
+        """
+        由着法序列计算缓存键
+
+        不同着法顺序到达的同一局面，以及它的旋转和镜像，都得到同一个键
+        """
+        position = Position.from_moves(moves, board_size, initial_stones)
+        pos_hash, symmetry = position.canonical_hash(to_move)
+        side = "B" if stone_value(to_move) == BLACK else "W"
+        return CacheKey(f"{pos_hash:016x}", side,
+                        float(komi if komi is not None else 7.5),
+                        (rules or "default").lower(), board_size, symmetry)
+
+    def get(self, key: CacheKey, visits: int) -> Optional[List[MoveAnalysis]]:
+        """
+        查找至少 visits 次搜索的结果，有多条时取搜索次数最少的一条
+
+        Returns:
+            命中返回分析结果，否则 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT visits, results FROM analysis WHERE pos_hash=? AND to_move=? "
+                "AND komi=? AND rules=? AND board_size=? AND visits>=? "
+                "ORDER BY visits LIMIT 1",
+                key.columns() + (visits,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE analysis SET last_access=? WHERE pos_hash=? AND to_move=? "
+                "AND komi=? AND rules=? AND board_size=? AND visits=?",
+                (time.time(),) + key.columns() + (row[0],))
+            self._conn.commit()
+            self.hits += 1
+        results = [MoveAnalysis(**item) for item in json.loads(row[1])]
+        return transform_results(results, INVERSE_SYMMETRY[key.symmetry], key.board_size)
+
+    def put(self, key: CacheKey, visits: int, results: List[MoveAnalysis]):
+        """写入一条结果；搜索次数更少的旧条目已被它覆盖，一并删除"""
+        if not results:
+            return
+        results = transform_results(results, key.symmetry, key.board_size)
+        payload = json.dumps([asdict(a) for a in results])
+        now = time.time()
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM analysis WHERE pos_hash=? AND to_move=? AND komi=? "
+                "AND rules=? AND board_size=? AND visits<?",
+                key.columns() + (visits,)).rowcount
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO analysis VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key.columns() + (visits, payload, now, now)).rowcount
+            if not inserted:
+                self._conn.execute(
+                    "UPDATE analysis SET results=?, last_access=? WHERE pos_hash=? "
+                    "AND to_move=? AND komi=? AND rules=? AND board_size=? AND visits=?",
+                    (payload, now) + key.columns() + (visits,))
+            self._entries += inserted - deleted
+            self.stores += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """超出容量时删除最久未访问的条目 (调用方持有锁)"""
+        if self._entries <= self.max_entries:
+            return
+        # 其他进程可能也在写同一个文件，淘汰前重新数一次
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+        excess = self._entries - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM analysis WHERE rowid IN "
+                "(SELECT rowid FROM analysis ORDER BY last_access LIMIT ?)",
+                (excess,))
+            self._entries -= excess
+            self.evictions += excess
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM analysis")
+            self._conn.commit()
+            self._entries = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率与容量统计"""
+        with self._lock:
+            entries = self._entries
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+大小两级模型级联
+同时驻留一个小网络 (如 b10/b18) 和大网络 (b28) 的分析引擎：每个局面先由小网络分析，
+只有被判为胜负接近或关键的局面再交给大网络，其余直接用小网络的结果。
+
+路由依据:
+- 阶段: 棋盘上的棋子少于 opening_stones 的布局局面不上送
+- 胜负接近: 小网络的胜率离 50% 不到 close_winrate，或目差绝对值小于 close_score
+- 难以判断: 首选着法的先验概率低于 min_prior (网络直觉分散)
+- 关键: 最佳与次佳候选的胜率差超过 critical_gap (只有一手棋)
+
+ModelCascade 与 KataGoAnalysisEngine 接口一致 (start / stop / submit / terminate)，
+可直接交给 AnalysisScheduler 或守护进程；响应中附加 cascadeTier 和 cascadeReasons 字段。
+
+阈值用命令行的校准报告来调：两个网络都分析同一组局面，以大网络为准统计小网络的准确度，
+并列出各组阈值下的上送比例、漏判的失误和相对成本。
+
+用法:
+    python3 katago_cascade.py --small b18.bin.gz --large b28.bin.gz --positions 40
+    FAKE_KATAGO_MODEL_NOISE=0.05 python3 katago_cascade.py --fake
+"""
+
+import argparse
+import itertools
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass, asdict, replace
+from typing import Optional, List, Dict, Any
+
+from katago_analyzer import KATAGO_BIN
+from katago_analysis_engine import KataGoAnalysisEngine, DEFAULT_ANALYSIS_CONFIG
+
+SMALL, LARGE = "small", "large"
+
+
+@dataclass
+class RoutingThresholds:
+    """上送大网络的阈值"""
+    opening_stones: int = 30
+    close_winrate: float = 0.15
+    close_score: float = 3.0
+    min_prior: float = 0.2
+    critical_gap: float = 0.10
+
+
+def route(response: Dict[str, Any], stones: int,
+          thresholds: RoutingThresholds) -> List[str]:
+    """
+    根据小网络的分析结果决定是否上送
+
+    Args:
+        response: 小网络对该局面的原始响应
+        stones: 局面上的棋子数 (摆子 + 已下手数，不计提子)
+
+    Returns:
+        上送原因，空列表表示直接采用小网络的结果
+    """
+    infos = response.get("moveInfos")
+    if not infos or stones < thresholds.opening_stones:
+        return []
+    root = response.get("rootInfo", {})
+    infos = sorted(infos, key=lambda info: info.get("order", 0))
+    reasons = []
+    if abs(root.get("winrate", 0.5) - 0.5) < thresholds.close_winrate \
+            or abs(root.get("scoreLead", 0.0)) < thresholds.close_score:
+        reasons.append("close")
+    if infos[0].get("prior", 1.0) < thresholds.min_prior:
+        reasons.append("uncertain")
+    if len(infos) > 1 and abs(infos[0].get("winrate", 0.5) - infos[1].get("winrate", 0.5)) \
+            > thresholds.critical_gap:
+        reasons.append("critical")
+    return reasons
+
+
+def _stones(query: Dict[str, Any], turn: int) -> int:
+    return len(query.get("initialStones", [])) + turn
+
+
+@dataclass
+class _Active:
+    """
+    进行中的级联请求：两级引擎上的 Future 和实际的请求 id (合并时为发起搜索的请求)
+
+    两级的搜索都可能与其他请求合并，终止时先放弃本请求的引用 (released)，没人再等才真正终止
+    """
+    small: Future
+    small_id: str
+    large: Optional[Future] = None
+    large_id: Optional[str] = None
+    terminated: bool = False
+    released: bool = False
+
+
+@dataclass
+class TierStats:
+    """一级网络的负载"""
+    queries: int = 0
+    positions: int = 0
+    visits: int = 0
+    seconds: float = 0.0
+    failed: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self),
+                "seconds_per_position": self.seconds / self.positions if self.positions else None}
+
+
+class ModelCascade:
+    """小网络分诊、大网络复核的两级分析引擎"""
+
+    def __init__(self,
+                 small_model: str,
+                 large_model: str,
+                 config_path: str = DEFAULT_ANALYSIS_CONFIG,
+                 config_overrides: Optional[Dict[str, Any]] = None,
+                 katago_path: str = KATAGO_BIN,
+                 thresholds: Optional[RoutingThresholds] = None,
+                 small_visits: Optional[int] = None,
+                 large_visits: Optional[int] = None):
+        """
+        初始化
+
+        Args:
+            small_model: 分诊用的小网络
+            large_model: 复核用的大网络
+            thresholds: 上送阈值
+            small_visits: 小网络的搜索次数，None 表示沿用请求中的 maxVisits
+            large_visits: 大网络的搜索次数，None 表示沿用请求中的 maxVisits
+        """
+        self.small = KataGoAnalysisEngine(small_model, config_path=config_path,
+                                          config_overrides=config_overrides,
+                                          katago_path=katago_path)
+        self.large = KataGoAnalysisEngine(large_model, config_path=config_path,
+                                          config_overrides=config_overrides,
+                                          katago_path=katago_path)
+        self.thresholds = thresholds or RoutingThresholds()
+        self.small_visits = small_visits
+        self.large_visits = large_visits
+        # 所有请求先经过小网络，合并发生在那里
+        self.flights = self.small.flights
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._active: Dict[str, _Active] = {}
+        self.tiers = {SMALL: TierStats(), LARGE: TierStats()}
+        self.reasons: Counter = Counter()
+        # 上送的局面两个网络都有结果，借此持续估计小网络的准确度
+        self.agreement = {"compared": 0, "same_move": 0, "winrate_error": 0.0}
+
+    @property
+    def is_ready(self) -> bool:
+        return self.small.is_ready and self.large.is_ready
+
+    def start(self, timeout: float = 60.0, warmup: bool = False) -> bool:
+        """启动两个引擎"""
+        if not self.small.start(timeout=timeout, warmup=warmup):
+            return False
+        if not self.large.start(timeout=timeout, warmup=warmup):
+            self.small.stop()
+            return False
+        return True
+
+    def stop(self):
+        """停止两个引擎"""
+        self.small.stop()
+        self.large.stop()
+
+    # ============ 请求 ============
+
+    def submit(self, query: Dict[str, Any]) -> Future:
+        """
+        提交分析请求，立即返回 Future
+
+        结果与 KataGoAnalysisEngine.submit 相同 ({turnNumber: 响应})，每条响应带
+        cascadeTier (small/large)，上送的还带 cascadeReasons。
+        """
+        future: Future = Future()
+        query = dict(query)
+        if not query.get("id"):
+            query["id"] = f"c{next(self._ids)}"
+        future.owner = query["id"]
+        small_query = dict(query)
+        if self.small_visits is not None:
+            small_query["maxVisits"] = self.small_visits
+        started = time.monotonic()
+        small = self.small.submit(small_query)
+        with self._lock:
+            self._active[query["id"]] = _Active(small, getattr(small, "owner", None) or query["id"])
+        future.add_done_callback(lambda _: self._finished(query["id"]))
+        small.add_done_callback(lambda f: self._triaged(query, f, started, future))
+        return future
+
+    def _finished(self, query_id: str):
+        with self._lock:
+            self._active.pop(query_id, None)
+
+    def _triaged(self, query: Dict[str, Any], small: Future, started: float, future: Future):
+        """小网络完成：逐个局面判断是否上送，需要的合并成一个 analyzeTurns 请求交给大网络"""
+        if small.cancelled() or small.exception() is not None:
+            self._record(SMALL, {}, started, failed=True)
+            if small.cancelled():
+                future.cancel()
+            else:
+                future.set_exception(small.exception())
+            return
+        responses = small.result()
+        self._record(SMALL, responses, started)
+        escalate: Dict[int, List[str]] = {}
+        for turn, response in responses.items():
+            response["cascadeTier"] = SMALL
+            reasons = route(response, _stones(query, turn), self.thresholds)
+            if reasons:
+                escalate[turn] = reasons
+        with self._lock:
+            active = self._active.get(query["id"])
+            terminated = active is not None and active.terminated
+            if not terminated:
+                for reasons in escalate.values():
+                    self.reasons.update(reasons)
+        if not escalate or terminated:
+            future.set_result(responses)
+            return
+
+        large_query = dict(query, analyzeTurns=sorted(escalate))
+        if self.large_visits is not None:
+            large_query["maxVisits"] = self.large_visits
+        started = time.monotonic()
+        large = self.large.submit(large_query)
+        with self._lock:
+            if active is not None:
+                active.large = large
+                active.large_id = getattr(large, "owner", None) or query["id"]
+            # 上送期间被终止的，补发给大网络
+            terminated = active is not None and active.terminated
+        if terminated and self.large.release(large):
+            self.large.terminate(active.large_id)
+        large.add_done_callback(
+            lambda f: self._reviewed(query, responses, escalate, f, started, future))
+
+    def _reviewed(self, query: Dict[str, Any], responses: Dict[int, Dict[str, Any]],
+                  escalate: Dict[int, List[str]], large: Future, started: float,
+                  future: Future):
+        """大网络完成：替换上送局面的结果 (大网络失败或被终止时保留小网络的结果)"""
+        if large.cancelled() or large.exception() is not None:
+            self._record(LARGE, {}, started, failed=True)
+            future.set_result(responses)
+            return
+        reviewed = large.result()
+        self._record(LARGE, reviewed, started)
+        merged = dict(responses)
+        for turn, response in reviewed.items():
+            if not response.get("moveInfos"):
+                continue
+            self._compare(responses[turn], response)
+            merged[turn] = dict(response, cascadeTier=LARGE, cascadeReasons=escalate[turn])
+        future.set_result(merged)
+
+    def terminate(self, query_id: str, turns: Optional[List[int]] = None) -> Future:
+        """
+        终止请求：两级引擎中的搜索都结束，尚未上送的不再上送
+
+        只标记进行中的请求 (记录在请求完成时清除)；未知或已完成的 id 原样转给小网络。
+        与其他请求共用的搜索不终止 (整个请求终止时放弃本请求的引用)；小网络上没有
+        发出 terminate 时返回的 Future 结果为 None。
+        """
+        with self._lock:
+            active = self._active.get(query_id)
+            if active is not None:
+                active.terminated = True
+                release = turns is None and not active.released
+                active.released = active.released or release
+                large = active.large
+        if active is None:
+            return self.small.terminate(query_id, turns)
+        if large is not None:
+            self._terminate_tier(self.large, large, active.large_id, turns, release)
+        action = self._terminate_tier(self.small, active.small, active.small_id, turns, release)
+        if action is None:
+            action = Future()
+            action.set_result(None)
+        return action
+
+    def release(self, future: Future) -> bool:
+        """级联请求本身不合并 (合并发生在两级引擎内部，由 terminate 处理)，总是 True"""
+        return True
+
+    @staticmethod
+    def _terminate_tier(engine: KataGoAnalysisEngine, future: Future, query_id: str,
+                        turns: Optional[List[int]], release: bool) -> Optional[Future]:
+        """终止一级上的搜索；已结束或还有其他请求在等时不终止，返回 None"""
+        if future.done():
+            return None
+        if turns is None:
+            # 重复终止时引用已放弃过，本请求不再有权终止
+            if not release or not engine.release(future):
+                return None
+        elif engine.flights is not None and engine.flights.waiters(future) > 1:
+            return None
+        return engine.terminate(query_id, turns)
+
+    # ============ 统计 ============
+
+    def _record(self, tier: str, responses: Dict[int, Dict[str, Any]],
+                started: float, failed: bool = False):
+        with self._lock:
+            stats = self.tiers[tier]
+            stats.queries += 1
+            stats.seconds += time.monotonic() - started
+            if failed:
+                stats.failed += 1
+                return
+            stats.positions += len(responses)
+            stats.visits += sum(r.get("rootInfo", {}).get("visits", 0)
+                                for r in responses.values())
+
+    def _compare(self, small: Dict[str, Any], large: Dict[str, Any]):
+        a, b = summarize(small), summarize(large)
+        if a is None or b is None:
+            return
+        with self._lock:
+            self.agreement["compared"] += 1
+            self.agreement["same_move"] += a["move"] == b["move"]
+            self.agreement["winrate_error"] += abs(a["winrate"] - b["winrate"])
+
+    def stats(self) -> Dict[str, Any]:
+        """各级的负载、上送原因和上送局面上的一致率"""
+        with self._lock:
+            compared = self.agreement["compared"]
+            small_positions = self.tiers[SMALL].positions
+            return {
+                "tiers": {tier: stats.as_dict() for tier, stats in self.tiers.items()},
+                "escalation_rate": (self.tiers[LARGE].positions / small_positions
+                                    if small_positions else None),
+                "reasons": dict(self.reasons),
+                "escalated_agreement": {
+                    "compared": compared,
+                    "same_move": self.agreement["same_move"] / compared if compared else None,
+                    "winrate_error": (self.agreement["winrate_error"] / compared
+                                      if compared else None),
+                },
+                "thresholds": asdict(self.thresholds),
+            }
+
+
+def summarize(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """首选着法、胜率和目差"""
+    infos = response.get("moveInfos")
+    if not infos:
+        return None
+    best = min(infos, key=lambda info: info.get("order", 0))
+    root = response.get("rootInfo", {})
+    return {"move": best["move"],
+            "winrate": root.get("winrate", best.get("winrate", 0.5)),
+            "score": root.get("scoreLead", best.get("scoreLead", 0.0))}
+
+
+# ============ 校准 ============
+
+@dataclass
+class CalibrationSample:
+    """同一局面在两个网络上的结果"""
+    stones: int
+    small: Dict[str, Any]
+    large: Dict[str, Any]
+    small_seconds: float
+    large_seconds: float
+
+    @property
+    def loss(self) -> float:
+        """
+        按大网络的评估，下小网络首选而不是大网络首选损失的胜率
+
+        小网络的首选不在大网络的候选中时，按大网络候选中最差的一手计。
+        """
+        infos = self.large.get("moveInfos", [])
+        if not infos:
+            return 0.0
+        best = summarize(self.small)
+        winrates = {info["move"]: info.get("winrate", 0.5) for info in infos}
+        top = max(winrates.values())
+        played = winrates.get(best["move"], min(winrates.values())) if best else top
+        return max(0.0, top - played)
+
+
+def calibrate(small: KataGoAnalysisEngine, large: KataGoAnalysisEngine,
+              queries: List[Dict[str, Any]],
+              small_visits: int, large_visits: int,
+              timeout: float = 600.0) -> List[CalibrationSample]:
+    """两个网络逐个分析同一组局面 (逐个提交，耗时即单局面成本)"""
+    samples = []
+    for query in queries:
+        turn = len(query.get("moves", []))
+        results, seconds = [], []
+        for engine, visits in ((small, small_visits), (large, large_visits)):
+            started = time.monotonic()
+            responses = engine.submit(dict(query, maxVisits=visits)).result(timeout=timeout)
+            seconds.append(time.monotonic() - started)
+            results.append(responses[turn])
+        samples.append(CalibrationSample(_stones(query, turn), results[0], results[1],
+                                         seconds[0], seconds[1]))
+    return samples
+
+
+@dataclass
+class SweepRow:
+    """一组阈值的效果"""
+    thresholds: RoutingThresholds
+    escalation_rate: float
+    missed: int
+    mistakes: int
+    relative_cost: float
+
+
+def sweep(samples: List[CalibrationSample], grid: Dict[str, List[Any]],
+          base: Optional[RoutingThresholds] = None,
+          mistake_loss: float = 0.03) -> List[SweepRow]:
+    """
+    在校准样本上评估各组阈值
+
+    失误指小网络首选的损失超过 mistake_loss 的局面，漏判即其中未上送的；
+    相对成本以全部交给大网络为 1。
+    """
+    base = base or RoutingThresholds()
+    mistakes = [s.loss > mistake_loss for s in samples]
+    all_large = sum(s.large_seconds for s in samples) or 1.0
+    rows = []
+    keys = list(grid)
+    for values in itertools.product(*(grid[k] for k in keys)):
+        thresholds = replace(base, **dict(zip(keys, values)))
+        routed = [bool(route(s.small, s.stones, thresholds)) for s in samples]
+        cost = sum(s.small_seconds + (s.large_seconds if up else 0.0)
+                   for s, up in zip(samples, routed))
+        rows.append(SweepRow(thresholds,
+                             sum(routed) / len(samples) if samples else 0.0,
+                             sum(m and not up for m, up in zip(mistakes, routed)),
+                             sum(mistakes),
+                             cost / all_large))
+    return rows
+
+
+def pareto(rows: List[SweepRow]) -> List[SweepRow]:
+    """成本和漏判都不被其他阈值同时超过的行，按成本排序"""
+    rows = sorted(rows, key=lambda r: (r.relative_cost, r.missed))
+    front, best_missed = [], None
+    for row in rows:
+        if best_missed is None or row.missed < best_missed:
+            front.append(row)
+            best_missed = row.missed
+    return front
+
+
+DEFAULT_SWEEP = {
+    "close_winrate": [0.0, 0.05, 0.1, 0.15, 0.25],
+    "close_score": [0.0, 1.5, 3.0, 6.0],
+    "min_prior": [0.0, 0.1, 0.2, 0.3],
+    "critical_gap": [0.05, 0.1, 0.2, 1.0],
+}
+
+
+def format_report(samples: List[CalibrationSample], rows: List[SweepRow],
+                  current: SweepRow, mistake_loss: float) -> str:
+    n = len(samples)
+    lines = [f"{n} 个局面", "档位      平均耗时       p90"]
+    for tier in (SMALL, LARGE):
+        seconds = sorted(getattr(s, f"{tier}_seconds") for s in samples)
+        lines.append(f"{tier:<8s}{sum(seconds) / n * 1000:>8.0f} ms"
+                     f"{seconds[min(n - 1, int(0.9 * n))] * 1000:>7.0f} ms")
+
+    pairs = [(summarize(s.small), summarize(s.large)) for s in samples]
+    pairs = [(a, b) for a, b in pairs if a and b]
+    if pairs:
+        same = sum(a["move"] == b["move"] for a, b in pairs)
+        winrate_error = sum(abs(a["winrate"] - b["winrate"]) for a, b in pairs) / len(pairs)
+        score_error = sum(abs(a["score"] - b["score"]) for a, b in pairs) / len(pairs)
+        lines.append(f"小网络准确度 (以大网络为准): 首选一致 {same / len(pairs):.0%}, "
+                     f"胜率误差 {winrate_error:.1%}, 目差误差 {score_error:.1f}, "
+                     f"失误 (损失 > {mistake_loss:.0%}) {current.mistakes}/{n}")
+
+    def row_text(row: SweepRow) -> str:
+        t = row.thresholds
+        return (f"{t.close_winrate:>8.2f}{t.close_score:>8.1f}{t.min_prior:>8.2f}"
+                f"{t.critical_gap:>8.2f}{row.escalation_rate:>9.0%}"
+                f"{row.missed:>5d}/{row.mistakes:<3d}{row.relative_cost:>8.2f}")
+
+    # 中文占两列，表头按显示宽度手工对齐
+    header = "  胜率带  目差带    先验  胜率差     上送  漏判/失误    成本"
+    lines += ["", f"当前阈值 (布局 {current.thresholds.opening_stones} 子内不上送):",
+              header, row_text(current), "", "可选阈值 (成本与漏判的帕累托前沿):", header]
+    lines += [row_text(row) for row in pareto(rows)]
+    return '\n'.join(lines)
+
+
+# ============ 命令行 ============
+
+def main():
+    """命令行入口：校准报告"""
+    parser = argparse.ArgumentParser(description="大小模型级联的成本与准确度报告")
+    parser.add_argument("--small", help="小网络模型")
+    parser.add_argument("--large", help="大网络模型 (默认守护进程的 b28)")
+    parser.add_argument("--fake", action="store_true", help="使用替身引擎 (检查流程用)")
+    parser.add_argument("--katago", help="katago 可执行文件")
+    parser.add_argument("--config", default=DEFAULT_ANALYSIS_CONFIG)
+    parser.add_argument("--sgf", nargs="*", help="局面来源棋谱 (默认仓库中的 *.sgf)")
+    parser.add_argument("--positions", type=int, default=40)
+    parser.add_argument("--small-visits", type=int, default=200)
+    parser.add_argument("--large-visits", type=int, default=400)
+    parser.add_argument("--mistake-loss", type=float, default=0.03,
+                        help="小网络首选的胜率损失超过此值算失误")
+    parser.add_argument("--threshold", action="append", default=[],
+                        help="当前阈值，如 close_winrate=0.1 (可重复)")
+    args = parser.parse_args()
+
+    from pathlib import Path
+    from katago_daemon import KATAGO_MODEL
+    from katago_replay import FAKE_KATAGO
+    from katago_tune import load_positions
+
+    current = RoutingThresholds()
+    for item in args.threshold:
+        key, _, value = item.partition('=')
+        current = replace(current, **{key.strip(): type(getattr(current, key.strip()))(value)})
+    sgf_paths = args.sgf if args.sgf else sorted(map(str, Path(__file__).parent.glob("*.sgf")))
+    queries = load_positions(sgf_paths, args.positions)
+    if not queries:
+        print("没有可用的局面 (检查 --sgf)")
+        return
+
+    katago = args.katago or (FAKE_KATAGO if args.fake else KATAGO_BIN)
+    small_model = args.small or ("fake-b18.bin.gz" if args.fake else None)
+    large_model = args.large or ("fake-b28.bin.gz" if args.fake else str(KATAGO_MODEL))
+    if small_model is None:
+        parser.error("需要 --small")
+
+    engines = [KataGoAnalysisEngine(model, config_path=args.config, katago_path=katago,
+                                    coalesce=False)
+               for model in (small_model, large_model)]
+    try:
+        if not all(engine.start(warmup=True) for engine in engines):
+            print("引擎启动失败")
+            return
+        samples = calibrate(engines[0], engines[1], queries,
+                            args.small_visits, args.large_visits)
+    finally:
+        for engine in engines:
+            engine.stop()
+
+    rows = sweep(samples, DEFAULT_SWEEP, current, args.mistake_loss)
+    current_row = sweep(samples, {}, current, args.mistake_loss)[0]
+    print()
+    print(format_report(samples, rows, current_row, args.mistake_loss))
+
+
+if __name__ == "__main__":
+    main()
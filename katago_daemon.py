@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""
+KataGo 常驻守护进程
+在后台保持预热好的 KataGo 引擎 (以及可选的 YOLO 模型)，通过 Unix socket 提供服务。
+守护进程运行时，各复盘脚本通过 create_analyzer() 自动连接，省去每次数秒的模型加载。
+
+用法:
+    python3 katago_daemon.py start     # 前台运行守护进程
+    python3 katago_daemon.py status    # 查看引擎池状态
+    python3 katago_daemon.py stop      # 停止守护进程
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import CancelledError
+from dataclasses import asdict
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+from katago_analyzer import (KataGoAnalyzer, Color, MoveAnalysis, SearchStats,
+                             EarlyStop, KATAGO_BIN)
+from katago_pool import KataGoEnginePool
+from katago_supervisor import SupervisedKataGoAnalyzer
+from katago_cache import AnalysisCache, DEFAULT_CACHE_PATH, transform_results
+from katago_singleflight import SingleFlight
+from katago_scheduler import AnalysisScheduler, Priority
+from go_position import INVERSE_SYMMETRY, transform_values
+
+# ============ 配置 ============
+SOCKET_PATH = os.environ.get("KATAGO_DAEMON_SOCKET", "/tmp/katago_daemon.sock")
+KATAGO_MODEL = Path.home() / ".katago/models/kata1-b28c512nbt-s12374138624-d5703190512.bin.gz"
+KATAGO_CFG = Path("/tmp/katago.cfg")
+ANALYSIS_CFG = Path(__file__).with_name("analysis.cfg")
+YOLO_MODEL = Path("/Users/haoc/.openclaw/workspace/runs/detect/runs/go_board_yolo26/exp/weights/best.pt")
+# command 操作可直接执行的只读 GTP 命令；其他命令执行后要重置引擎局面
+READ_ONLY_COMMANDS = frozenset({
+    "protocol_version", "name", "version", "list_commands", "known_command", "showboard",
+    "kata-raw-nn", "kata-get-rules", "kata-get-param", "kata-list-params",
+    "final_score", "final_status_list", "printsgf",
+})
+# 流式输出的命令不会以空行结束，经 command 转发会一直占着引擎，须走 analyze 操作
+STREAMING_COMMANDS = frozenset({
+    "kata-analyze", "lz-analyze", "kata-genmove_analyze", "lz-genmove_analyze",
+    "kata-search_analyze",
+})
+
+# 设为 1 时分析引擎记录全部请求和响应，供 katago_replay.py 回放
+RECORD = os.environ.get("KATAGO_RECORD") == "1"
+# 分诊用的小网络 (如 b18)，设置后分析引擎改为大小两级级联 (见 katago_cascade)
+TRIAGE_MODEL = os.environ.get("KATAGO_TRIAGE_MODEL")
+NUM_ENGINES = int(os.environ.get("KATAGO_DAEMON_ENGINES", "2"))
+# 分析结果缓存，设为空字符串可关闭
+CACHE_PATH = os.environ.get("KATAGO_CACHE", DEFAULT_CACHE_PATH)
+
+
+# ============ 服务端 ============
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    """每个连接一个线程，按行读取 JSON 请求并返回 JSON 响应"""
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                response = self.server.katago_daemon.dispatch(request)
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class KataGoDaemon:
+    """持有预热引擎的守护进程"""
+
+    def __init__(self,
+                 model_path: str = str(KATAGO_MODEL),
+                 num_engines: int = NUM_ENGINES,
+                 config_path: str = str(KATAGO_CFG),
+                 config_overrides: Optional[Dict[str, Any]] = None,
+                 analysis_config: Optional[str] = None,
+                 triage_model: Optional[str] = None,
+                 record: bool = False,
+                 yolo_model: Optional[str] = None,
+                 socket_path: str = SOCKET_PATH,
+                 katago_path: str = KATAGO_BIN,
+                 cache_path: Optional[str] = CACHE_PATH):
+        """
+        初始化
+
+        Args:
+            model_path: KataGo 模型
+            num_engines: 预热的 GTP 引擎数
+            analysis_config: 同时预热 JSON 分析引擎时使用的配置 (可选)
+            triage_model: 分析引擎先用这个小网络分诊，只把接近或关键的局面交给 model_path
+            record: 分析引擎记录全部请求和响应 (katago_replay.RECORD_OVERRIDES)
+            yolo_model: 同时预热的 YOLO 权重 (可选)
+            socket_path: Unix socket 路径
+            cache_path: 分析结果缓存文件，None 或空字符串表示不缓存
+        """
+        self.socket_path = socket_path
+        self.pool = KataGoEnginePool(model_path, size=num_engines,
+                                     config_path=config_path,
+                                     config_overrides=config_overrides,
+                                     katago_path=katago_path,
+                                     supervise=True)
+        self.analysis_engine = None
+        self.scheduler: Optional[AnalysisScheduler] = None
+        self.cascade = None
+        if analysis_config:
+            from katago_analysis_engine import KataGoAnalysisEngine
+            from katago_tune import profile_overrides
+            # 守护进程的分析引擎主要承接整盘复盘，沿用 katago_tune.py 为 batch 流量推荐的配置
+            overrides = profile_overrides("batch")
+            if record:
+                from katago_replay import RECORD_OVERRIDES
+                overrides.update(RECORD_OVERRIDES)
+            if triage_model:
+                from katago_cascade import ModelCascade
+                self.cascade = ModelCascade(triage_model, model_path,
+                                            config_path=analysis_config,
+                                            config_overrides=overrides,
+                                            katago_path=katago_path)
+                self.analysis_engine = self.cascade
+            else:
+                self.analysis_engine = KataGoAnalysisEngine(
+                    model_path, config_path=analysis_config,
+                    config_overrides=overrides, katago_path=katago_path)
+        self.cache = AnalysisCache(cache_path) if cache_path else None
+        # 并发的相同局面请求合并为一次搜索
+        self.flights = SingleFlight()
+        self.yolo_model_path = yolo_model
+        self.yolo = None
+        self._yolo_lock = threading.Lock()
+        self.server: Optional[_DaemonServer] = None
+
+    def serve_forever(self):
+        """预热所有模型后开始监听，直到收到 SIGTERM/SIGINT 或 shutdown 请求"""
+        if not self.pool.start():
+            print("⚠️ 部分引擎未能启动")
+        if self.analysis_engine and not self.analysis_engine.start():
+            self.analysis_engine = None
+        if self.analysis_engine:
+            self.scheduler = AnalysisScheduler(self.analysis_engine)
+        if self.yolo_model_path:
+            from ultralytics import YOLO
+            self.yolo = YOLO(self.yolo_model_path)
+            print(f"✓ YOLO: {self.yolo_model_path}")
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = _DaemonServer(self.socket_path, _DaemonHandler)
+        self.server.katago_daemon = self
+        os.chmod(self.socket_path, 0o600)
+
+        signal.signal(signal.SIGTERM, lambda *_: self._shutdown_async())
+        print(f"✓ KataGo 守护进程已启动: {self.socket_path}")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.pool.stop()
+            if self.analysis_engine:
+                self.analysis_engine.stop()
+            if self.cache:
+                self.cache.close()
+            print("✓ KataGo 守护进程已退出")
+
+    def _shutdown_async(self):
+        # shutdown() 会等待 serve_forever 退出，不能在处理线程里同步调用
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    # ============ 请求分发 ============
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        handler = getattr(self, f"_op_{op}", None)
+        if handler is None:
+            return {"ok": False, "error": f"未知操作: {op}"}
+        result = handler(request)
+        result.setdefault("ok", True)
+        return result
+
+    def _op_ping(self, request):
+        return {"engines": self.pool.size,
+                "analysis": self.analysis_engine is not None,
+                "yolo": self.yolo is not None}
+
+    def _op_stats(self, request):
+        return {"pool": self.pool.stats(),
+                "cache": self.cache.stats() if self.cache else None,
+                "coalescing": {
+                    "gtp": self.flights.stats(),
+                    "analysis": (self.analysis_engine.flights.stats()
+                                 if self.analysis_engine and self.analysis_engine.flights
+                                 else None),
+                },
+                "scheduler": self.scheduler.stats() if self.scheduler else None,
+                "cascade": self.cascade.stats() if self.analysis_engine and self.cascade else None}
+
+    def _op_shutdown(self, request):
+        self._shutdown_async()
+        return {}
+
+    def _prepare(self, katago: KataGoAnalyzer, request: Dict[str, Any]) -> bool:
+        """把租到的引擎切换到请求中的局面 (增量切换，保留搜索树)"""
+        board_size = request.get("board_size", 19)
+        if katago.board_size != board_size:
+            katago.set_board_size(board_size)
+        komi = request.get("komi", 7.5)
+        if katago.komi != komi:
+            katago.set_komi(komi)
+        if not katago.ensure_setup(request.get("setup", [])):
+            return False
+        return katago.goto_position(request.get("moves", []))
+
+    def _op_analyze(self, request):
+        visits = request.get("visits", 200)
+        board_size = request.get("board_size", 19)
+        want_ownership = bool(request.get("ownership"))
+        # 规范化的局面键：缓存与请求合并共用，旋转或镜像的同一局面也算相同
+        key = AnalysisCache.make_key(request.get("moves", []), request["color"],
+                                     request.get("komi", 7.5), None, board_size,
+                                     request.get("setup"))
+        # 缓存命中时不占用引擎
+        if self.cache and not want_ownership:
+            cached = self.cache.get(key, visits)
+            if cached is not None:
+                stats = SearchStats(target_visits=visits, stopped_by='cache',
+                                    root_visits=sum(a.visits for a in cached))
+                return {"moves": [asdict(r) for r in cached], "stats": asdict(stats)}
+
+        flight_key = (key.columns(), want_ownership, request.get("priority", "batch"),
+                      json.dumps(request.get("early_stop"), sort_keys=True))
+        (results, stats, ownership), shared = self.flights.do(
+            flight_key, visits, lambda: self._search(request, key))
+        if results is None:
+            return {"ok": False, "error": "无法切换到请求的局面"}
+
+        # 共用的结果按规范朝向保存，变换回本请求的朝向
+        inverse = INVERSE_SYMMETRY[key.symmetry]
+        results = transform_results(results, inverse, board_size)
+        response = {"moves": [asdict(r) for r in results], "stats": asdict(stats),
+                    "shared": shared}
+        if ownership is not None:
+            response["ownership"] = transform_values(ownership, inverse, board_size)
+        return response
+
+    def _search(self, request, key):
+        """租用引擎搜索，返回规范朝向的 (结果, 统计, ownership)"""
+        with self.pool.lease(priority=Priority(request.get("priority", "batch"))) as katago:
+            if not self._prepare(katago, request):
+                return None, None, None
+            results, stats = katago.analyze_with_stats(
+                Color(request["color"]),
+                visits=request.get("visits", 200),
+                max_time=request.get("max_time", 30.0),
+                interval=request.get("interval"),
+                early_stop=EarlyStop(**request["early_stop"]) if request.get("early_stop") else None,
+                ownership=request.get("ownership", False))
+            # 引擎的 ownership 数组会被下一次分析复用，归还引擎前转成列表
+            ownership = (katago.last_ownership.reshape(-1).tolist()
+                         if katago.last_ownership is not None else None)
+        if (self.cache and not request.get("ownership")
+                and stats.stopped_by in ('visits', 'stable', 'time') and results):
+            self.cache.put(key, stats.root_visits, results)
+        size = request.get("board_size", 19)
+        results = transform_results(results, key.symmetry, size)
+        if ownership is not None:
+            ownership = transform_values(ownership, key.symmetry, size)
+        return results, stats, ownership
+
+    def _op_genmove(self, request):
+        with self.pool.lease(priority=Priority(request.get("priority", "batch"))) as katago:
+            if not self._prepare(katago, request):
+                return {"ok": False, "error": "无法切换到请求的局面"}
+            move = katago.genmove(Color(request["color"]))
+        return {"move": move}
+
+    def _op_command(self, request):
+        command = request["command"]
+        name = (command.split() or [""])[0]
+        if name in STREAMING_COMMANDS:
+            return {"ok": False, "error": f"{name} 是流式命令，请改用 analyze 操作"}
+        with self.pool.lease(priority=Priority(request.get("priority", "batch"))) as katago:
+            self._prepare(katago, request)
+            try:
+                return {"response": katago._send_command(command,
+                                                         timeout=request.get("timeout", 5.0))}
+            finally:
+                if name not in READ_ONLY_COMMANDS:
+                    self._reset(katago)
+
+    @staticmethod
+    def _reset(katago: KataGoAnalyzer):
+        """
+        命令可能改了局面、棋盘或贴目而没有更新记录的状态：清空棋盘回到记录的尺寸，
+        并让下一次 _prepare 重新设置贴目和规则
+        """
+        katago.set_board_size(katago.board_size)
+        katago.komi = None
+        if katago.rules:
+            katago.set_rules(katago.rules)
+
+    def _op_query(self, request):
+        if self.scheduler is None:
+            return {"ok": False, "error": "守护进程未启用分析引擎"}
+        ticket = self.scheduler.submit(request["query"],
+                                       Priority(request.get("priority", "batch")))
+        try:
+            responses = ticket.result(timeout=request.get("timeout"))
+        except CancelledError:
+            return {"ok": False, "error": f"请求已取消: {ticket.query_id}", "cancelled": True}
+        return {"responses": {str(turn): r for turn, r in responses.items()}}
+
+    def _op_cancel(self, request):
+        if self.scheduler is None:
+            return {"cancelled": False}
+        return {"cancelled": self.scheduler.cancel_id(request["id"])}
+
+    def _op_detect(self, request):
+        if self.yolo is None:
+            return {"ok": False, "error": "守护进程未加载 YOLO"}
+        with self._yolo_lock:
+            r = self.yolo(request["image"], conf=request.get("conf", 0.5),
+                          iou=request.get("iou", 0.5))[0]
+        boxes = []
+        for box in r.boxes:
+            boxes.append({
+                "cls": int(box.cls),
+                "conf": float(box.conf),
+                "xyxy": [float(v) for v in box.xyxy[0].cpu().numpy()],
+            })
+        return {"boxes": boxes, "image_size": list(r.orig_shape)}
+
+
+# ============ 客户端 ============
+
+class KataGoDaemonClient:
+    """
+    守护进程客户端，接口与 KataGoAnalyzer 一致
+
+    着法在本地记录，每次分析时连同完整着法序列一起发送；守护进程端
+    用 goto_position 增量切换局面，因此连续分析相邻局面仍能复用搜索树。
+    """
+
+    def __init__(self, socket_path: str = SOCKET_PATH):
+        self.socket_path = socket_path
+        self.sock: Optional[socket.socket] = None
+        self._file = None
+        self._lock = threading.Lock()
+        self.is_ready = False
+        self.board_size = 19
+        self.komi = 7.5
+        self.move_stack: List[Tuple[Color, str]] = []
+        self.setup: List[Tuple[Color, str]] = []
+        # 本客户端请求的优先级 (交互界面设为 Priority.INTERACTIVE)
+        self.priority = Priority.BATCH
+        self.last_stats: Optional[SearchStats] = None
+        self.last_ownership = None
+        self.capabilities: Dict[str, Any] = {}
+
+    def start(self, timeout: float = 2.0) -> bool:
+        """连接守护进程 (已连接时直接返回)"""
+        if self.is_ready:
+            return True
+        try:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(self.socket_path)
+            self.sock.settimeout(None)
+            self._file = self.sock.makefile("rwb")
+            self.capabilities = self._request("ping")
+            self.is_ready = True
+            return True
+        except (OSError, ValueError):
+            self.stop()
+            return False
+
+    def stop(self):
+        """断开连接 (守护进程和引擎保持运行)"""
+        if self._file:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        if self.sock:
+            self.sock.close()
+        self.sock = None
+        self._file = None
+        self.is_ready = False
+
+    def _request(self, op: str, **fields: Any) -> Dict[str, Any]:
+        with self._lock:
+            self._file.write((json.dumps({"op": op, **fields}) + "\n").encode("utf-8"))
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            self.is_ready = False
+            raise ConnectionError("守护进程连接已断开")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "守护进程请求失败"))
+        return response
+
+    def _position(self) -> Dict[str, Any]:
+        return {"moves": [[color.value, move] for color, move in self.move_stack],
+                "setup": [[color.value, move] for color, move in self.setup],
+                "komi": self.komi, "board_size": self.board_size,
+                "priority": self.priority.value}
+
+    # ============ 与 KataGoAnalyzer 相同的接口 ============
+
+    def set_board_size(self, size: int = 19) -> bool:
+        self.board_size = size
+        self.move_stack.clear()
+        self.setup = []
+        return True
+
+    def clear_board(self) -> bool:
+        self.move_stack.clear()
+        self.setup = []
+        return True
+
+    def set_komi(self, komi: float = 7.5) -> bool:
+        self.komi = komi
+        return True
+
+    def play(self, color: Color, move: str) -> bool:
+        self.move_stack.append((color, move))
+        return True
+
+    def undo(self) -> bool:
+        if not self.move_stack:
+            return False
+        self.move_stack.pop()
+        return True
+
+    def goto_position(self, moves: List[Tuple[Any, str]], timeout: float = 10.0) -> bool:
+        self.move_stack = [(color if isinstance(color, Color) else Color(color.upper()), move)
+                           for color, move in moves]
+        return True
+
+    def set_position(self, stones: List[Tuple[Any, str]], timeout: float = 10.0) -> bool:
+        self.setup = [(color if isinstance(color, Color) else Color(color.upper()), move)
+                      for color, move in stones if move.lower() != 'pass']
+        self.move_stack = []
+        return True
+
+    def ensure_setup(self, stones: List[Tuple[Any, str]], timeout: float = 10.0) -> bool:
+        target = [(color if isinstance(color, Color) else Color(color.upper()), move)
+                  for color, move in stones if move.lower() != 'pass']
+        return target == self.setup or self.set_position(target)
+
+    def genmove(self, color: Color, timeout: float = 60.0) -> str:
+        move = self._request("genmove", color=color.value, **self._position())["move"]
+        if move.lower() != "resign":
+            self.move_stack.append((color, move))
+        return move
+
+    def analyze(self, color: Color, visits: int = 200, verbose: bool = False,
+                max_time: Optional[float] = 30.0, interval: Optional[int] = None,
+                early_stop: Optional[EarlyStop] = None,
+                ownership: bool = False) -> List[MoveAnalysis]:
+        results, _ = self.analyze_with_stats(color, visits=visits, verbose=verbose,
+                                             max_time=max_time, interval=interval,
+                                             early_stop=early_stop, ownership=ownership)
+        return results
+
+    def analyze_with_stats(self, color: Color, visits: int = 200, verbose: bool = False,
+                           max_time: Optional[float] = 30.0, interval: Optional[int] = None,
+                           early_stop: Optional[EarlyStop] = None,
+                           ownership: bool = False) -> Tuple[List[MoveAnalysis], SearchStats]:
+        response = self._request("analyze", color=color.value, visits=visits,
+                                 max_time=max_time, interval=interval,
+                                 early_stop=asdict(early_stop) if early_stop else None,
+                                 ownership=ownership, **self._position())
+        results = [MoveAnalysis(**r) for r in response["moves"]]
+        self.last_stats = SearchStats(**response["stats"])
+        self.last_ownership = None
+        if response.get("ownership") is not None:
+            import numpy as np
+            self.last_ownership = np.asarray(response["ownership"], dtype=np.float32).reshape(
+                self.board_size, self.board_size)
+        if verbose:
+            for idx, r in enumerate(results, 1):
+                print(f"  {idx}. {r.move:4s}  visits={r.visits:4d}  "
+                      f"winrate={r.winrate*100:5.1f}%  score={r.score_lead:+6.1f}")
+        return results, self.last_stats
+
+    def _send_command(self, cmd: str, timeout: float = 5.0) -> str:
+        """在当前局面上执行只读 GTP 命令 (改变局面请用 play/undo 等方法)"""
+        return self._request("command", command=cmd, timeout=timeout,
+                             **self._position())["response"]
+
+    # ============ 守护进程专有接口 ============
+
+    def query(self, query: Dict[str, Any], timeout: Optional[float] = None,
+              priority: Optional[Priority] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        转发 JSON 分析引擎请求，返回 {turnNumber: 响应}
+
+        query 带上 id 时可以从其他线程用 cancel(id) 取消；被取消时抛出 RuntimeError
+        """
+        priority = priority or self.priority
+        responses = self._request("query", query=query, timeout=timeout,
+                                  priority=priority.value)["responses"]
+        return {int(turn): r for turn, r in responses.items()}
+
+    def cancel(self, query_id: str) -> bool:
+        """取消排队中或正在搜索的 JSON 请求 (用单独的连接，不等待当前请求)"""
+        with KataGoDaemonClient(self.socket_path) as client:
+            return client._request("cancel", id=query_id)["cancelled"]
+
+    def detect(self, image_path: str, conf: float = 0.5, iou: float = 0.5) -> Dict[str, Any]:
+        """用守护进程中的 YOLO 检测图片"""
+        return self._request("detect", image=os.path.abspath(image_path), conf=conf, iou=iou)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._request("stats")["pool"]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def connect_daemon(socket_path: str = SOCKET_PATH) -> Optional[KataGoDaemonClient]:
+    """守护进程在运行时返回已连接的客户端，否则返回 None"""
+    if not os.path.exists(socket_path):
+        return None
+    client = KataGoDaemonClient(socket_path)
+    return client if client.start() else None
+
+
+def create_analyzer(model_path: str, **kwargs: Any):
+    """
+    获取分析器：守护进程在运行时连接守护进程，否则创建本地 SupervisedKataGoAnalyzer
+
+    两者接口一致，调用方照常 start() / analyze() / stop()。
+    """
+    client = connect_daemon()
+    if client is not None:
+        print(f"✓ 已连接 KataGo 守护进程: {client.socket_path}")
+        return client
+    return SupervisedKataGoAnalyzer(model_path, **kwargs)
+
+
+def main():
+    """命令行入口"""
+    command = sys.argv[1] if len(sys.argv) > 1 else "start"
+
+    if command == "start":
+        KataGoDaemon(analysis_config=str(ANALYSIS_CFG), triage_model=TRIAGE_MODEL,
+                     record=RECORD,
+                     yolo_model=str(YOLO_MODEL) if YOLO_MODEL.exists() else None).serve_forever()
+    elif command in ("status", "stop"):
+        client = connect_daemon()
+        if client is None:
+            print("守护进程未运行")
+            return
+        if command == "status":
+            status = client._request("stats")
+            print(json.dumps({"capabilities": client.capabilities,
+                              "pool": status["pool"], "cache": status.get("cache"),
+                              "coalescing": status.get("coalescing"),
+                              "scheduler": status.get("scheduler"),
+                              "cascade": status.get("cascade")},
+                             indent=2, ensure_ascii=False))
+        else:
+            client._request("shutdown")
+            print("✓ 已请求守护进程退出")
+        client.stop()
+    else:
+        print("用法: python3 katago_daemon.py [start|status|stop]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+KataGo 形势判断 (ownership) 与策略 (policy) 热力图
+直接把引擎输出的浮点串解码进预分配的 NumPy 数组，不经过 Python 字符串字典；
+整盘棋的热力图可用 float16 存储以节省内存。
+
+数组按 GTP 坐标的行主序排列: 下标 0 为 A19 (左上角)，与 go_position 的一维下标一致。
+ownership 统一换算为黑方视角 (+1 黑地，-1 白地)。
+"""
+
+from typing import Optional, List, Dict, Tuple, Any
+
+import numpy as np
+
+from katago_analyzer import Color
+
+
+def decode_floats(text: str, out: np.ndarray) -> np.ndarray:
+    """
+    把空白分隔的浮点串解码进 out，返回 out
+
+    Raises:
+        ValueError: 数值个数与 out.size 不一致 (输出被截断或棋盘尺寸不符)
+    """
+    flat = out.reshape(-1)
+    values = np.fromstring(text, dtype=np.float32, sep=' ')
+    if values.size != flat.size:
+        raise ValueError(f"期望 {flat.size} 个数值，实际 {values.size} 个")
+    flat[:] = values
+    return out
+
+
+def decode_ownership(text: str, to_move: Color, board_size: int = 19,
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    解码 kata-analyze 行尾的 ownership 数据
+
+    GTP 引擎以轮走方视角报告，白方走时翻转为黑方视角
+    """
+    if out is None:
+        out = np.empty((board_size, board_size), dtype=np.float32)
+    decode_floats(text, out)
+    if to_move == Color.WHITE:
+        np.negative(out, out=out)
+    return out
+
+
+def ownership_from_response(response: Dict[str, Any], board_size: int = 19,
+                            perspective: str = "BLACK",
+                            out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    取分析引擎响应中的 ownership (需要请求 includeOwnership)
+
+    Args:
+        perspective: 分析引擎配置的 reportAnalysisWinratesAs
+    """
+    values = response.get("ownership")
+    if values is None:
+        return None
+    if out is None:
+        out = np.empty((board_size, board_size), dtype=np.float32)
+    if len(values) != out.size:
+        raise ValueError(f"ownership 期望 {out.size} 个数值，实际 {len(values)} 个")
+    out.reshape(-1)[:] = values
+    to_move = response.get("rootInfo", {}).get("currentPlayer", "B")
+    if perspective == "WHITE" or (perspective == "SIDETOMOVE" and to_move == "W"):
+        np.negative(out, out=out)
+    return out
+
+
+def policy_from_response(response: Dict[str, Any], board_size: int = 19,
+                         out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    取分析引擎响应中的 policy (需要请求 includePolicy)
+
+    Returns:
+        长度 board_size*board_size+1 的数组，最后一项为 pass，非法点为 -1
+
+    Raises:
+        ValueError: 数值个数与棋盘尺寸不符
+    """
+    values = response.get("policy")
+    if values is None:
+        return None
+    if len(values) != board_size * board_size + 1:
+        raise ValueError(f"policy 期望 {board_size * board_size + 1} 个数值，实际 {len(values)} 个")
+    if out is None:
+        out = np.empty(board_size * board_size + 1, dtype=np.float32)
+    out[:] = values
+    return out
+
+
+def raw_policy(analyzer, board_size: int = 19,
+               out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    用 kata-raw-nn 取当前局面的神经网络策略 (GTP 引擎没有搜索后的 policy 输出)
+
+    Returns:
+        与 policy_from_response 相同的排列，非法点为 -1
+    """
+    response = analyzer._send_command('kata-raw-nn 0', timeout=10.0)
+    if not response.startswith('='):
+        return None
+    if out is None:
+        out = np.empty(board_size * board_size + 1, dtype=np.float32)
+
+    lines = response.split('\n')
+    rows: List[str] = []
+    for i, line in enumerate(lines):
+        if line.strip() == 'policy':
+            rows = lines[i + 1:i + 1 + board_size]
+        elif line.startswith('policyPass'):
+            out[-1] = float(line.split()[1])
+    if len(rows) < board_size:
+        return None
+    decode_floats(' '.join(rows).replace('NAN', '-1'), out[:-1])
+    return out
+
+
+class HeatmapStore:
+    """整盘棋的热力图，按手数预分配 (float16 时内存减半)"""
+
+    def __init__(self, num_positions: int, board_size: int = 19,
+                 dtype: Any = np.float32, with_policy: bool = False):
+        """
+        初始化
+
+        Args:
+            num_positions: 局面数 (一般为手数 + 1)
+            dtype: np.float32 或 np.float16
+            with_policy: 同时保存 policy
+        """
+        self.board_size = board_size
+        self.ownership = np.zeros((num_positions, board_size, board_size), dtype=dtype)
+        self.policy = (np.zeros((num_positions, board_size * board_size + 1), dtype=dtype)
+                       if with_policy else None)
+        self.filled = np.zeros(num_positions, dtype=bool)
+
+    @property
+    def nbytes(self) -> int:
+        total = self.ownership.nbytes
+        if self.policy is not None:
+            total += self.policy.nbytes
+        return total
+
+    def record_response(self, turn: int, response: Dict[str, Any], perspective: str = "BLACK"):
+        """写入分析引擎的一条响应"""
+        ownership = ownership_from_response(response, self.board_size, perspective)
+        if ownership is not None:
+            self.ownership[turn] = ownership
+            self.filled[turn] = True
+        if self.policy is not None:
+            policy_from_response(response, self.board_size, out=self.policy[turn])
+
+    def record_text(self, turn: int, text: str, to_move: Color):
+        """写入 kata-analyze 的 ownership 文本"""
+        # float16 目标先解码到 float32 临时数组，避免精度在取反前丢失
+        self.ownership[turn] = decode_ownership(text, to_move, self.board_size)
+        self.filled[turn] = True
+
+    def territory(self, turn: int, threshold: float = 0.5) -> Tuple[int, int]:
+        """(黑地, 白地) 的粗略点数"""
+        ownership = self.ownership[turn].astype(np.float32)
+        return int((ownership > threshold).sum()), int((ownership < -threshold).sum())
+
+
+def game_heatmaps(engine,
+                  moves: List[Tuple[str, str]],
+                  max_visits: Optional[int] = None,
+                  dtype: Any = np.float16,
+                  with_policy: bool = False,
+                  perspective: str = "BLACK",
+                  timeout: Optional[float] = None,
+                  **query_fields: Any) -> HeatmapStore:
+    """
+    用 JSON 分析引擎一次取整盘棋每个局面的 ownership (和 policy)
+
+    Args:
+        engine: KataGoAnalysisEngine
+        perspective: 分析配置的 reportAnalysisWinratesAs (仓库的 analysis.cfg 为 BLACK)
+    """
+    from katago_analysis_engine import build_query
+
+    board_size = query_fields.get("board_size", 19)
+    store = HeatmapStore(len(moves) + 1, board_size, dtype=dtype, with_policy=with_policy)
+    query = build_query(moves, analyze_turns=list(range(len(moves) + 1)),
+                        max_visits=max_visits, includeOwnership=True,
+                        includePolicy=with_policy, **query_fields)
+    responses = engine.submit(query).result(timeout=timeout)
+    for turn, response in responses.items():
+        store.record_response(turn, response, perspective)
+    return store
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+KataGo 日志统计
+从 gtp_logs/ 和 analysis_logs/ 中提取每次搜索的耗时、访问数和神经网络批次统计，
+给出 visits/s、NN evals/s、平均批大小相对 nnMaxBatchSize 的填充率和请求排队情况，
+判断 numAnalysisThreads × numSearchThreadsPerAnalysisThread 是否真正喂满了计算后端。
+
+- 每次搜索的统计需要 logSearchInfo = true (GTP 示例配置默认开启)
+- 日志里的 NN rows / NN batches 是引擎启动以来的累计值，这里按相邻两次搜索求差
+- 退出时的 "processed N rows M batches" 给出整个会话的平均批大小
+- 分析引擎的排队情况需要 logAllRequests (回复时间另需 logAllResponses)
+
+用法:
+    python3 katago_logstats.py gtp_logs analysis_logs
+    python3 katago_logstats.py analysis_logs --bucket 300 --json stats.json --csv series.csv
+"""
+
+import argparse
+import csv
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+from katago_replay import read_log, parse_log, LoggedRequest
+
+_FINISHING = re.compile(r'processed (\d+) rows (\d+) batches')
+
+# 搜索信息块中的字段 (续行)
+_SEARCH_FIELDS = {
+    'Time taken:': 'time_taken',
+    'Root visits:': 'root_visits',
+    'New playouts:': 'playouts',
+    'NN rows:': 'nn_rows',
+    'NN batches:': 'nn_batches',
+}
+
+
+@dataclass
+class SearchRecord:
+    """一次搜索 (logSearchInfo 输出的一个信息块)"""
+    at: float                      # 时间戳 (time.time)
+    time_taken: float = 0.0
+    root_visits: int = 0
+    playouts: int = 0
+    nn_rows: int = 0               # 本次搜索的神经网络计算行数 (已由累计值求差)
+    nn_batches: int = 0
+
+    @property
+    def visits_per_second(self) -> Optional[float]:
+        return self.playouts / self.time_taken if self.time_taken > 0 else None
+
+    @property
+    def evals_per_second(self) -> Optional[float]:
+        return self.nn_rows / self.time_taken if self.time_taken > 0 else None
+
+    @property
+    def batch_size(self) -> Optional[float]:
+        return self.nn_rows / self.nn_batches if self.nn_batches else None
+
+
+@dataclass
+class LogStats:
+    """一个日志文件的统计"""
+    path: str
+    mode: str
+    config: Dict[str, str] = field(default_factory=dict)
+    started: Optional[float] = None
+    ended: Optional[float] = None
+    searches: List[SearchRecord] = field(default_factory=list)
+    requests: List[LoggedRequest] = field(default_factory=list)
+    request_start: Optional[float] = None
+    total_rows: Optional[int] = None
+    total_batches: Optional[int] = None
+
+    def _int_config(self, *keys: str) -> Optional[int]:
+        for key in keys:
+            try:
+                return int(self.config[key])
+            except (KeyError, ValueError):
+                continue
+        return None
+
+    @property
+    def analysis_threads(self) -> int:
+        return self._int_config('numAnalysisThreads') or 1 if self.mode == 'analysis' else 1
+
+    @property
+    def search_threads(self) -> Optional[int]:
+        """同时可能请求神经网络计算的搜索线程总数"""
+        per_search = self._int_config('numSearchThreadsPerAnalysisThread', 'numSearchThreads')
+        if per_search is None:
+            return None
+        return per_search * self.analysis_threads
+
+    @property
+    def max_batch_size(self) -> Optional[int]:
+        return self._int_config('nnMaxBatchSize')
+
+    def queries(self) -> List[LoggedRequest]:
+        return [r for r in self.requests if r.kind == 'query']
+
+    def summary(self) -> Dict[str, Any]:
+        searches = self.searches
+        busy = sum(s.time_taken for s in searches)
+        playouts = sum(s.playouts for s in searches)
+        rows = sum(s.nn_rows for s in searches)
+        batches = sum(s.nn_batches for s in searches)
+        if not rows and self.total_rows is not None:
+            rows, batches = self.total_rows, self.total_batches or 0
+        batch = rows / batches if batches else None
+        max_batch = self.max_batch_size
+        threads = self.search_threads
+        uptime = self.ended - self.started if self.started is not None and self.ended else None
+
+        queries = self.queries()
+        turnarounds = [r.responded - r.offset for r in queries if r.responded is not None]
+        depth = queue_depth(queries, self.analysis_threads)
+        return {
+            "path": self.path,
+            "mode": self.mode,
+            "uptime": uptime,
+            "searches": len(searches),
+            "search_time": busy,
+            # 时间戳只精确到秒，短会话的占比可能略超 100%
+            "busy_ratio": min(1.0, busy / uptime) if uptime else None,
+            "playouts": playouts,
+            "visits_per_second": playouts / busy if busy > 0 else None,
+            "nn_rows": rows,
+            "nn_batches": batches,
+            "evals_per_second": rows / busy if busy > 0 and searches else None,
+            "avg_batch_size": batch,
+            "nn_max_batch_size": max_batch,
+            "search_threads": threads,
+            "batch_fill": batch / max_batch if batch and max_batch else None,
+            "thread_fill": batch / threads if batch and threads else None,
+            "queries": len(queries),
+            "turnaround_mean": sum(turnarounds) / len(turnarounds) if turnarounds else None,
+            "turnaround_max": max(turnarounds) if turnarounds else None,
+            "max_in_flight": max((d for _, d, _ in depth), default=0),
+            "max_queued": max((q for _, _, q in depth), default=0),
+        }
+
+    def time_series(self, bucket: float = 60.0) -> List[Dict[str, Any]]:
+        """按 bucket 秒聚合的时间序列 (只含有数据的时间段)"""
+        rows: Dict[int, Dict[str, Any]] = {}
+
+        def row(at: float) -> Dict[str, Any]:
+            key = int(at // bucket)
+            if key not in rows:
+                rows[key] = {"time": key * bucket, "searches": 0, "search_time": 0.0,
+                             "playouts": 0, "nn_rows": 0, "nn_batches": 0,
+                             "requests": 0, "responses": 0, "turnaround_sum": 0.0,
+                             "max_in_flight": 0, "max_queued": 0}
+            return rows[key]
+
+        for s in self.searches:
+            r = row(s.at)
+            r["searches"] += 1
+            r["search_time"] += s.time_taken
+            r["playouts"] += s.playouts
+            r["nn_rows"] += s.nn_rows
+            r["nn_batches"] += s.nn_batches
+        start = self.request_start or 0.0
+        for q in self.queries():
+            row(start + q.offset)["requests"] += 1
+            if q.responded is not None:
+                r = row(start + q.responded)
+                r["responses"] += 1
+                r["turnaround_sum"] += q.responded - q.offset
+        for at, in_flight, queued in queue_depth(self.queries(), self.analysis_threads):
+            r = row(start + at)
+            r["max_in_flight"] = max(r["max_in_flight"], in_flight)
+            r["max_queued"] = max(r["max_queued"], queued)
+
+        series = []
+        for key in sorted(rows):
+            r = rows.pop(key)
+            turnaround_sum = r.pop("turnaround_sum")
+            r.update({
+                "time": datetime.fromtimestamp(r["time"]).isoformat(timespec='seconds'),
+                "visits_per_second": r["playouts"] / bucket,
+                "evals_per_second": r["nn_rows"] / bucket,
+                "search_speed": r["playouts"] / r["search_time"] if r["search_time"] else None,
+                "avg_batch_size": r["nn_rows"] / r["nn_batches"] if r["nn_batches"] else None,
+                "turnaround_mean": turnaround_sum / r["responses"] if r["responses"] else None,
+            })
+            series.append(r)
+        return series
+
+
+def queue_depth(queries: List[LoggedRequest], analysis_threads: int) -> List[Tuple[float, int, int]]:
+    """
+    请求到达/完成时刻的 (时间, 进行中请求数, 排队数)
+
+    排队数 = 进行中请求数超出 numAnalysisThreads 的部分。没有响应记录的请求不计入。
+    """
+    events = []
+    for q in queries:
+        if q.responded is not None:
+            events.append((q.offset, 1))
+            events.append((q.responded, -1))
+    # 同一秒内先完成再到达
+    events.sort(key=lambda e: (e[0], e[1]))
+    depth, result = 0, []
+    for at, delta in events:
+        depth += delta
+        result.append((at, depth, max(0, depth - analysis_threads)))
+    return result
+
+
+def parse_stats(path: str) -> LogStats:
+    """解析一个日志文件"""
+    session = parse_log(path)
+    stats = LogStats(path=str(path), mode=session.mode, config=session.config,
+                     requests=session.requests, request_start=session.start)
+    current: Optional[SearchRecord] = None
+    last_stamp: Optional[float] = None
+    cumulative = {'nn_rows': 0, 'nn_batches': 0}
+
+    for stamp, text in read_log(path):
+        if stamp is not None:
+            last_stamp = stamp
+            if stats.started is None:
+                stats.started = stamp
+            stats.ended = stamp
+            finishing = _FINISHING.search(text)
+            if finishing:
+                stats.total_rows = (stats.total_rows or 0) + int(finishing.group(1))
+                stats.total_batches = (stats.total_batches or 0) + int(finishing.group(2))
+                continue
+        text = text.strip()
+        if text.startswith('Time taken:'):
+            current = SearchRecord(at=last_stamp or 0.0)
+            stats.searches.append(current)
+        if current is None:
+            continue
+        for prefix, name in _SEARCH_FIELDS.items():
+            if text.startswith(prefix):
+                value = float(text[len(prefix):].split()[0])
+                if name in cumulative:
+                    # 累计值：求差，变小说明计数器被重置
+                    previous = cumulative[name]
+                    cumulative[name] = int(value)
+                    value = value - previous if value >= previous else value
+                setattr(current, name, type(getattr(current, name))(value))
+                if name == 'nn_batches':
+                    current = None
+                break
+    return stats
+
+
+def load_stats(paths: Iterable[str]) -> List[LogStats]:
+    """解析日志文件或目录 (目录下的 *.log 按文件名排序)"""
+    files: List[Path] = []
+    for p in map(Path, paths):
+        files.extend(sorted(p.glob('*.log')) if p.is_dir() else [p])
+    return [parse_stats(str(p)) for p in files]
+
+
+def diagnose(summary: Dict[str, Any]) -> List[str]:
+    """根据批填充率给出配置建议"""
+    notes = []
+    batch, max_batch, threads = (summary["avg_batch_size"], summary["nn_max_batch_size"],
+                                 summary["search_threads"])
+    if batch is None:
+        return notes
+    if max_batch and batch >= 0.9 * max_batch:
+        notes.append("平均批大小接近 nnMaxBatchSize，后端已满载；可增大 nnMaxBatchSize (显存允许时)")
+    elif threads and max_batch and threads < max_batch:
+        notes.append(f"搜索线程总数 {threads} 小于 nnMaxBatchSize {max_batch}，"
+                     f"批次最多填到 {threads / max_batch * 100:.0f}%；可增加线程数")
+    if threads and batch < 0.5 * threads:
+        if summary["mode"] == 'analysis' and summary["max_in_flight"] and \
+                summary["max_in_flight"] < threads:
+            notes.append("并发请求数不足以占满 numAnalysisThreads，批次主要受请求并发限制")
+        else:
+            notes.append(f"平均批大小只有搜索线程数的 {batch / threads * 100:.0f}%，"
+                         "搜索线程未能持续提交计算 (CPU 受限或 NN 缓存命中多)")
+    if summary["max_queued"]:
+        notes.append(f"最多 {summary['max_queued']} 个请求排队等待分析线程；可增加 numAnalysisThreads")
+    return notes
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """单个日志的统计 (文本)"""
+    def num(value, fmt="{:.1f}", scale=1.0):
+        return "-" if value is None else fmt.format(value * scale)
+
+    if not summary["searches"] and not summary["queries"] and not summary["nn_rows"]:
+        return f"{summary['path']} ({summary['mode']}): 没有搜索或请求记录"
+    lines = [f"{summary['path']} ({summary['mode']})"]
+    lines.append(f"  运行 {num(summary['uptime'], '{:.0f}')} s, {summary['searches']} 次搜索, "
+                 f"搜索耗时 {summary['search_time']:.1f} s "
+                 f"(占比 {num(summary['busy_ratio'], '{:.0f}%', 100)})")
+    lines.append(f"  visits/s {num(summary['visits_per_second'], '{:.0f}')}, "
+                 f"NN evals/s {num(summary['evals_per_second'], '{:.0f}')}, "
+                 f"NN 计算 {summary['nn_rows']} 行 / {summary['nn_batches']} 批")
+    lines.append(f"  平均批大小 {num(summary['avg_batch_size'], '{:.2f}')} "
+                 f"/ nnMaxBatchSize {summary['nn_max_batch_size'] or '-'} "
+                 f"(填充 {num(summary['batch_fill'], '{:.0f}%', 100)}), "
+                 f"搜索线程 {summary['search_threads'] or '-'} "
+                 f"(填充 {num(summary['thread_fill'], '{:.0f}%', 100)})")
+    if summary["queries"]:
+        lines.append(f"  请求 {summary['queries']} 个, 平均周转 "
+                     f"{num(summary['turnaround_mean'])} s, 最长 {num(summary['turnaround_max'])} s, "
+                     f"最多同时 {summary['max_in_flight']} 个 / 排队 {summary['max_queued']} 个")
+    for note in diagnose(summary):
+        lines.append(f"  → {note}")
+    return '\n'.join(lines)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="KataGo 日志中的搜索速度和批次统计")
+    parser.add_argument("logs", nargs="+", help="日志文件或目录 (gtp_logs/、analysis_logs/)")
+    parser.add_argument("--bucket", type=float, default=60.0, help="时间序列的聚合间隔 (秒)")
+    parser.add_argument("--json", help="保存汇总和时间序列 (JSON)")
+    parser.add_argument("--csv", help="保存时间序列 (CSV，每行一个日志的一个时间段)")
+    args = parser.parse_args()
+
+    all_stats = load_stats(args.logs)
+    if not all_stats:
+        print("没有找到日志")
+        return
+    output = []
+    for stats in all_stats:
+        summary = stats.summary()
+        print(format_summary(summary))
+        output.append({"summary": summary, "series": stats.time_series(args.bucket)})
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"bucket": args.bucket, "logs": output}, f, indent=2, ensure_ascii=False)
+        print(f"✓ 统计已保存: {args.json}")
+    if args.csv:
+        rows = [dict(point, path=item["summary"]["path"])
+                for item in output for point in item["series"]]
+        if rows:
+            with open(args.csv, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=["path"] + [k for k in rows[0] if k != "path"])
+                writer.writeheader()
+                writer.writerows(rows)
+        print(f"✓ 时间序列已保存: {args.csv} ({len(rows)} 行)")
+
+
+if __name__ == "__main__":
+    main()
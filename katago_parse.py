@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+kata-analyze 输出解析
+一条更新行里依次排列全部候选着法 (`info move ... pv ...`)，末尾可能跟着 ownership。
+这里一次遍历切出所有候选和完整的主要变化，不为每个键值构建字典。
+"""
+
+from typing import Optional, List, Tuple
+
+from katago_analyzer import MoveAnalysis
+
+# pv 之后可能出现的键，遇到即结束当前主要变化
+_PV_END = frozenset(('info', 'pvVisits', 'pvEdgeVisits', 'ownership', 'ownershipStdev',
+                     'movesOwnership', 'movesOwnershipStdev'))
+
+
+def parse_info_line(line: str) -> Tuple[List[MoveAnalysis], Optional[str]]:
+    """
+    解析一条 kata-analyze 更新
+
+    Returns:
+        (候选着法列表 (不含 pass)，ownership 原始浮点串或 None)
+    """
+    head, sep, ownership = line.partition(' ownership ')
+    tokens = head.split()
+    n = len(tokens)
+    results: List[MoveAnalysis] = []
+
+    move = None
+    visits, winrate, score_lead, prior, order = 0, 0.5, 0.0, 0.0, 0
+    pv: List[str] = []
+    i = 0
+    while i < n:
+        key = tokens[i]
+        if key == 'info':
+            if move and move != 'pass':
+                results.append(MoveAnalysis(move, visits, winrate, score_lead, prior, pv,
+                                            order=order))
+            move = None
+            visits, winrate, score_lead, prior, order = 0, 0.5, 0.0, 0.0, 0
+            pv = []
+            i += 1
+        elif key == 'pv':
+            j = i + 1
+            while j < n and tokens[j] not in _PV_END:
+                j += 1
+            pv = tokens[i + 1:j]
+            i = j
+        elif i + 1 >= n:
+            break
+        else:
+            value = tokens[i + 1]
+            if key == 'move':
+                move = value
+            elif key == 'visits':
+                visits = int(value)
+            elif key == 'winrate':
+                winrate = float(value)
+            elif key == 'scoreLead':
+                score_lead = float(value)
+            elif key == 'prior':
+                prior = float(value)
+            elif key == 'order':
+                order = int(value)
+            elif key in ('pvVisits', 'pvEdgeVisits', 'movesOwnership', 'movesOwnershipStdev'):
+                # 数量不定的数值列表，跳到下一个候选
+                j = i + 1
+                while j < n and tokens[j] != 'info':
+                    j += 1
+                i = j
+                continue
+            i += 2
+
+    if move and move != 'pass':
+        results.append(MoveAnalysis(move, visits, winrate, score_lead, prior, pv, order=order))
+    return results, (ownership if sep else None)
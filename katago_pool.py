@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+KataGo 引擎池
+同时运行多个 GTP 引擎进程，按优先级 (同级先来先到) 把引擎租给调用方，
+崩溃的引擎在下次租出前自动重启，并统计每个引擎的利用率和各优先级的排队延迟
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Iterator
+
+from katago_analyzer import KataGoAnalyzer, KATAGO_BIN
+from katago_supervisor import SupervisedKataGoAnalyzer
+from katago_cache import AnalysisCache
+from katago_scheduler import Priority, PRIORITY_RANK, LatencyHistogram
+
+
+@dataclass
+class EngineSlot:
+    """池中的一个引擎及其统计"""
+    index: int
+    analyzer: KataGoAnalyzer
+    leases: int = 0
+    restarts: int = 0
+    busy_seconds: float = 0.0
+    leased_at: Optional[float] = None
+    started_at: float = field(default_factory=time.monotonic)
+
+    def is_alive(self) -> bool:
+        proc = self.analyzer.proc
+        return self.analyzer.is_ready and proc is not None and proc.poll() is None
+
+
+class KataGoEnginePool:
+    """多进程 KataGo 引擎池"""
+
+    def __init__(self,
+                 model_path: str,
+                 size: int = 2,
+                 config_path: str = "/tmp/katago.cfg",
+                 config_overrides: Optional[Dict[str, Any]] = None,
+                 engine_overrides: Optional[List[Dict[str, Any]]] = None,
+                 katago_path: str = KATAGO_BIN,
+                 cache: Optional[AnalysisCache] = None,
+                 supervise: bool = False):
+        """
+        初始化
+
+        Args:
+            model_path: 模型文件路径
+            size: 引擎进程数
+            config_path: GTP 配置文件
+            config_overrides: 所有引擎共用的配置覆盖
+            engine_overrides: 每个引擎单独的配置覆盖 (按下标对应，覆盖共用项)
+            katago_path: katago 可执行文件
+            cache: 所有引擎共享的分析结果缓存 (可选)
+            supervise: 使用带心跳和自动重试的 SupervisedKataGoAnalyzer
+        """
+        self.size = size
+        self.slots: List[EngineSlot] = []
+        for i in range(size):
+            overrides = dict(config_overrides or {})
+            if engine_overrides and i < len(engine_overrides):
+                overrides.update(engine_overrides[i])
+            engine_class = SupervisedKataGoAnalyzer if supervise else KataGoAnalyzer
+            analyzer = engine_class(model_path, config_path=config_path,
+                                    config_overrides=overrides,
+                                    katago_path=katago_path,
+                                    cache=cache)
+            self.slots.append(EngineSlot(i, analyzer))
+
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        self._waiters: deque = deque()
+        self._wait_seconds = 0.0
+        self._wait_histograms = {priority: LatencyHistogram() for priority in Priority}
+        self._max_queue = 0
+        self._closed = False
+
+    def start(self) -> bool:
+        """并行启动并预热所有引擎，全部就绪才返回 True"""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            started = list(executor.map(lambda slot: slot.analyzer.start(warmup=True),
+                                        self.slots))
+
+        with self._cond:
+            now = time.monotonic()
+            for slot in self.slots:
+                slot.started_at = now
+                self._idle.append(slot)
+            self._cond.notify_all()
+
+        ready = sum(started)
+        print(f"✓ 引擎池: {ready}/{self.size} 个引擎就绪")
+        return ready == self.size
+
+    def stop(self):
+        """停止所有引擎"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for slot in self.slots:
+            slot.analyzer.stop()
+
+    # ============ 租用 ============
+
+    def acquire(self, timeout: Optional[float] = None,
+                priority: Priority = Priority.BATCH) -> EngineSlot:
+        """
+        取得一个空闲引擎：高优先级先拿到，同一优先级先来先到
+
+        Raises:
+            TimeoutError: timeout 秒内没有轮到
+        """
+        ticket = (PRIORITY_RANK[priority], object())
+        requested = time.monotonic()
+        deadline = requested + timeout if timeout is not None else None
+
+        with self._cond:
+            # 排在所有同级和更高优先级的请求之后
+            position = sum(1 for rank, _ in self._waiters if rank <= ticket[0])
+            self._waiters.insert(position, ticket)
+            self._max_queue = max(self._max_queue, len(self._waiters))
+            try:
+                # 只有排在队首的请求可以拿走空闲引擎，保证公平
+                while not (self._waiters[0] is ticket and self._idle):
+                    if self._closed:
+                        raise RuntimeError("引擎池已关闭")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"等待空闲引擎超时 ({timeout}s)")
+                    self._cond.wait(remaining)
+                slot = self._idle.popleft()
+            finally:
+                self._waiters.remove(ticket)
+                # 队首变了，唤醒下一位
+                self._cond.notify_all()
+
+            now = time.monotonic()
+            self._wait_seconds += now - requested
+            self._wait_histograms[priority].observe(now - requested)
+            slot.leases += 1
+            slot.leased_at = now
+
+        if not slot.is_alive():
+            self._restart(slot)
+        return slot
+
+    def release(self, slot: EngineSlot):
+        """归还引擎"""
+        with self._cond:
+            if slot.leased_at is not None:
+                slot.busy_seconds += time.monotonic() - slot.leased_at
+                slot.leased_at = None
+            self._idle.append(slot)
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None,
+              priority: Priority = Priority.BATCH) -> Iterator[KataGoAnalyzer]:
+        """
+        租用一个引擎
+
+        用法:
+            with pool.lease() as katago:
+                katago.goto_position(moves)
+                results = katago.analyze(Color.WHITE, visits=200)
+        """
+        slot = self.acquire(timeout, priority)
+        try:
+            yield slot.analyzer
+        finally:
+            self.release(slot)
+
+    def _restart(self, slot: EngineSlot):
+        """重启崩溃或未就绪的引擎，配置覆盖保持不变"""
+        print(f"⚠️ 引擎 #{slot.index} 不可用，正在重启...")
+        slot.analyzer.stop()
+        if slot.analyzer.start(warmup=True):
+            slot.restarts += 1
+        else:
+            print(f"❌ 引擎 #{slot.index} 重启失败")
+
+    # ============ 统计 ============
+
+    def stats(self) -> Dict[str, Any]:
+        """每个引擎的利用率与排队情况，用于按硬件调整引擎数"""
+        now = time.monotonic()
+        with self._cond:
+            engines = []
+            for slot in self.slots:
+                busy = slot.busy_seconds
+                if slot.leased_at is not None:
+                    busy += now - slot.leased_at
+                elapsed = max(now - slot.started_at, 1e-9)
+                startup = slot.analyzer.startup_stats
+                engines.append({
+                    "index": slot.index,
+                    "alive": slot.is_alive(),
+                    "leases": slot.leases,
+                    "restarts": slot.restarts,
+                    "busy_seconds": busy,
+                    "utilization": busy / elapsed,
+                    "startup": startup.as_dict() if startup else None,
+                    "supervisor": (slot.analyzer.metrics()
+                                   if isinstance(slot.analyzer, SupervisedKataGoAnalyzer) else None),
+                })
+            total_leases = sum(slot.leases for slot in self.slots)
+            return {
+                "size": self.size,
+                "engines": engines,
+                "queued": len(self._waiters),
+                "max_queue": self._max_queue,
+                "avg_wait_seconds": self._wait_seconds / total_leases if total_leases else 0.0,
+                "wait_latency": {priority.value: histogram.as_dict()
+                                 for priority, histogram in self._wait_histograms.items()},
+                "utilization": sum(e["utilization"] for e in engines) / self.size,
+            }
+
+    # ============ 上下文管理器 ============
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+KataGo 日志回放
+从 gtp_logs/ 和 analysis_logs/ 的会话日志中提取命令流和请求流，按原始节奏 (或加速)
+回放到真实引擎或替身引擎 (benchmarks/fake_katago.py)，统计吞吐、延迟分位数，
+并与日志中的响应或上一次回放的结果比较，把线上流量变成可重复的性能测试。
+
+- GTP 日志: `Controller: <命令>` 为命令，其后第一条 `=`/`?` 行为响应 (需 logAllGTPCommunication)
+- 分析引擎日志: 带 id 的 JSON 行，含 moves 的为请求，含 turnNumber 的为响应
+  (需 logAllRequests / logAllResponses；analysis.cfg 默认关闭，录制时用 RECORD_OVERRIDES 覆盖，
+  如 KATAGO_RECORD=1 python3 katago_daemon.py start)
+- 日志时间戳只精确到秒，同一秒内的请求按顺序连续发出
+
+用法:
+    python3 katago_replay.py gtp_logs analysis_logs --speed 10 --fake
+    python3 katago_replay.py analysis_logs --save before.json
+    python3 katago_replay.py analysis_logs --baseline before.json    # 改配置后比较
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
+
+# 录制分析引擎流量所需的配置覆盖项 (只在录制时打开，避免常驻引擎的日志无限增长)
+RECORD_OVERRIDES = {"logAllRequests": "true", "logAllResponses": "true"}
+
+# "2026-02-07 00:27:40+0800: 内容"
+_LOG_LINE = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)[+-]\d{4}: (.*)$')
+
+# 结果流式输出、直到下一条命令才结束的 GTP 命令
+_STREAMING = ('kata-analyze', 'lz-analyze', 'kata-genmove_analyze', 'lz-genmove_analyze')
+
+FAKE_KATAGO = str(Path(__file__).with_name("benchmarks") / "fake_katago.py")
+
+
+@dataclass
+class LoggedRequest:
+    """日志中的一条命令或请求"""
+    offset: float                  # 相对会话第一条请求的秒数
+    kind: str                      # 'gtp' / 'query' / 'action'
+    payload: Any                   # GTP 命令串或 JSON 请求
+    response: Any = None           # 日志中的响应摘要 (见 summarize_*)
+    responded: Optional[float] = None   # 最后一条响应的时间 (相对会话第一条请求)
+
+
+@dataclass
+class LoggedSession:
+    """一个日志文件 (一次引擎运行)"""
+    path: str
+    mode: str                      # 'gtp' / 'analysis'
+    config: Dict[str, str] = field(default_factory=dict)
+    requests: List[LoggedRequest] = field(default_factory=list)
+    logged_errors: int = 0
+    start: Optional[float] = None  # 第一条请求的时间戳 (time.time)
+
+
+# ============ 解析日志 ============
+
+def _timestamp(text: str) -> float:
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+def read_log(path: str) -> Iterator[Tuple[Optional[float], str]]:
+    """逐行读取日志：(时间戳, 内容)；续行 (配置、棋盘、搜索树) 的时间戳为 None"""
+    with open(path, 'r', errors='replace') as f:
+        for raw in f:
+            line = raw.rstrip('\n')
+            match = _LOG_LINE.match(line)
+            if match is None:
+                yield None, line
+            else:
+                yield _timestamp(match.group(1)), match.group(2)
+
+
+def summarize_gtp(response: str) -> str:
+    """GTP 响应的可比较摘要：状态符和第一行内容"""
+    first = response.strip().split('\n', 1)[0] if response.strip() else ''
+    status = first[:1]
+    text = re.sub(r'^[=?]\d*\s*', '', first).strip()
+    return f"{status} {text}".strip()
+
+
+def summarize_analysis(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """分析响应的可比较摘要：最佳着法、胜率、目差、根节点访问数 (noResults 为 None)"""
+    infos = response.get("moveInfos") or []
+    if response.get("noResults") or not infos:
+        return None
+    best = min(infos, key=lambda info: info.get("order", 0))
+    root = response.get("rootInfo", {})
+    return {
+        "move": best.get("move"),
+        "winrate": root.get("winrate", best.get("winrate")),
+        "scoreLead": root.get("scoreLead", best.get("scoreLead")),
+        "visits": root.get("visits", sum(info.get("visits", 0) for info in infos)),
+    }
+
+
+def parse_log(path: str) -> LoggedSession:
+    """解析一个 KataGo 日志文件"""
+    session = LoggedSession(path=str(path), mode='gtp')
+    by_id: Dict[str, LoggedRequest] = {}
+    awaiting: Optional[LoggedRequest] = None
+    in_config = False
+
+    for stamp, text in read_log(path):
+        if stamp is None:
+            # 启动时打印的配置 (key = value)，以空行结束
+            if in_config and ' = ' in text:
+                key, _, value = text.partition(' = ')
+                session.config[key.strip()] = value.split('#')[0].strip()
+            elif not text.strip():
+                in_config = False
+            continue
+        if text.startswith('Running with following config'):
+            in_config = True
+            continue
+        in_config = False
+        if text.startswith('Analysis Engine starting'):
+            session.mode = 'analysis'
+        elif text.startswith('Config override: '):
+            key, _, value = text[len('Config override: '):].partition(' = ')
+            session.config[key.strip()] = value.strip()
+
+        if text.startswith('Controller: '):
+            if session.start is None:
+                session.start = stamp
+            awaiting = LoggedRequest(stamp - session.start, 'gtp',
+                                     text[len('Controller: '):].strip())
+            session.requests.append(awaiting)
+            continue
+        if awaiting is not None and text[:1] in '=?':
+            awaiting.response = summarize_gtp(text)
+            awaiting.responded = stamp - session.start
+            awaiting = None
+            continue
+
+        brace = text.find('{')
+        if brace < 0:
+            continue
+        try:
+            payload = json.loads(text[brace:])
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(payload, dict):
+            continue
+        if "error" in payload and "id" not in payload:
+            session.logged_errors += 1
+            continue
+        if "id" not in payload:
+            continue
+        is_response = 'Response' in text[:brace] or "turnNumber" in payload
+        if not is_response and ("moves" in payload or "action" in payload):
+            if session.start is None:
+                session.start = stamp
+            request = LoggedRequest(stamp - session.start,
+                                    'action' if "action" in payload else 'query', payload)
+            session.requests.append(request)
+            by_id[payload["id"]] = request
+        elif "turnNumber" in payload and not payload.get("isDuringSearch"):
+            request = by_id.get(payload["id"])
+            if request is not None and request.kind == 'query':
+                if request.response is None:
+                    request.response = {}
+                request.response[str(payload["turnNumber"])] = summarize_analysis(payload)
+                request.responded = stamp - session.start
+    return session
+
+
+def load_sessions(paths: Iterable[str]) -> List[LoggedSession]:
+    """解析日志文件或目录 (目录下的 *.log 按文件名排序)，跳过没有请求的会话"""
+    files: List[Path] = []
+    for p in map(Path, paths):
+        files.extend(sorted(p.glob('*.log')) if p.is_dir() else [p])
+    sessions = [parse_log(str(p)) for p in files]
+    return [s for s in sessions if s.requests]
+
+
+# ============ 回放 ============
+
+@dataclass
+class ReplayRecord:
+    """一条请求的回放结果"""
+    index: int
+    label: str                     # GTP 命令名或 query / action 名
+    scheduled: float               # 按回放速度应发出的时间 (相对回放开始)
+    sent: float = 0.0              # 实际发出时间
+    latency: Optional[float] = None
+    ok: bool = True
+    result: Any = None             # 与 LoggedRequest.response 相同格式的摘要
+
+
+@dataclass
+class ReplayResult:
+    """一个会话的回放结果"""
+    path: str
+    mode: str
+    speed: float
+    wall_time: float = 0.0
+    records: List[ReplayRecord] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        """吞吐、延迟分位数 (总体和按命令)、发送滞后"""
+        done = [r for r in self.records if r.latency is not None]
+        by_label: Dict[str, List[float]] = {}
+        for r in done:
+            by_label.setdefault(r.label, []).append(r.latency)
+        lags = [r.sent - r.scheduled for r in self.records]
+        return {
+            "requests": len(self.records),
+            "completed": len(done),
+            "errors": sum(1 for r in self.records if not r.ok),
+            "wall_time": self.wall_time,
+            "throughput": len(done) / self.wall_time if self.wall_time > 0 else None,
+            "latency": latency_summary([r.latency for r in done]),
+            "by_command": {label: latency_summary(values)
+                           for label, values in sorted(by_label.items())},
+            "max_lag": max(lags) if lags else 0.0,
+        }
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": _percentile(values, 0.5),
+        "p90": _percentile(values, 0.9),
+        "p99": _percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+
+def _pace(began: float, scheduled: float):
+    delay = began + scheduled - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def replay_gtp(session: LoggedSession, analyzer, speed: float = 1.0,
+               timeout: float = 120.0) -> ReplayResult:
+    """
+    按顺序回放 GTP 命令 (与原控制端一样逐条等待响应)
+
+    流式分析命令不等待结束，下一条命令会打断它；其延迟记为第一条输出的时间。
+    analyzer 为已启动的 KataGoAnalyzer。
+    """
+    result = ReplayResult(session.path, 'gtp', speed)
+    began = time.monotonic()
+    streaming: Optional[Future] = None
+    for index, request in enumerate(session.requests):
+        command = request.payload
+        name = command.split()[0] if command.split() else ''
+        if name == 'quit':
+            continue
+        record = ReplayRecord(index, name, request.offset / speed if speed > 0 else 0.0)
+        result.records.append(record)
+        _pace(began, record.scheduled)
+
+        record.sent = time.monotonic() - began
+        sent_at = time.monotonic()
+        if name in _STREAMING:
+            first_line = threading.Event()
+
+            def on_line(line, record=record, event=first_line, sent_at=sent_at):
+                if not event.is_set():
+                    record.latency = time.monotonic() - sent_at
+                    event.set()
+
+            streaming = analyzer.send_command_async(command, on_line=on_line)
+            first_line.wait(timeout)
+            record.result = '='
+            continue
+
+        future = analyzer.send_command_async(command)
+        try:
+            response = future.result(timeout=timeout)
+            record.latency = time.monotonic() - sent_at
+            record.result = summarize_gtp(response)
+            record.ok = response.startswith('=')
+        except Exception as e:
+            record.ok = False
+            record.result = f"! {e}"
+        streaming = None
+
+    if streaming is not None and not streaming.done():
+        analyzer.send_command_async('stop').result(timeout=timeout)
+    result.wall_time = time.monotonic() - began
+    return result
+
+
+def replay_analysis(session: LoggedSession, engine, speed: float = 1.0,
+                    timeout: float = 600.0) -> ReplayResult:
+    """
+    按时间回放分析请求 (不等前一个完成，与原始流量一样并发)
+
+    请求 id 改写为 r<序号> 避免多个会话冲突，terminate 的 terminateId 同步改写。
+    engine 为已启动的 KataGoAnalysisEngine。
+    """
+    result = ReplayResult(session.path, 'analysis', speed)
+    ids: Dict[Any, str] = {}
+    futures: List[Future] = []
+    began = time.monotonic()
+
+    for index, request in enumerate(session.requests):
+        payload = dict(request.payload)
+        label = payload.get("action", "query")
+        record = ReplayRecord(index, label, request.offset / speed if speed > 0 else 0.0)
+        result.records.append(record)
+        _pace(began, record.scheduled)
+        record.sent = time.monotonic() - began
+        sent_at = time.monotonic()
+
+        if request.kind == 'action':
+            action = payload.pop("action")
+            payload.pop("id", None)
+            if "terminateId" in payload:
+                payload["terminateId"] = ids.get(payload["terminateId"], payload["terminateId"])
+            future = engine.send_action(action, **payload)
+        else:
+            ids[payload["id"]] = payload["id"] = f"r{index}"
+            future = engine.submit(payload)
+
+        def done(f: Future, record=record, sent_at=sent_at, action=request.kind == 'action'):
+            record.latency = time.monotonic() - sent_at
+            if f.cancelled() or f.exception() is not None:
+                record.ok = False
+                record.result = f"! {f.exception() if not f.cancelled() else 'cancelled'}"
+            elif not action:
+                record.result = {str(turn): summarize_analysis(response)
+                                 for turn, response in f.result().items()}
+
+        future.add_done_callback(done)
+        futures.append(future)
+
+    deadline = time.monotonic() + timeout
+    for future in futures:
+        try:
+            future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception:
+            pass
+    result.wall_time = time.monotonic() - began
+    return result
+
+
+# ============ 结果比较 ============
+
+def compare(mode: str, results: Dict[int, Any], reference: Dict[int, Any]) -> Dict[str, Any]:
+    """
+    比较两组结果摘要 (按请求序号对齐，任一方缺失的跳过)
+
+    GTP 统计响应不同的命令数；分析请求统计最佳着法一致率和胜率、目差的偏差。
+    """
+    common = [i for i in sorted(results) if i in reference
+              and results[i] is not None and reference[i] is not None]
+    if mode == 'gtp':
+        different = [i for i in common if results[i] != reference[i]]
+        return {
+            "compared": len(common),
+            "different": len(different),
+            "examples": [{"index": i, "replay": results[i], "reference": reference[i]}
+                         for i in different[:5]],
+        }
+
+    positions, same_move = 0, 0
+    winrate_diffs: List[float] = []
+    score_diffs: List[float] = []
+    for i in common:
+        for turn, summary in results[i].items():
+            other = reference[i].get(turn)
+            if summary is None or other is None:
+                continue
+            positions += 1
+            same_move += summary["move"] == other["move"]
+            if summary.get("winrate") is not None and other.get("winrate") is not None:
+                winrate_diffs.append(abs(summary["winrate"] - other["winrate"]))
+            if summary.get("scoreLead") is not None and other.get("scoreLead") is not None:
+                score_diffs.append(abs(summary["scoreLead"] - other["scoreLead"]))
+    return {
+        "compared": positions,
+        "best_move_agreement": same_move / positions if positions else None,
+        "winrate_diff_mean": sum(winrate_diffs) / len(winrate_diffs) if winrate_diffs else None,
+        "winrate_diff_max": max(winrate_diffs) if winrate_diffs else None,
+        "score_diff_mean": sum(score_diffs) / len(score_diffs) if score_diffs else None,
+    }
+
+
+def format_report(result: ReplayResult, divergence: Dict[str, Dict[str, Any]]) -> str:
+    """回放报告 (文本)"""
+    s = result.summary()
+    lines = [f"{result.path} ({result.mode}, {result.speed:g}x)"]
+    throughput = f"{s['throughput']:.1f} 条/s" if s["throughput"] else "-"
+    lines.append(f"  {s['completed']}/{s['requests']} 条完成, 错误 {s['errors']}, "
+                 f"耗时 {s['wall_time']:.2f}s, 吞吐 {throughput}, "
+                 f"最大发送滞后 {s['max_lag'] * 1000:.0f} ms")
+
+    def fmt(summary):
+        if not summary["count"]:
+            return "-"
+        return (f"p50 {summary['p50'] * 1000:.1f} / p90 {summary['p90'] * 1000:.1f} / "
+                f"p99 {summary['p99'] * 1000:.1f} ms (n={summary['count']})")
+
+    lines.append(f"  延迟: {fmt(s['latency'])}")
+    for label, summary in s["by_command"].items():
+        lines.append(f"    {label:<20s} {fmt(summary)}")
+    for name, d in divergence.items():
+        if result.mode == 'gtp':
+            lines.append(f"  与{name}比较: {d['compared']} 条响应, {d['different']} 条不同")
+            for example in d["examples"]:
+                lines.append(f"    #{example['index']}: {example['replay']!r} != "
+                             f"{example['reference']!r}")
+        elif d["compared"]:
+            lines.append(f"  与{name}比较: {d['compared']} 个局面, "
+                         f"最佳着法一致 {d['best_move_agreement'] * 100:.0f}%, "
+                         f"胜率偏差 平均 {d['winrate_diff_mean'] * 100:.2f}% / "
+                         f"最大 {d['winrate_diff_max'] * 100:.2f}%, "
+                         f"目差偏差 平均 {d['score_diff_mean']:.2f}")
+        else:
+            lines.append(f"  与{name}比较: 没有可比较的局面")
+    return '\n'.join(lines)
+
+
+# ============ 命令行 ============
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="回放 KataGo 日志中的命令和分析请求")
+    parser.add_argument("logs", nargs="+", help="日志文件或目录 (gtp_logs/、analysis_logs/)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="回放速度倍数，0 表示不等待尽快发送")
+    parser.add_argument("--fake", action="store_true", help="使用替身引擎 (不需要模型)")
+    parser.add_argument("--katago", help="katago 可执行文件")
+    parser.add_argument("--model", help="模型文件")
+    parser.add_argument("--config", help="GTP 配置 (默认同守护进程)")
+    parser.add_argument("--analysis-config", help="分析引擎配置 (默认 analysis.cfg)")
+    parser.add_argument("--override", action="append", default=[],
+                        help="配置覆盖 key=value，可重复 (用于比较配置改动)")
+    parser.add_argument("--no-coalesce", action="store_true", help="关闭相同请求合并")
+    parser.add_argument("--save", help="把回放结果保存为 JSON (作为以后的 --baseline)")
+    parser.add_argument("--baseline", help="与之前保存的回放结果比较")
+    args = parser.parse_args()
+
+    from katago_analyzer import KataGoAnalyzer, KATAGO_BIN
+    from katago_analysis_engine import KataGoAnalysisEngine, DEFAULT_ANALYSIS_CONFIG
+    from katago_daemon import KATAGO_MODEL, KATAGO_CFG
+
+    sessions = load_sessions(args.logs)
+    if not sessions:
+        print("日志中没有可回放的命令或请求 (分析引擎需开启 logAllRequests)")
+        return
+
+    katago = args.katago or (FAKE_KATAGO if args.fake else KATAGO_BIN)
+    model = args.model or ("fake.bin.gz" if args.fake else str(KATAGO_MODEL))
+    overrides = dict(item.split('=', 1) for item in args.override)
+    baseline: Dict[str, Dict[int, Any]] = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            for saved in json.load(f)["sessions"]:
+                baseline[saved["path"]] = {r["index"]: r["result"] for r in saved["records"]}
+
+    saved_sessions = []
+    for session in sessions:
+        if session.mode == 'gtp':
+            config = args.config if args.config is not None else ("" if args.fake else str(KATAGO_CFG))
+            engine = KataGoAnalyzer(model, config_path=config, config_overrides=overrides,
+                                    katago_path=katago)
+        else:
+            config = args.analysis_config or DEFAULT_ANALYSIS_CONFIG
+            engine = KataGoAnalysisEngine(model, config_path=config, config_overrides=overrides,
+                                          katago_path=katago, coalesce=not args.no_coalesce)
+        if not engine.start():
+            print(f"❌ 引擎启动失败，跳过 {session.path}")
+            continue
+        try:
+            if session.mode == 'gtp':
+                result = replay_gtp(session, engine, args.speed)
+            else:
+                result = replay_analysis(session, engine, args.speed)
+        finally:
+            engine.stop()
+
+        replayed = {r.index: r.result for r in result.records}
+        divergence = {}
+        logged = {i: r.response for i, r in enumerate(session.requests) if r.response is not None}
+        if logged:
+            divergence["日志"] = compare(session.mode, replayed, logged)
+        if session.path in baseline:
+            divergence["基线"] = compare(session.mode, replayed, baseline[session.path])
+        print(format_report(result, divergence))
+        saved_sessions.append({"path": session.path, "mode": session.mode,
+                               "summary": result.summary(), "divergence": divergence,
+                               "records": [asdict(r) for r in result.records]})
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({"speed": args.speed, "sessions": saved_sessions}, f,
+                      indent=2, ensure_ascii=False)
+        print(f"✓ 回放结果已保存: {args.save}")
+
+
+if __name__ == "__main__":
+    main()
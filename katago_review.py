@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+整盘复盘: 两遍式问题手筛查
+1. 低搜索次数扫一遍所有局面，计算每手棋的胜率/目数损失
+2. 只对损失超过阈值 (或损失最大的前 K 手) 的前后局面做高搜索次数复查
+
+用法:
+    python3 katago_review.py game.sgf [sweep_visits] [deep_visits]
+"""
+
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Tuple, Any
+
+from katago_analyzer import Color, parse_sgf_game
+
+
+@dataclass
+class PositionEval:
+    """一个局面的评估 (轮走方视角)"""
+    winrate: float
+    score_lead: float
+    best_move: str
+    pv: List[str]
+    visits: int
+
+
+@dataclass
+class MoveReview:
+    """一手棋的评价 (落子方视角)"""
+    move_number: int          # 第几手 (从 1 开始)
+    color: str                # "B" / "W"
+    move: str                 # 实战着法
+    best_move: str            # AI 推荐
+    best_pv: List[str]
+    winrate_before: float     # 落子前胜率
+    winrate_after: float      # 落子后胜率
+    score_before: float
+    score_after: float
+    deep: bool = False        # 是否经过高搜索次数复查
+
+    @property
+    def winrate_drop(self) -> float:
+        return self.winrate_before - self.winrate_after
+
+    @property
+    def score_drop(self) -> float:
+        return self.score_before - self.score_after
+
+
+@dataclass
+class GameReview:
+    """整盘复盘结果"""
+    moves: List[MoveReview]
+    sweep_visits: int
+    deep_visits: int
+    positions: int                  # 局面总数 (手数 + 1)
+    deep_positions: List[int]       # 复查过的局面 (按手数)
+    visits_spent: int = 0           # 实际花费的根节点访问数
+    elapsed: float = 0.0
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+    def mistakes(self,
+                 winrate_threshold: float = 0.05,
+                 score_threshold: float = 2.0) -> List[MoveReview]:
+        """经过复查且损失超过阈值的问题手，按胜率损失从大到小排列"""
+        found = [m for m in self.moves if m.deep and
+                 (m.winrate_drop >= winrate_threshold or m.score_drop >= score_threshold)]
+        return sorted(found, key=lambda m: m.winrate_drop, reverse=True)
+
+
+def _color_to_move(moves: List[Tuple[str, str]], turn: int) -> Color:
+    """第 turn 手之后的轮走方"""
+    if turn < len(moves):
+        return Color(moves[turn][0])
+    if moves:
+        return Color.WHITE if moves[-1][0] == "B" else Color.BLACK
+    return Color.BLACK
+
+
+def _evaluate(analyzer, moves: List[Tuple[str, str]],
+              turn: int, visits: int, max_time: Optional[float],
+              interval: Optional[int] = None) -> Optional[PositionEval]:
+    """
+    分析第 turn 手之后的局面 (起始局面已由 ensure_setup 摆好)
+
+    只在 info 行到达时检查访问数上限，interval (厘秒) 越大越会超出 visits
+    """
+    if not analyzer.goto_position(moves[:turn]):
+        return None
+    results, stats = analyzer.analyze_with_stats(_color_to_move(moves, turn),
+                                                 visits=visits, max_time=max_time,
+                                                 interval=interval)
+    if not results:
+        return None
+    best = results[0]
+    return PositionEval(winrate=best.winrate, score_lead=best.score_lead,
+                        best_move=best.move, pv=best.pv, visits=stats.root_visits)
+
+
+def _review_move(moves: List[Tuple[str, str]], turn: int,
+                 evals: Dict[int, PositionEval], deep: bool) -> Optional[MoveReview]:
+    """
+    由第 turn-1 手后和第 turn 手后的局面评估计算第 turn 手的损失
+
+    kata-analyze 以轮走方视角报告胜率: 落子前是落子方，落子后是对手，
+    所以落子后的胜率和目数要翻转到落子方视角
+    """
+    before, after = evals.get(turn - 1), evals.get(turn)
+    if before is None or after is None:
+        return None
+    color, move = moves[turn - 1]
+    return MoveReview(move_number=turn, color=color, move=move,
+                      best_move=before.best_move, best_pv=before.pv,
+                      winrate_before=before.winrate,
+                      winrate_after=1.0 - after.winrate,
+                      score_before=before.score_lead,
+                      score_after=-after.score_lead,
+                      deep=deep)
+
+
+def review_game(analyzer,
+                moves: List[Tuple[str, str]],
+                sweep_visits: int = 24,
+                deep_visits: int = 400,
+                winrate_threshold: float = 0.05,
+                score_threshold: float = 2.0,
+                top_k: int = 5,
+                max_time: Optional[float] = 30.0,
+                setup: Optional[List[Tuple[str, str]]] = None,
+                verbose: bool = False) -> GameReview:
+    """
+    两遍式复盘一盘棋
+
+    Args:
+        analyzer: KataGoAnalyzer 或守护进程客户端 (已设置好贴目)
+        moves: 着法序列 [("B", "Q16"), ...] (GTP 坐标)
+        sweep_visits: 第一遍每个局面的搜索次数
+        deep_visits: 复查的搜索次数
+        winrate_threshold: 胜率损失超过该值的着法进入复查
+        score_threshold: 目数损失超过该值的着法进入复查
+        top_k: 无论阈值如何，损失最大的前 K 手都进入复查
+        max_time: 单个局面的时间预算 (秒)
+        setup: 第 0 手之前摆好的棋子 (用 set_position 一次摆出，不参与复盘)
+
+    Returns:
+        GameReview；被复查的着法使用高搜索次数的结果
+    """
+    start_time = time.monotonic()
+    visits_spent = 0
+    evals: Dict[int, PositionEval] = {}
+    if not analyzer.ensure_setup(setup or []):
+        raise RuntimeError("无法摆出起始局面")
+
+    # 第一遍：按手数顺序前进，每次只增量补一手；
+    # 搜索次数很少，用最小的报告间隔，否则超出的访问数会和搜索本身相当
+    for turn in range(len(moves) + 1):
+        evaluation = _evaluate(analyzer, moves, turn, sweep_visits, max_time, interval=1)
+        if evaluation is not None:
+            evals[turn] = evaluation
+            visits_spent += evaluation.visits
+    sweep_spent = visits_spent
+    sweep = {turn: _review_move(moves, turn, evals, deep=False)
+             for turn in range(1, len(moves) + 1)}
+    sweep = {turn: review for turn, review in sweep.items() if review is not None}
+
+    # 挑出需要复查的着法
+    suspects = {turn for turn, review in sweep.items()
+                if review.winrate_drop >= winrate_threshold
+                or review.score_drop >= score_threshold}
+    worst = sorted(sweep, key=lambda t: sweep[t].winrate_drop, reverse=True)[:top_k]
+    suspects.update(worst)
+
+    # 第二遍：复查这些着法前后的局面
+    deep_positions = sorted({t for turn in suspects for t in (turn - 1, turn)})
+    if verbose:
+        print(f"第一遍 {len(evals)} 个局面 ({sweep_visits} 次)，"
+              f"复查 {len(suspects)} 手 / {len(deep_positions)} 个局面 ({deep_visits} 次)")
+    for turn in deep_positions:
+        evaluation = _evaluate(analyzer, moves, turn, deep_visits, max_time)
+        if evaluation is not None:
+            evals[turn] = evaluation
+            visits_spent += evaluation.visits
+
+    reviews = []
+    for turn in range(1, len(moves) + 1):
+        review = _review_move(moves, turn, evals, deep=turn in suspects)
+        if review is not None:
+            reviews.append(review)
+
+    elapsed = time.monotonic() - start_time
+    # 全部高搜索次数的成本只按实际能摆出的局面计 (遇到非法着法后的局面都跳过了)
+    full_cost = len(evals) * deep_visits
+    return GameReview(moves=reviews, sweep_visits=sweep_visits, deep_visits=deep_visits,
+                      positions=len(moves) + 1, deep_positions=deep_positions,
+                      visits_spent=visits_spent, elapsed=elapsed,
+                      stats={"suspects": len(suspects),
+                             "sweep_visits_spent": sweep_spent,
+                             "full_deep_visits": full_cost,
+                             "compute_ratio": visits_spent / full_cost if full_cost else 0.0})
+
+
+def format_review(review: GameReview,
+                  winrate_threshold: float = 0.05,
+                  score_threshold: float = 2.0) -> str:
+    """问题手列表 (Markdown)"""
+    report = """### 问题手
+
+| 手数 | 颜色 | 实战 | AI 推荐 | 胜率损失 | 目数损失 |
+|------|------|------|---------|----------|----------|
+"""
+    for m in review.mistakes(winrate_threshold, score_threshold):
+        color = '黑' if m.color == 'B' else '白'
+        report += (f"| {m.move_number} | {color} | {m.move} | {m.best_move} | "
+                   f"{m.winrate_drop*100:.1f}% | {m.score_drop:+.1f} |\n")
+    report += (f"\n第一遍 {review.positions} 个局面 × {review.sweep_visits} 次，"
+               f"复查 {len(review.deep_positions)} 个局面 × {review.deep_visits} 次；"
+               f"共 {review.visits_spent} 次访问 (第一遍 "
+               f"{review.stats.get('sweep_visits_spent', 0)} 次)，约为全部高搜索次数的 "
+               f"{review.stats.get('compute_ratio', 0.0)*100:.0f}%，"
+               f"耗时 {review.elapsed:.1f}s\n")
+    return report
+
+
+def main():
+    """命令行入口"""
+    if len(sys.argv) < 2:
+        print("用法: python3 katago_review.py <棋谱.sgf> [第一遍搜索次数] [复查搜索次数]")
+        return
+
+    from katago_daemon import create_analyzer, KATAGO_MODEL, KATAGO_CFG
+
+    with open(sys.argv[1], 'r') as f:
+        game = parse_sgf_game(f.read())
+    sweep_visits = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    deep_visits = int(sys.argv[3]) if len(sys.argv) > 3 else 400
+
+    analyzer = create_analyzer(str(KATAGO_MODEL), config_path=str(KATAGO_CFG))
+    if not analyzer.start():
+        print("❌ KataGo 启动失败")
+        return
+    try:
+        if game.board_size != 19:
+            analyzer.set_board_size(game.board_size)
+        analyzer.set_komi(game.komi)
+        review = review_game(analyzer, game.moves, sweep_visits, deep_visits,
+                             setup=game.initial_stones, verbose=True)
+        print(format_review(review))
+    finally:
+        analyzer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+分析请求的优先级与取消
+- 三个优先级: interactive (用户单局面查询) > batch (整盘复盘) > background (预计算)
+- JSON 分析引擎按请求的 priority 字段调度，交互查询不再排在批量复盘之后
+- 用户离开页面时取消排队中或正在搜索的请求 (分析引擎的 terminate 动作)
+- 按优先级统计延迟直方图
+
+用法:
+    scheduler = AnalysisScheduler(engine)
+    ticket = scheduler.submit(build_query(moves), Priority.INTERACTIVE)
+    responses = ticket.result(timeout=10)
+    scheduler.cancel(ticket)   # 不再需要时
+"""
+
+import bisect
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional, List, Dict, Any, Set, Tuple
+
+from katago_analysis_engine import KataGoAnalysisEngine
+
+
+class Priority(Enum):
+    """请求优先级"""
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+    BACKGROUND = "background"
+
+
+# 分析引擎的 priority 字段：数值越大越先搜索
+ENGINE_PRIORITY = {Priority.INTERACTIVE: 100, Priority.BATCH: 0, Priority.BACKGROUND: -100}
+
+# 引擎池排队顺序：数值越小越先拿到引擎
+PRIORITY_RANK = {Priority.INTERACTIVE: 0, Priority.BATCH: 1, Priority.BACKGROUND: 2}
+
+# 延迟直方图的桶上界 (秒)，最后一个桶收集更慢的请求
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+@dataclass
+class LatencyHistogram:
+    """固定桶的延迟直方图"""
+    buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    counts: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    count: int = 0
+    total: float = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """分位数的近似值 (所在桶的上界)"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def as_dict(self) -> Dict[str, Any]:
+        buckets = {f"le_{bound:g}": count for bound, count in zip(self.buckets, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+@dataclass
+class AnalysisTicket:
+    """一个已提交的请求；result() 等待结果"""
+    query_id: str
+    priority: Priority
+    future: Future
+    submitted_at: float
+    group: int = 0
+
+    def result(self, timeout: Optional[float] = None) -> Dict[int, Dict[str, Any]]:
+        return self.future.result(timeout=timeout)
+
+    def cancelled(self) -> bool:
+        return self.future.cancelled()
+
+
+@dataclass
+class _Group:
+    """共用同一个引擎请求的票据 (相同请求会被合并)"""
+    query_id: str           # 实际发给引擎的请求 id (合并时为发起搜索的请求)
+    inner: Future
+    tickets: Set[int] = field(default_factory=set)
+
+
+class AnalysisScheduler:
+    """JSON 分析引擎之上的优先级调度与取消"""
+
+    def __init__(self, engine: KataGoAnalysisEngine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._groups: Dict[int, _Group] = {}
+        self._tickets: Dict[str, AnalysisTicket] = {}
+        self.histograms = {priority: LatencyHistogram() for priority in Priority}
+        self.counts = {priority: {"submitted": 0, "completed": 0, "cancelled": 0, "failed": 0}
+                       for priority in Priority}
+
+    def submit(self, query: Dict[str, Any],
+               priority: Priority = Priority.BATCH) -> AnalysisTicket:
+        """按优先级提交请求 (覆盖 query 中的 priority 字段)"""
+        query = dict(query)
+        if not query.get("id"):
+            query["id"] = f"{priority.value}-{next(self._ids)}"
+        query["priority"] = ENGINE_PRIORITY[priority]
+
+        inner = self.engine.submit(query)
+        ticket = AnalysisTicket(query["id"], priority, Future(), time.monotonic(), id(inner))
+        with self._lock:
+            engine_id = getattr(inner, "owner", None) or query["id"]
+            group = self._groups.setdefault(ticket.group, _Group(engine_id, inner))
+            group.tickets.add(id(ticket))
+            self._tickets[ticket.query_id] = ticket
+            self.counts[priority]["submitted"] += 1
+        inner.add_done_callback(lambda f: self._complete(ticket, f))
+        return ticket
+
+    def _complete(self, ticket: AnalysisTicket, inner: Future):
+        with self._lock:
+            self._detach(ticket)
+            if ticket.future.cancelled():
+                return
+            if inner.cancelled() or inner.exception() is not None:
+                self.counts[ticket.priority]["failed"] += 1
+            else:
+                self.counts[ticket.priority]["completed"] += 1
+                self.histograms[ticket.priority].observe(time.monotonic() - ticket.submitted_at)
+        if inner.cancelled():
+            ticket.future.cancel()
+        elif inner.exception() is not None:
+            ticket.future.set_exception(inner.exception())
+        else:
+            ticket.future.set_result(inner.result())
+
+    def _detach(self, ticket: AnalysisTicket) -> Optional[_Group]:
+        """把票据移出所在的组 (组空时删除)，返回该组 (调用方持有锁)"""
+        self._tickets.pop(ticket.query_id, None)
+        group = self._groups.get(ticket.group)
+        if group is None:
+            return None
+        group.tickets.discard(id(ticket))
+        if not group.tickets:
+            del self._groups[ticket.group]
+        return group
+
+    def cancel(self, ticket: AnalysisTicket) -> bool:
+        """
+        取消请求；同一搜索上没有其他请求时让引擎终止它 (排队中的直接丢弃)
+
+        合并的搜索可能还有调度器之外的请求在等，由引擎的引用计数 (release) 判断
+
+        Returns:
+            是否取消成功 (已完成的请求返回 False)
+        """
+        with self._lock:
+            if not ticket.future.cancel():
+                return False
+            self.counts[ticket.priority]["cancelled"] += 1
+            group = self._detach(ticket)
+        if group is not None and self.engine.release(group.inner) and not group.inner.done():
+            self.engine.terminate(group.query_id)
+        return True
+
+    def cancel_id(self, query_id: str) -> bool:
+        """按请求 id 取消"""
+        with self._lock:
+            ticket = self._tickets.get(query_id)
+        return ticket is not None and self.cancel(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        """各优先级的请求数与延迟分布"""
+        with self._lock:
+            return {
+                priority.value: {**self.counts[priority],
+                                 "latency": self.histograms[priority].as_dict()}
+                for priority in Priority
+            }
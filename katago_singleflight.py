@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+相同分析请求合并 (single-flight)
+多人同时复盘同一盘名局或同一个开局时，同一局面的请求会并发到达。
+键相同的请求挂到正在进行的那次搜索上，共用它的结果；搜索次数更少的请求
+也可以由正在进行的更深搜索满足。
+"""
+
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable, Hashable, Tuple
+
+
+@dataclass
+class _Flight:
+    """一次正在进行的搜索"""
+    visits: int
+    future: Future
+    followers: int = 0
+    refs: int = 1           # 仍在等结果的请求数 (发起者 + 跟随者，release 时减少)
+
+
+class SingleFlight:
+    """按键合并并发请求 (线程安全)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, List[_Flight]] = {}
+        self.requests = 0
+        self.searches = 0
+        self.coalesced = 0
+        self.coalesced_deeper = 0   # 由搜索次数更多的进行中搜索满足
+
+    def _join(self, key: Hashable, visits: int, owner: Any = None) -> Tuple[_Flight, bool]:
+        """
+        挂到能满足 visits 的进行中搜索上，没有则登记新搜索；返回 (搜索, 是否由本请求执行)
+
+        新搜索的 Future 带 owner 属性 (发起者的标识)，在登记前设置，跟随者总能读到
+        """
+        with self._lock:
+            self.requests += 1
+            flights = self._flights.setdefault(key, [])
+            candidates = [f for f in flights if f.visits >= visits]
+            if candidates:
+                flight = min(candidates, key=lambda f: f.visits)
+                flight.followers += 1
+                flight.refs += 1
+                self.coalesced += 1
+                if flight.visits > visits:
+                    self.coalesced_deeper += 1
+                return flight, False
+            flight = _Flight(visits, Future())
+            flight.future.owner = owner
+            flights.append(flight)
+            self.searches += 1
+            return flight, True
+
+    def _find(self, future: Future) -> Tuple[Hashable, Optional[_Flight]]:
+        """future 所属的进行中搜索 (调用方持有锁)"""
+        for key, flights in self._flights.items():
+            for flight in flights:
+                if flight.future is future:
+                    return key, flight
+        return None, None
+
+    def release(self, future: Future) -> bool:
+        """
+        一个请求不再需要 future 的结果 (例如被取消)，放弃它对这次搜索的引用
+
+        Returns:
+            没有其他请求还在等时为 True，调用方可以让引擎终止搜索；这时搜索已摘下，
+            之后的相同请求会发起新搜索。已结束或不由本对象管理的 Future 也返回 True
+        """
+        with self._lock:
+            key, flight = self._find(future)
+            if flight is None:
+                return True
+            flight.refs -= 1
+            if flight.refs > 0:
+                return False
+            flights = self._flights[key]
+            flights.remove(flight)
+            if not flights:
+                del self._flights[key]
+            return True
+
+    def waiters(self, future: Future) -> int:
+        """还在等 future 的请求数 (已结束或不由本对象管理的为 0)"""
+        with self._lock:
+            _, flight = self._find(future)
+            return flight.refs if flight is not None else 0
+
+    def _leave(self, key: Hashable, flight: _Flight):
+        with self._lock:
+            flights = self._flights.get(key, [])
+            if flight in flights:
+                flights.remove(flight)
+            if not flights:
+                self._flights.pop(key, None)
+
+    def do(self, key: Hashable, visits: int, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        同步执行 fn，键相同的并发请求只执行一次
+
+        Returns:
+            (结果, 是否共用了其他请求的搜索)
+        """
+        flight, leader = self._join(key, visits)
+        if not leader:
+            return flight.future.result(), True
+        try:
+            flight.future.set_result(fn())
+        except BaseException as e:
+            flight.future.set_exception(e)
+        finally:
+            self._leave(key, flight)
+        return flight.future.result(), False
+
+    def submit(self, key: Hashable, visits: int, start: Callable[[], Future],
+               owner: Any = None) -> Future:
+        """
+        异步版本：start() 发起搜索并返回 Future，键相同的并发请求拿到同一个 Future
+
+        返回的 Future 的 owner 属性是真正发起搜索的请求传入的 owner。
+        """
+        flight, leader = self._join(key, visits, owner)
+        if leader:
+            def finish(inner: Future):
+                self._leave(key, flight)
+                if inner.cancelled():
+                    flight.future.cancel()
+                elif inner.exception() is not None:
+                    flight.future.set_exception(inner.exception())
+                else:
+                    flight.future.set_result(inner.result())
+            try:
+                start().add_done_callback(finish)
+            except BaseException as e:
+                self._leave(key, flight)
+                flight.future.set_exception(e)
+        return flight.future
+
+    def stats(self) -> Dict[str, Any]:
+        """合并比例等统计"""
+        with self._lock:
+            in_flight = sum(len(flights) for flights in self._flights.values())
+        return {
+            "requests": self.requests,
+            "searches": self.searches,
+            "coalesced": self.coalesced,
+            "coalesced_deeper": self.coalesced_deeper,
+            "coalesce_ratio": self.coalesced / self.requests if self.requests else 0.0,
+            "in_flight": in_flight,
+        }
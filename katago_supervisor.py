@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+KataGo 引擎监护
+- 空闲时定期心跳，发现进程退出或卡死
+- 用相同的配置覆盖重启引擎，恢复棋盘尺寸、贴目、规则、摆子和当前局面
+- 请求途中引擎出错时自动重启并重试 (有次数上限)，统计重启指标
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+from katago_analyzer import KataGoAnalyzer, Color, MoveAnalysis, SearchStats
+
+
+@dataclass
+class SupervisorStats:
+    """监护统计"""
+    restarts: int = 0
+    failed_restarts: int = 0
+    retries: int = 0
+    heartbeats: int = 0
+    heartbeat_failures: int = 0
+    downtime_seconds: float = 0.0
+    last_restart_reason: str = ''
+    last_restart_at: Optional[float] = None   # time.time()
+    restart_reasons: Dict[str, int] = field(default_factory=dict)
+
+
+class SupervisedKataGoAnalyzer(KataGoAnalyzer):
+    """
+    带监护的 KataGoAnalyzer
+
+    接口与 KataGoAnalyzer 相同。改变局面或发起搜索的方法在引擎退出、
+    超时或卡死时会重启引擎、恢复局面后重试，重试用尽才抛出 RuntimeError。
+    """
+
+    def __init__(self,
+                 model_path: str,
+                 heartbeat_interval: Optional[float] = 15.0,
+                 heartbeat_timeout: float = 5.0,
+                 max_retries: int = 2,
+                 **kwargs: Any):
+        """
+        初始化
+
+        Args:
+            model_path: 模型文件路径
+            heartbeat_interval: 空闲时心跳间隔 (秒)，None 表示不心跳
+            heartbeat_timeout: 心跳无响应多久视为卡死
+            max_retries: 单个请求最多重试次数
+            kwargs: 其余参数同 KataGoAnalyzer
+        """
+        super().__init__(model_path, **kwargs)
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_retries = max_retries
+        self.supervisor_stats = SupervisorStats()
+
+        # 同一时间只有一个请求或心跳在使用引擎；kata-analyze 会被任何新命令打断
+        self._op_lock = threading.RLock()
+        self._depth = 0
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._start_kwargs: Dict[str, Any] = {}
+
+    # ============ 生命周期 ============
+
+    def start(self, timeout: float = 30.0, warmup: bool = False) -> bool:
+        self._start_kwargs = {"timeout": timeout, "warmup": warmup}
+        with self._op_lock:
+            ok = super().start(timeout=timeout, warmup=warmup)
+        if ok and self.heartbeat_interval and self._heartbeat_thread is None:
+            self._heartbeat_stop.clear()
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop,
+                                                      name='katago-heartbeat', daemon=True)
+            self._heartbeat_thread.start()
+        return ok
+
+    def stop(self):
+        self._heartbeat_stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join(timeout=self.heartbeat_timeout + 1)
+            self._heartbeat_thread = None
+        with self._op_lock:
+            super().stop()
+
+    def is_alive(self) -> bool:
+        return self.is_ready and self.proc is not None and self.proc.poll() is None
+
+    def restart(self, reason: str) -> bool:
+        """重启引擎并恢复局面 (调用方持有 _op_lock)"""
+        stats = self.supervisor_stats
+        began = time.monotonic()
+        board_size, komi, rules = self.board_size, self.komi, self.rules
+        setup, moves = list(self.setup), list(self.move_stack)
+        print(f"⚠️ KataGo 引擎异常 ({reason})，正在重启...")
+
+        self._depth += 1
+        try:
+            KataGoAnalyzer.stop(self)
+            ok = KataGoAnalyzer.start(self, **self._start_kwargs)
+            if ok:
+                if board_size != 19:
+                    ok = self.set_board_size(board_size)
+                if ok and komi is not None:
+                    ok = self.set_komi(komi)
+                if ok and rules is not None:
+                    ok = self.set_rules(rules)
+                if ok and setup:
+                    ok = self.set_position(setup)
+                if ok and moves:
+                    ok = self.goto_position(moves)
+        except (TimeoutError, RuntimeError) as e:
+            print(f"重启过程出错: {e}")
+            ok = False
+        finally:
+            self._depth -= 1
+
+        stats.downtime_seconds += time.monotonic() - began
+        stats.last_restart_reason = reason
+        stats.last_restart_at = time.time()
+        stats.restart_reasons[reason] = stats.restart_reasons.get(reason, 0) + 1
+        if ok:
+            stats.restarts += 1
+            print(f"✓ 引擎已重启，恢复到第 {len(moves)} 手")
+        else:
+            stats.failed_restarts += 1
+            print("❌ 引擎重启失败")
+        return ok
+
+    # ============ 心跳 ============
+
+    def _heartbeat_loop(self):
+        while not self._heartbeat_stop.wait(self.heartbeat_interval):
+            # 引擎忙时跳过：请求本身有超时保护
+            if not self._op_lock.acquire(blocking=False):
+                continue
+            try:
+                if self._heartbeat_stop.is_set():
+                    break
+                self._heartbeat()
+            finally:
+                self._op_lock.release()
+
+    def _heartbeat(self):
+        stats = self.supervisor_stats
+        stats.heartbeats += 1
+        if not self.is_alive():
+            stats.heartbeat_failures += 1
+            self.restart('exit')
+            return
+        try:
+            response = self._send_command('protocol_version', timeout=self.heartbeat_timeout)
+            healthy = response.startswith('=')
+        except TimeoutError:
+            healthy = False
+        if not healthy:
+            stats.heartbeat_failures += 1
+            self.restart('stall' if self.is_alive() else 'exit')
+
+    # ============ 带重试的请求 ============
+
+    def _supervised(self, name: str, method: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """执行 KataGoAnalyzer 的方法；引擎退出或超时则重启、恢复局面后重试"""
+        with self._op_lock:
+            # 重启恢复局面时的内部调用不再监护
+            if self._depth > 0:
+                return method(self, *args, **kwargs)
+
+            self._depth += 1
+            try:
+                last_error = ''
+                for attempt in range(self.max_retries + 1):
+                    if attempt > 0:
+                        self.supervisor_stats.retries += 1
+                    if self.proc is not None and not self.is_alive():
+                        if not self.restart('exit'):
+                            last_error = '重启失败'
+                            continue
+                    try:
+                        result = method(self, *args, **kwargs)
+                    except TimeoutError as e:
+                        last_error = str(e)
+                        self.restart('stall')
+                        continue
+                    if self.is_alive():
+                        return result
+                    # _send_command 在进程退出时返回空响应，结果不可信
+                    last_error = 'KataGo 进程在请求中退出'
+                    self.restart('exit')
+                raise RuntimeError(f"{name} 重试 {self.max_retries} 次后仍失败: {last_error}")
+            finally:
+                self._depth -= 1
+
+    def set_board_size(self, size: int = 19) -> bool:
+        return self._supervised('boardsize', KataGoAnalyzer.set_board_size, size)
+
+    def clear_board(self) -> bool:
+        return self._supervised('clear_board', KataGoAnalyzer.clear_board)
+
+    def set_komi(self, komi: float = 7.5) -> bool:
+        return self._supervised('komi', KataGoAnalyzer.set_komi, komi)
+
+    def set_rules(self, rules: str) -> bool:
+        return self._supervised('kata-set-rules', KataGoAnalyzer.set_rules, rules)
+
+    def play(self, color: Color, move: str) -> bool:
+        return self._supervised('play', KataGoAnalyzer.play, color, move)
+
+    def undo(self) -> bool:
+        return self._supervised('undo', KataGoAnalyzer.undo)
+
+    def genmove(self, color: Color, timeout: float = 60.0) -> str:
+        return self._supervised('genmove', KataGoAnalyzer.genmove, color, timeout)
+
+    def goto_position(self, moves: List[Tuple[Any, str]], timeout: float = 10.0) -> bool:
+        return self._supervised('goto_position', KataGoAnalyzer.goto_position, moves, timeout)
+
+    def set_position(self, stones: List[Tuple[Any, str]], timeout: float = 10.0) -> bool:
+        return self._supervised('set_position', KataGoAnalyzer.set_position, stones, timeout)
+
+    def analyze_with_stats(self, color: Color, *args: Any,
+                           **kwargs: Any) -> Tuple[List[MoveAnalysis], SearchStats]:
+        return self._supervised('kata-analyze', KataGoAnalyzer.analyze_with_stats,
+                                color, *args, **kwargs)
+
+    def metrics(self) -> Dict[str, Any]:
+        """监护指标 (供引擎池和守护进程的状态输出)"""
+        result = asdict(self.supervisor_stats)
+        result["alive"] = self.is_alive()
+        return result
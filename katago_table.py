@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+整盘/批量分析结果的列式存储
+每个候选着法一行，各字段分别存成 NumPy 数组；主要变化拼接成一个数组，
+用偏移表切分。按局面取出的是带 __slots__ 的轻量视图，用法与 MoveAnalysis 相同。
+
+用法:
+    table = AnalysisTable.from_results(engine.analyze_game(moves))
+    best = table[120][0]
+    print(best.move, best.winrate, best.pv)
+"""
+
+from array import array
+from typing import Optional, List, Dict, Union, Iterable, Iterator
+
+import numpy as np
+
+from katago_analyzer import MoveAnalysis
+from go_position import gtp_to_index, index_to_gtp
+
+_COLUMNS = ('moves', 'visits', 'winrate', 'score_lead', 'policy', 'order',
+            'pv_moves', 'pv_offsets', 'position_offsets')
+
+
+def _encode(move: str, board_size: int) -> int:
+    index = gtp_to_index(move, board_size)
+    return board_size * board_size if index is None else index
+
+
+class MoveAnalysisView:
+    """表中一行的只读视图，字段与 MoveAnalysis 相同"""
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table: 'AnalysisTable', row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def move(self) -> str:
+        return self._table._decode(self._table.moves[self._row])
+
+    @property
+    def visits(self) -> int:
+        return int(self._table.visits[self._row])
+
+    @property
+    def winrate(self) -> float:
+        return float(self._table.winrate[self._row])
+
+    @property
+    def score_lead(self) -> float:
+        return float(self._table.score_lead[self._row])
+
+    @property
+    def policy(self) -> float:
+        return float(self._table.policy[self._row])
+
+    @property
+    def order(self) -> int:
+        return int(self._table.order[self._row])
+
+    @property
+    def lz_winrate(self) -> Optional[float]:
+        return None
+
+    @property
+    def pv(self) -> List[str]:
+        table = self._table
+        start, end = table.pv_offsets[self._row], table.pv_offsets[self._row + 1]
+        return [table._decode(m) for m in table.pv_moves[start:end]]
+
+    def to_move_analysis(self) -> MoveAnalysis:
+        """转成独立的 MoveAnalysis (例如需要 asdict 或修改时)"""
+        return MoveAnalysis(self.move, self.visits, self.winrate, self.score_lead,
+                            self.policy, self.pv, order=self.order)
+
+    def __eq__(self, other):
+        if isinstance(other, (MoveAnalysisView, MoveAnalysis)):
+            return (self.move, self.visits, self.order, self.pv) == \
+                   (other.move, other.visits, other.order, other.pv)
+        return NotImplemented
+
+    def __repr__(self):
+        return (f"MoveAnalysisView(move={self.move!r}, visits={self.visits}, "
+                f"winrate={self.winrate:.4f}, score_lead={self.score_lead:.2f}, "
+                f"order={self.order})")
+
+
+class AnalysisTable:
+    """
+    列式分析结果表
+
+    局面 i 的候选位于行 position_offsets[i]:position_offsets[i+1]，
+    行 r 的主要变化位于 pv_moves[pv_offsets[r]:pv_offsets[r+1]]。
+    着法按 go_position 的一维下标编码，board_size² 表示 pass。
+    """
+
+    def __init__(self, board_size: int = 19):
+        self.board_size = board_size
+        # 构建期用 array 追加 (同样紧凑)，freeze() 后转为 NumPy 数组
+        self.moves = array('h')
+        self.visits = array('i')
+        self.winrate = array('f')
+        self.score_lead = array('f')
+        self.policy = array('f')
+        self.order = array('h')
+        self.pv_moves = array('h')
+        self.pv_offsets = array('q', [0])
+        self.position_offsets = array('q', [0])
+        self.frozen = False
+
+    @classmethod
+    def from_results(cls,
+                     results: Union[Dict[int, List[MoveAnalysis]], Iterable[List[MoveAnalysis]]],
+                     board_size: int = 19) -> 'AnalysisTable':
+        """
+        由逐局面的分析结果构建
+
+        Args:
+            results: {手数: 候选列表} (缺失的手数存为空局面) 或按顺序的候选列表
+        """
+        table = cls(board_size)
+        if isinstance(results, dict):
+            last = max(results) if results else -1
+            results = (results.get(turn, []) for turn in range(last + 1))
+        for candidates in results:
+            table.append(candidates)
+        return table.freeze()
+
+    def append(self, candidates: List[MoveAnalysis]):
+        """追加一个局面的候选着法"""
+        if self.frozen:
+            raise RuntimeError("AnalysisTable 已冻结")
+        size = self.board_size
+        for a in candidates:
+            self.moves.append(_encode(a.move, size))
+            self.visits.append(a.visits)
+            self.winrate.append(a.winrate)
+            self.score_lead.append(a.score_lead)
+            self.policy.append(a.policy)
+            self.order.append(a.order)
+            self.pv_moves.extend(_encode(m, size) for m in a.pv)
+            self.pv_offsets.append(len(self.pv_moves))
+        self.position_offsets.append(len(self.moves))
+
+    def freeze(self) -> 'AnalysisTable':
+        """把各列转为 NumPy 数组 (不复制数据)，之后不能再追加"""
+        if not self.frozen:
+            for name in _COLUMNS:
+                column = getattr(self, name)
+                if len(column):
+                    setattr(self, name, np.frombuffer(column, dtype=column.typecode))
+                else:
+                    setattr(self, name, np.empty(0, dtype=column.typecode))
+            self.frozen = True
+        return self
+
+    def _decode(self, code: int) -> str:
+        if code == self.board_size * self.board_size:
+            return "pass"
+        return index_to_gtp(int(code), self.board_size)
+
+    # ============ 按局面访问 ============
+
+    def __len__(self) -> int:
+        return len(self.position_offsets) - 1
+
+    def __getitem__(self, position: int) -> List[MoveAnalysisView]:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        start, end = self.position_offsets[position], self.position_offsets[position + 1]
+        return [MoveAnalysisView(self, row) for row in range(int(start), int(end))]
+
+    def __iter__(self) -> Iterator[List[MoveAnalysisView]]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def best(self) -> np.ndarray:
+        """每个局面第一候选的行号 (空局面为 -1)"""
+        self.freeze()
+        starts = self.position_offsets[:-1]
+        return np.where(self.position_offsets[1:] > starts, starts, -1)
+
+    @property
+    def nbytes(self) -> int:
+        self.freeze()
+        return sum(getattr(self, name).nbytes for name in _COLUMNS)
+
+    # ============ 持久化 ============
+
+    def save(self, path: str):
+        """保存为 .npz"""
+        self.freeze()
+        np.savez_compressed(path, board_size=self.board_size,
+                            **{name: getattr(self, name) for name in _COLUMNS})
+
+    @classmethod
+    def load(cls, path: str) -> 'AnalysisTable':
+        data = np.load(path)
+        table = cls(int(data["board_size"]))
+        for name in _COLUMNS:
+            setattr(table, name, data[name])
+        table.frozen = True
+        return table
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+分析引擎配置调优
+用固定的局面集合，对 numAnalysisThreads、numSearchThreadsPerAnalysisThread、nnMaxBatchSize、
+nnCacheSizePowerOfTwo 做网格搜索或逐次减半 (successive halving)，分别按两种流量测量:
+
+- interactive: 一次一个请求 (用户单局面查询)，按 p90 延迟排名
+- batch: 全部局面同时提交 (整盘复盘、预计算)，按局面/秒排名
+
+每个配置都新启动引擎 (配置覆盖只在启动时生效)，推荐的覆盖项按流量写入
+analysis_tuning.json，守护进程的分析引擎启动时读取 batch 一组 (见 profile_overrides)。
+
+用法:
+    python3 katago_tune.py                          # 逐次减半，两种流量
+    python3 katago_tune.py --search grid --grid numAnalysisThreads=1,2,4 --grid nnMaxBatchSize=32,64
+    python3 katago_tune.py --fake --positions 24    # 用替身引擎检查流程
+"""
+
+import argparse
+import itertools
+import json
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Iterable
+
+from katago_analysis_engine import KataGoAnalysisEngine, build_query, DEFAULT_ANALYSIS_CONFIG
+
+DEFAULT_TUNING_PATH = Path(__file__).with_name("analysis_tuning.json")
+
+# 默认搜索空间
+PARAMETERS: Dict[str, List[int]] = {
+    "numAnalysisThreads": [1, 2, 4, 8],
+    "numSearchThreadsPerAnalysisThread": [1, 4, 8, 16],
+    "nnMaxBatchSize": [32, 64, 128],
+    "nnCacheSizePowerOfTwo": [20, 23],
+}
+
+
+@dataclass
+class TrafficProfile:
+    """一种流量：每个局面的搜索次数和同时提交的请求数 (None 表示全部同时提交)"""
+    name: str
+    visits: int
+    concurrency: Optional[int]
+
+
+PROFILES = {
+    "interactive": TrafficProfile("interactive", visits=400, concurrency=1),
+    "batch": TrafficProfile("batch", visits=100, concurrency=None),
+}
+
+
+@dataclass
+class Trial:
+    """一个配置在一种流量下的测量结果"""
+    profile: str
+    overrides: Dict[str, Any]
+    positions: int
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    failed: int = 0
+    error: str = ''
+
+    @property
+    def positions_per_second(self) -> float:
+        return len(self.latencies) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def latency(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    @property
+    def score(self) -> float:
+        """越大越好：interactive 看 p90 延迟，batch 看吞吐"""
+        if self.error or not self.latencies:
+            return float('-inf')
+        if self.profile == "interactive":
+            return -self.latency(0.9)
+        return self.positions_per_second
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "profile": self.profile,
+            "overrides": self.overrides,
+            "positions": self.positions,
+            "elapsed": self.elapsed,
+            "positions_per_second": self.positions_per_second,
+            "p50": self.latency(0.5),
+            "p90": self.latency(0.9),
+            "failed": self.failed,
+            "error": self.error,
+        }
+
+
+# ============ 局面集合 ============
+
+def load_positions(sgf_paths: Iterable[str], count: int = 32) -> List[Dict[str, Any]]:
+    """
+    从棋谱中等间隔取局面，构建分析请求 (不含 id 和 maxVisits)
+
+    局面以摆子 (initialStones) 表示，不带着法历史：照片识别的棋谱里可能有
+    非法着法序列，摆子局面总能被引擎接受。
+    """
+    from katago_analyzer import parse_sgf_game
+    from go_position import Position, EMPTY, BLACK, index_to_gtp
+
+    games = []
+    for path in sgf_paths:
+        try:
+            with open(path, 'r') as f:
+                game = parse_sgf_game(f.read())
+        except (OSError, UnicodeDecodeError):
+            continue
+        if game.moves or game.initial_stones:
+            games.append(game)
+    if not games:
+        return []
+
+    # 各棋谱的 (棋谱, 手数)，按顺序均匀抽取 count 个
+    candidates = [(game, turn) for game in games for turn in range(0, len(game.moves) + 1, 8)]
+    step = max(1, len(candidates) // count)
+    queries = []
+    for game, turn in candidates[::step][:count]:
+        position = Position.from_moves(game.moves[:turn], game.board_size, game.initial_stones)
+        stones = [("B" if value == BLACK else "W", index_to_gtp(index, game.board_size))
+                  for index, value in enumerate(position.stones) if value != EMPTY]
+        queries.append(build_query([], komi=game.komi, board_size=game.board_size,
+                                   initial_stones=stones,
+                                   initial_player="B" if position.to_move == BLACK else "W"))
+    return queries
+
+
+# ============ 测量 ============
+
+def run_trial(overrides: Dict[str, Any],
+              profile: TrafficProfile,
+              queries: List[Dict[str, Any]],
+              model_path: str,
+              config_path: str = DEFAULT_ANALYSIS_CONFIG,
+              katago_path: Optional[str] = None,
+              timeout: float = 600.0) -> Trial:
+    """用给定覆盖项启动引擎 (含预热)，按流量跑一遍局面集合"""
+    trial = Trial(profile.name, dict(overrides), len(queries))
+    kwargs = {"katago_path": katago_path} if katago_path else {}
+    # 关闭合并：每个局面都要真正搜索
+    engine = KataGoAnalysisEngine(model_path, config_path=config_path,
+                                  config_overrides=overrides, coalesce=False, **kwargs)
+    if not engine.start(warmup=True):
+        trial.error = "引擎启动失败"
+        return trial
+    try:
+        window = profile.concurrency or len(queries)
+        began = time.monotonic()
+        for start in range(0, len(queries), window):
+            batch = []
+            for query in queries[start:start + window]:
+                query = dict(query, maxVisits=profile.visits)
+                batch.append((time.monotonic(), engine.submit(query)))
+            for submitted, future in batch:
+                try:
+                    future.result(timeout=timeout)
+                    trial.latencies.append(time.monotonic() - submitted)
+                except Exception:
+                    trial.failed += 1
+        trial.elapsed = time.monotonic() - began
+    finally:
+        engine.stop()
+    return trial
+
+
+def configurations(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    搜索空间的全部组合
+
+    跳过搜索线程总数超过 nnMaxBatchSize 两倍的组合：多出的线程只会排队等批次。
+    """
+    keys = list(space)
+    result = []
+    for values in itertools.product(*(space[k] for k in keys)):
+        config = dict(zip(keys, values))
+        threads = config.get("numAnalysisThreads", 1) * \
+            config.get("numSearchThreadsPerAnalysisThread", 1)
+        if "nnMaxBatchSize" in config and threads > 2 * config["nnMaxBatchSize"]:
+            continue
+        result.append(config)
+    return result
+
+
+Runner = Callable[[Dict[str, Any], List[Dict[str, Any]]], Trial]
+
+
+def grid_search(configs: List[Dict[str, Any]], queries: List[Dict[str, Any]],
+                runner: Runner, verbose: bool = True) -> List[Trial]:
+    """每个配置跑完整的局面集合"""
+    trials = []
+    for i, config in enumerate(configs, 1):
+        trial = runner(config, queries)
+        trials.append(trial)
+        if verbose:
+            print(f"  [{i}/{len(configs)}] {format_trial(trial)}")
+    return trials
+
+
+def successive_halving(configs: List[Dict[str, Any]], queries: List[Dict[str, Any]],
+                       runner: Runner, eta: int = 3, min_positions: int = 4,
+                       verbose: bool = True) -> List[Trial]:
+    """
+    逐次减半：先用少量局面测全部配置，保留前 1/eta 再用 eta 倍的局面测，
+    直到只剩一个配置或用上全部局面
+
+    Returns:
+        全部测量记录，最后一轮的在末尾
+    """
+    trials: List[Trial] = []
+    rounds = 0
+    while len(configs) > eta ** (rounds + 1):
+        rounds += 1
+    positions = max(min_positions, len(queries) // eta ** rounds)
+    rung = 0
+    while True:
+        positions = min(positions, len(queries))
+        rung += 1
+        if verbose:
+            print(f"  第 {rung} 轮: {len(configs)} 个配置 × {positions} 个局面")
+        results = [runner(config, queries[:positions]) for config in configs]
+        for trial in results:
+            if verbose:
+                print(f"    {format_trial(trial)}")
+        trials.extend(results)
+        if len(configs) == 1 or positions >= len(queries):
+            return trials
+        results.sort(key=lambda t: t.score, reverse=True)
+        configs = [t.overrides for t in results[:max(1, len(configs) // eta)]]
+        positions *= eta
+
+
+def best_trial(trials: List[Trial]) -> Optional[Trial]:
+    """局面数最多的一轮中得分最高的测量"""
+    valid = [t for t in trials if t.score > float('-inf')]
+    if not valid:
+        return None
+    most = max(t.positions for t in valid)
+    return max((t for t in valid if t.positions == most), key=lambda t: t.score)
+
+
+def format_trial(trial: Trial) -> str:
+    overrides = ', '.join(f"{k}={v}" for k, v in trial.overrides.items())
+    if trial.error:
+        return f"{overrides}: {trial.error}"
+    p50, p90 = trial.latency(0.5), trial.latency(0.9)
+    return (f"{overrides}: {trial.positions_per_second:.1f} 局面/s, "
+            f"p50 {p50 * 1000 if p50 is not None else float('nan'):.0f} ms, "
+            f"p90 {p90 * 1000 if p90 is not None else float('nan'):.0f} ms"
+            + (f", 失败 {trial.failed}" if trial.failed else ""))
+
+
+# ============ 推荐结果 ============
+
+def save_recommendations(recommended: Dict[str, Trial], trials: List[Trial],
+                         path: Path = DEFAULT_TUNING_PATH, **meta: Any):
+    """写入各流量的推荐覆盖项和全部测量记录 (已有文件中其他流量的推荐保留)"""
+    data: Dict[str, Any] = {}
+    if Path(path).exists():
+        with open(path) as f:
+            data = json.load(f)
+    profiles = data.get("profiles", {})
+    for name, trial in recommended.items():
+        profiles[name] = {**trial.as_dict(), "visits": PROFILES[name].visits}
+    data.update(meta)
+    data["generated"] = datetime.now().isoformat(timespec='seconds')
+    data["profiles"] = profiles
+    data["trials"] = [t.as_dict() for t in trials]
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def profile_overrides(profile: str, path: Path = DEFAULT_TUNING_PATH) -> Dict[str, Any]:
+    """读取某种流量的推荐覆盖项；未调优时返回空字典 (沿用 analysis.cfg)"""
+    try:
+        with open(path) as f:
+            return dict(json.load(f)["profiles"][profile]["overrides"])
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+# ============ 命令行 ============
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="调优分析引擎的线程与批次配置")
+    parser.add_argument("--profiles", default="interactive,batch",
+                        help="要调优的流量，逗号分隔 (interactive,batch)")
+    parser.add_argument("--search", choices=("halving", "grid"), default="halving")
+    parser.add_argument("--eta", type=int, default=3, help="逐次减半每轮保留 1/eta")
+    parser.add_argument("--grid", action="append", default=[],
+                        help="替换某个参数的取值，如 numAnalysisThreads=1,2,4 (可重复)")
+    parser.add_argument("--sgf", nargs="*", help="局面来源棋谱 (默认仓库中的 *.sgf)")
+    parser.add_argument("--positions", type=int, default=32, help="局面数")
+    parser.add_argument("--fake", action="store_true", help="使用替身引擎 (检查流程用)")
+    parser.add_argument("--katago", help="katago 可执行文件")
+    parser.add_argument("--model", help="模型文件")
+    parser.add_argument("--config", default=DEFAULT_ANALYSIS_CONFIG)
+    parser.add_argument("--output", default=str(DEFAULT_TUNING_PATH))
+    args = parser.parse_args()
+
+    from katago_daemon import KATAGO_MODEL
+    from katago_replay import FAKE_KATAGO
+
+    space = dict(PARAMETERS)
+    for item in args.grid:
+        key, _, values = item.partition('=')
+        space[key.strip()] = [int(v) for v in values.split(',') if v.strip()]
+    sgf_paths = args.sgf if args.sgf else sorted(map(str, Path(__file__).parent.glob("*.sgf")))
+    queries = load_positions(sgf_paths, args.positions)
+    if not queries:
+        print("没有可用的局面 (检查 --sgf)")
+        return
+
+    katago = args.katago or (FAKE_KATAGO if args.fake else None)
+    model = args.model or ("fake.bin.gz" if args.fake else str(KATAGO_MODEL))
+    configs = configurations(space)
+    print(f"{len(configs)} 个配置, {len(queries)} 个局面, 搜索方式 {args.search}")
+
+    recommended: Dict[str, Trial] = {}
+    all_trials: List[Trial] = []
+    for name in args.profiles.split(','):
+        profile = PROFILES[name.strip()]
+        print(f"\n== {profile.name} (每局面 {profile.visits} 次搜索, "
+              f"{'逐个提交' if profile.concurrency == 1 else '同时提交'}) ==")
+
+        def runner(config, subset, profile=profile):
+            return run_trial(config, profile, subset, model, args.config, katago)
+
+        if args.search == "grid":
+            trials = grid_search(configs, queries, runner)
+        else:
+            trials = successive_halving(configs, queries, runner, eta=args.eta)
+        all_trials.extend(trials)
+        best = best_trial(trials)
+        if best is None:
+            print("  没有成功的配置")
+            continue
+        recommended[profile.name] = best
+        print(f"  推荐: {format_trial(best)}")
+
+    if recommended:
+        save_recommendations(recommended, all_trials, Path(args.output),
+                             model=model, config=args.config, search=args.search)
+        print(f"\n✓ 推荐配置已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
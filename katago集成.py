@@ -3,101 +3,121 @@
 Katago集成模块
 """
 
-import subprocess
 import json
 import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from katago_analyzer import parse_sgf_game, KATAGO_BIN
+from katago_analysis_engine import KataGoAnalysisEngine, build_query, DEFAULT_ANALYSIS_CONFIG
+from katago_daemon import connect_daemon
 
-KATAGO_BIN = "/opt/homebrew/bin/katago"
 MODEL_PATH = "/Users/haoc/.openclaw/workspace/katago_model.bin.gz"
-CONFIG_PATH = "/opt/homebrew/share/katago/configs/analysis_example.cfg"
+CONFIG_PATH = DEFAULT_ANALYSIS_CONFIG
 
 
-def analyze_sgf(sgf_path):
-    """使用KataGo分析SGF"""
+def analyze_sgf(sgf_path, max_visits=100):
+    """使用KataGo分析引擎分析SGF (一个 analyzeTurns 请求覆盖整盘)"""
     if not os.path.exists(MODEL_PATH):
         return {"error": f"模型不存在: {MODEL_PATH}"}
     
-    # 读取SGF
+    # 读取SGF，转换成分析引擎的 JSON 请求
     with open(sgf_path) as f:
-        sgf_content = f.read()
-    
-    # 构建命令
-    cmd = [
-        KATAGO_BIN, "analysis",
-        "-model", MODEL_PATH,
-        "-config", CONFIG_PATH,
-        "-override-config", "numAnalysisThreads=2,maxVisits=100,verbose=false"
-    ]
+        game = parse_sgf_game(f.read())
     
-    print(f"🔮 KataGo分析中...")
+    query = build_query(
+        game.moves,
+        analyze_turns=list(range(len(game.moves) + 1)),
+        max_visits=max_visits,
+        komi=game.komi,
+        board_size=game.board_size,
+        initial_stones=game.initial_stones
+    )
     
-    try:
-        # 运行Katago
-        result = subprocess.run(
-            cmd,
-            input=sgf_content,
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
-        
-        if result.returncode == 0:
-            # 解析输出
-            lines = result.stdout.strip().split('\n')
-            analysis_data = []
-            for line in lines:
-                if line.startswith('{'):
-                    analysis_data.append(json.loads(line))
-            
+    # 守护进程在运行并启用了分析引擎时，直接转发请求
+    client = connect_daemon()
+    if client is not None and client.capabilities.get("analysis"):
+        print(f"🔮 KataGo分析中 (守护进程)...")
+        try:
+            responses = client.query(query, timeout=120)
+            analysis_data = [responses[turn] for turn in sorted(responses)]
             return {
                 "success": True,
                 "moves": analysis_data,
-                "summary": parse_analysis(analysis_data)
+                "summary": parse_analysis(analysis_data, game.moves)
             }
-        else:
-            return {"error": result.stderr}
+        except Exception as e:
+            return {"error": str(e)}
+        finally:
+            client.stop()
+    if client is not None:
+        client.stop()
+    
+    engine = KataGoAnalysisEngine(
+        MODEL_PATH,
+        config_path=CONFIG_PATH,
+        config_overrides={"numAnalysisThreads": 2},
+        katago_path=KATAGO_BIN
+    )
+    
+    print(f"🔮 KataGo分析中...")
+    
+    if not engine.start():
+        return {"error": engine._read_stderr() or "KataGo 启动失败"}
+    
+    try:
+        responses = engine.submit(query).result(timeout=120)
+        analysis_data = [responses[turn] for turn in sorted(responses)]
+        
+        return {
+            "success": True,
+            "moves": analysis_data,
+            "summary": parse_analysis(analysis_data, game.moves)
+        }
     
-    except subprocess.TimeoutExpired:
+    except FutureTimeoutError:
         return {"error": "分析超时"}
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        engine.stop()
+
 
+def parse_analysis(analysis_data, moves=None):
+    """
+    解析KataGo分析结果
 
-def parse_analysis(analysis_data):
-    """解析KataGo分析结果"""
+    Args:
+        moves: 请求中的着法序列，响应缺少 rootInfo.currentPlayer 时据此推断轮走方
+    """
     if not analysis_data:
         return {}
     
-    # 取第一手的分析
-    first = analysis_data[0] if analysis_data else {}
-    moveInfos = first.get("moveInfos", [])
+    # 取最后一个局面 (当前局面) 的分析
+    current = analysis_data[-1] if analysis_data else {}
+    moveInfos = current.get("moveInfos", [])
     
     # 获取Top 5推荐
     top_moves = []
     for info in moveInfos[:5]:
-        move = info.get("move", "")
+        # 分析引擎返回的已经是 GTP 坐标 (如 "Q16")
+        move = info.get("move", "") or "pass"
         scoreLead = info.get("scoreLead", 0)
         winrate = info.get("winrate", 0)
         points = info.get("points", 0)
         
-        # 转换坐标
-        if move:
-            col = ord(move[0]) - ord('a')
-            row = ord(move[1]) - ord('a')
-            sgf_move = f"{chr(ord('a') + col)}{chr(ord('a') + row)}"
-        else:
-            sgf_move = "pass"
-        
         top_moves.append({
-            "move": sgf_move,
+            "move": move,
             "winrate": winrate,
             "scoreLead": scoreLead,
             "points": points
         })
     
-    # 当前胜率
-    turn = first.get("turnNumber", 0)
-    current_player = "白" if turn % 2 == 0 else "黑"
+    # 轮走方：优先取引擎报告的，其次由上一手的颜色推断 (有摆子或让子时不能按手数奇偶)
+    turn = current.get("turnNumber", 0)
+    player = current.get("rootInfo", {}).get("currentPlayer")
+    if player is None and moves and 0 < turn <= len(moves):
+        player = "W" if moves[turn - 1][0] == "B" else "B"
+    current_player = "白" if player == "W" else "黑"
     
     return {
         "turn": turn,